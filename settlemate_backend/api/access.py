@@ -0,0 +1,113 @@
+from functools import wraps
+from typing import Optional
+from uuid import UUID
+
+from django.core.exceptions import ValidationError
+from django.db.models import Exists, OuterRef
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import Trip, TripMember
+
+# Attribute on the underlying HttpRequest holding resolved trips by id
+TRIP_CACHE_ATTR = '_trip_access'
+
+
+def get_request_tripid(request) -> Optional[str]:
+    """`tripid` from the query string, falling back to the request body"""
+    tripid = request.GET.get('tripid')
+    if not tripid and hasattr(request.data, 'get'):
+        tripid = request.data.get('tripid')
+    return tripid
+
+
+def resolve_trip(request, tripid, **annotations) -> Optional[Trip]:
+    """
+    The active trip with its owner and the caller's membership, from one query.
+
+    The trip comes back with `owner` loaded and an `is_member` flag for
+    request.user. Results are cached on the request, so the ETag check and the
+    view share a single lookup; a later call asking for annotations the cached
+    trip lacks queries again.
+
+    Args:
+        request: DRF or Django request with an authenticated user
+        tripid: Trip ID as sent by the client
+        annotations: Extra annotations to load with the trip
+
+    Returns:
+        The trip, or None when it is missing, inactive or the ID is malformed
+    """
+    http_request = getattr(request, '_request', request)
+    cache = getattr(http_request, TRIP_CACHE_ATTR, None)
+    if cache is None:
+        cache = {}
+        setattr(http_request, TRIP_CACHE_ATTR, cache)
+
+    key = str(tripid)
+    if key in cache and (cache[key] is None or all(hasattr(cache[key], name) for name in annotations)):
+        return cache[key]
+
+    try:
+        trip = Trip.objects.select_related('owner').annotate(
+            is_member=Exists(TripMember.objects.filter(trip=OuterRef('pk'), user_id=request.user.pk, is_active=True)),
+            **annotations
+        ).filter(id=tripid, is_active=True).first()
+    except (ValidationError, ValueError):
+        trip = None
+    cache[key] = trip
+    return trip
+
+
+def trip_access(owner_only: bool = False, denied: Optional[str] = None):
+    """
+    Authorize a trip-scoped view (place it below @permission_classes and any @trip_etag).
+
+    Reads `tripid` from the query string or body, resolves it with
+    resolve_trip and passes the trip to the view as its second argument.
+    Answers 400 for a missing or malformed ID, 404 for an unknown trip and 403
+    when the caller is not an active member, or not the owner with
+    `owner_only`.
+
+    Args:
+        owner_only: Only the trip owner may call the view
+        denied: Error message when the owner check fails
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            tripid = get_request_tripid(request)
+            if not tripid:
+                return Response({
+                    'success': False,
+                    'errors': [{'msg': 'Trip ID is required'}]
+                }, status=status.HTTP_400_BAD_REQUEST)
+            try:
+                UUID(str(tripid))
+            except ValueError:
+                return Response({
+                    'success': False,
+                    'errors': [{'msg': 'Invalid trip ID'}]
+                }, status=status.HTTP_400_BAD_REQUEST)
+
+            trip = resolve_trip(request, tripid)
+            if trip is None:
+                return Response({
+                    'success': False,
+                    'errors': [{'msg': 'Trip not found'}]
+                }, status=status.HTTP_404_NOT_FOUND)
+
+            if owner_only and trip.owner_id != request.user.pk:
+                return Response({
+                    'success': False,
+                    'errors': [{'msg': denied or 'Only trip owner can perform this action'}]
+                }, status=status.HTTP_403_FORBIDDEN)
+            if not owner_only and not trip.is_member:
+                return Response({
+                    'success': False,
+                    'errors': [{'msg': 'You are not a member of this trip'}]
+                }, status=status.HTTP_403_FORBIDDEN)
+
+            return view(request, trip, *args, **kwargs)
+        return wrapper
+    return decorator
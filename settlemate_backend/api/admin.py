@@ -1,11 +1,28 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from .models import (
-    User, Trip, TripMember, Transaction, TransactionMember,
+    User, Trip, TripMember, Transaction, TransactionMember, TripBalance, SyncTombstone,
     ChatMessage, TripInvite, PasswordResetToken, UserSession, FileUpload
 )
 
 
+class LedgerAdmin(admin.ModelAdmin):
+    """
+    View-only admin for models behind the TripBalance ledger. Writes made here
+    would skip the balance update and ledger_version bump, leaving balances
+    and cached plans wrong; change them through the API instead.
+    """
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
 @admin.register(User)
 class UserAdmin(BaseUserAdmin):
     """Admin configuration for User model"""
@@ -54,7 +71,7 @@ class TripMemberAdmin(admin.ModelAdmin):
 
 
 @admin.register(Transaction)
-class TransactionAdmin(admin.ModelAdmin):
+class TransactionAdmin(LedgerAdmin):
     """Admin configuration for Transaction model"""
     list_display = ['name', 'trip', 'amount', 'paid_by', 'is_enabled', 'created_at']
     list_filter = ['is_enabled', 'created_at']
@@ -63,7 +80,7 @@ class TransactionAdmin(admin.ModelAdmin):
 
 
 @admin.register(TransactionMember)
-class TransactionMemberAdmin(admin.ModelAdmin):
+class TransactionMemberAdmin(LedgerAdmin):
     """Admin configuration for TransactionMember model"""
     list_display = ['transaction', 'user', 'amount_owed', 'is_included']
     list_filter = ['is_included']
@@ -71,6 +88,14 @@ class TransactionMemberAdmin(admin.ModelAdmin):
     ordering = ['-transaction__created_at']
 
 
+@admin.register(TripBalance)
+class TripBalanceAdmin(LedgerAdmin):
+    """Admin configuration for TripBalance model"""
+    list_display = ['trip', 'user', 'net_paise', 'updated_at']
+    search_fields = ['trip__name', 'user__name', 'user__email']
+    ordering = ['trip', 'user']
+
+
 @admin.register(ChatMessage)
 class ChatMessageAdmin(admin.ModelAdmin):
     """Admin configuration for ChatMessage model"""
@@ -117,4 +142,12 @@ class FileUploadAdmin(admin.ModelAdmin):
     list_display = ['file_name', 'user', 'trip', 'file_size', 'uploaded_at']
     list_filter = ['uploaded_at']
     search_fields = ['file_name', 'user__name', 'trip__name']
-    ordering = ['-uploaded_at']
\ No newline at end of file
+    ordering = ['-uploaded_at']
+
+
+@admin.register(SyncTombstone)
+class SyncTombstoneAdmin(admin.ModelAdmin):
+    """Admin configuration for SyncTombstone model"""
+    list_display = ['kind', 'object_id', 'trip_id', 'created_at']
+    list_filter = ['kind', 'created_at']
+    ordering = ['-created_at']
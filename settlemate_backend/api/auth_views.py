@@ -1,7 +1,8 @@
 from rest_framework import status, generics, permissions
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, authentication_classes, permission_classes
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.exceptions import AuthenticationFailed
 from django.contrib.auth import authenticate
 from django.core.mail import send_mail
 from django.conf import settings
@@ -16,25 +17,32 @@ from .serializers import (
     PasswordResetSerializer, PasswordResetConfirmSerializer,
     TripInviteSerializer
 )
-from .authentication import generate_jwt_token, invalidate_user_sessions
+from .authentication import (
+    evict_user_principals, generate_token_pair, invalidate_user_sessions, revoke_session, rotate_refresh_token
+)
+from .caching import bump_user_trip_versions
+from .throttling import rate_limit
 
 logger = logging.getLogger(__name__)
 
 
 @api_view(['POST'])
 @permission_classes([AllowAny])
+@rate_limit('signup')
 def signup(request):
     """User registration endpoint"""
     try:
         serializer = UserRegistrationSerializer(data=request.data)
         if serializer.is_valid():
             user = serializer.save()
-            token = generate_jwt_token(user)
+            access_token, refresh_token = generate_token_pair(user, device_info=request.META.get('HTTP_USER_AGENT'))
             
             return Response({
                 'success': True,
                 'message': 'User created successfully',
-                'authToken': token,
+                'authToken': access_token,
+                'refreshToken': refresh_token,
+                'expiresIn': settings.JWT_ACCESS_EXPIRATION_DELTA,
                 'user': UserSerializer(user).data
             }, status=status.HTTP_201_CREATED)
         
@@ -53,18 +61,21 @@ def signup(request):
 
 @api_view(['POST'])
 @permission_classes([AllowAny])
+@rate_limit('login')
 def login(request):
     """User login endpoint"""
     try:
         serializer = UserLoginSerializer(data=request.data)
         if serializer.is_valid():
             user = serializer.validated_data['user']
-            token = generate_jwt_token(user)
+            access_token, refresh_token = generate_token_pair(user, device_info=request.META.get('HTTP_USER_AGENT'))
             
             return Response({
                 'success': True,
                 'message': 'Login successful',
-                'authToken': token,
+                'authToken': access_token,
+                'refreshToken': refresh_token,
+                'expiresIn': settings.JWT_ACCESS_EXPIRATION_DELTA,
                 'user': UserSerializer(user).data
             }, status=status.HTTP_200_OK)
         
@@ -81,8 +92,45 @@ def login(request):
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+@api_view(['POST'])
+@authentication_classes([])  # the client's access token has usually expired by now
+@permission_classes([AllowAny])
+def refresh_token(request):
+    """Exchange a refresh token for a new access and refresh token pair"""
+    try:
+        token = request.data.get('refreshToken')
+        if not token:
+            return Response({
+                'success': False,
+                'errors': [{'msg': 'Refresh token is required'}]
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        try:
+            access_token, new_refresh_token = rotate_refresh_token(token)
+        except AuthenticationFailed as e:
+            return Response({
+                'success': False,
+                'errors': [{'msg': str(e.detail)}]
+            }, status=status.HTTP_401_UNAUTHORIZED)
+        
+        return Response({
+            'success': True,
+            'authToken': access_token,
+            'refreshToken': new_refresh_token,
+            'expiresIn': settings.JWT_ACCESS_EXPIRATION_DELTA
+        }, status=status.HTTP_200_OK)
+        
+    except Exception as e:
+        logger.error(f"Refresh token error: {str(e)}")
+        return Response({
+            'success': False,
+            'errors': [{'msg': 'An error occurred while refreshing the session'}]
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
 @api_view(['POST'])
 @permission_classes([AllowAny])
+@rate_limit('forgot_password')
 def forgot_password(request):
     """Password reset request endpoint"""
     try:
@@ -195,8 +243,9 @@ def change_password(request):
 def logout(request):
     """User logout endpoint"""
     try:
-        # Invalidate current session
-        invalidate_user_sessions(request.user)
+        # Invalidate current session only; the user's other devices stay signed in
+        if request.auth:
+            revoke_session(request.auth)
         
         return Response({
             'success': True,
@@ -245,7 +294,11 @@ def edit_profile(request):
     try:
         serializer = UserSerializer(request.user, data=request.data, partial=True)
         if serializer.is_valid():
-            serializer.save()
+            with transaction.atomic():
+                serializer.save()
+                # Names and UPI IDs appear in cached trip data and cached principals
+                bump_user_trip_versions(request.user.id)
+                evict_user_principals(request.user)
             
             return Response({
                 'success': True,
@@ -1,11 +1,43 @@
+import hashlib
 import jwt
-from datetime import datetime, timedelta
+import logging
+import time
+import uuid
+from datetime import timedelta
+from typing import Iterable, Tuple
 from django.conf import settings
 from django.contrib.auth import authenticate
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
 from rest_framework import authentication, exceptions
 from rest_framework.authentication import BaseAuthentication
+from .caching import TieredCache
 from .models import User, UserSession
 
+logger = logging.getLogger(__name__)
+
+# User snapshots by user ID, so verifying an access token needs no database read
+principal_cache = TieredCache(
+    prefix='principal',
+    maxsize=settings.PRINCIPAL_CACHE_LOCAL_SIZE,
+    timeout=settings.PRINCIPAL_CACHE_TIMEOUT,
+    local_ttl=settings.PRINCIPAL_CACHE_LOCAL_TTL
+)
+
+# User columns kept in the snapshot; the password hash stays out of the cache and loads on access
+SNAPSHOT_FIELDS = [field.attname for field in User._meta.concrete_fields if field.attname != 'password']
+
+# Cache keys marking revoked sessions until their last access token has expired
+REVOKED_SESSION_PREFIX = 'revoked-session'
+
+# Cache key holding the time (epoch seconds, float) since which the cache has every revocation mark.
+# It has no timeout, so it disappears only when the cache is flushed or restarted empty.
+REVOCATION_EPOCH_KEY = f'{REVOKED_SESSION_PREFIX}:epoch'
+
+ACCESS_TOKEN = 'access'
+REFRESH_TOKEN = 'refresh'
+
 
 class JWTAuthentication(BaseAuthentication):
     """Custom JWT Authentication for Django REST Framework"""
@@ -21,89 +53,278 @@ class JWTAuthentication(BaseAuthentication):
         except IndexError:
             return None
             
-        try:
-            payload = jwt.decode(
-                token, 
-                settings.JWT_SECRET_KEY, 
-                algorithms=[settings.JWT_ALGORITHM]
-            )
-        except jwt.ExpiredSignatureError:
-            raise exceptions.AuthenticationFailed('Token has expired')
-        except jwt.InvalidTokenError:
-            raise exceptions.AuthenticationFailed('Invalid token')
-            
-        try:
-            user = User.objects.get(id=payload['user_id'])
-        except User.DoesNotExist:
-            raise exceptions.AuthenticationFailed('User not found')
-            
-        # Check if session is still active
-        try:
-            session = UserSession.objects.get(
-                token=token,
-                user=user,
-                is_active=True,
-                expires_at__gt=datetime.now()
-            )
-        except UserSession.DoesNotExist:
-            raise exceptions.AuthenticationFailed('Session expired')
-            
-        return (user, token)
+        return (authenticate_token(token), token)
     
     def authenticate_header(self, request):
         return 'Bearer'
 
 
-def generate_jwt_token(user):
-    """Generate JWT token for user"""
+def token_digest(token: str) -> str:
+    """Fixed-length key for a token"""
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def _decode(token: str) -> dict:
+    try:
+        return jwt.decode(
+            token,
+            settings.JWT_SECRET_KEY,
+            algorithms=[settings.JWT_ALGORITHM]
+        )
+    except jwt.ExpiredSignatureError:
+        raise exceptions.AuthenticationFailed('Token has expired')
+    except jwt.InvalidTokenError:
+        raise exceptions.AuthenticationFailed('Invalid token')
+
+
+def evict_user_principals(user) -> None:
+    """
+    Forget the cached snapshot of `user` now and again once the current
+    transaction commits, so a request racing with the write cannot re-cache it.
+    """
+    key = str(user.pk)
+    principal_cache.delete(key)
+    transaction.on_commit(lambda: principal_cache.delete(key))
+
+
+def get_principal(user_id) -> User:
+    """
+    The user behind a verified token, from the principal cache.
+
+    Each call returns a fresh User built from the snapshot, so requests never
+    share an instance.
+
+    Raises:
+        exceptions.AuthenticationFailed: Unknown user
+    """
+    key = str(user_id)
+    snapshot = principal_cache.get(key)
+    if snapshot is None:
+        user = User.objects.filter(id=user_id).first()
+        if user is None:
+            raise exceptions.AuthenticationFailed('User not found')
+        principal_cache.set(key, [getattr(user, name) for name in SNAPSHOT_FIELDS])
+        return user
+    return User.from_db('default', SNAPSHOT_FIELDS, snapshot)
+
+
+def ensure_revocation_epoch() -> float:
+    """
+    The revocation epoch, starting a new one now if the cache has none.
+
+    Every revocation after the epoch has its mark in the cache, so a missing
+    mark can be trusted for tokens issued at or after it. Tokens issued before
+    it (e.g. before the cache was flushed) are checked against the database.
+    """
+    now = time.time()
+    cache.add(REVOCATION_EPOCH_KEY, now, timeout=None)
+    return cache.get(REVOCATION_EPOCH_KEY, now)
+
+
+def revoke_session_ids(session_ids: Iterable) -> None:
+    """
+    Reject every outstanding access token of these sessions.
+
+    The marks live in the shared cache for JWT_ACCESS_EXPIRATION_DELTA, the
+    longest any access token of a session can still be valid. The session rows
+    are deactivated by the caller and stay the source of truth; see
+    is_session_revoked for when they are read.
+
+    If the marks cannot be written, the revocation epoch is dropped instead,
+    so every token issued so far is checked against the session rows.
+
+    Raises:
+        Exception: Neither the marks nor the epoch could be updated
+    """
+    marks = {f'{REVOKED_SESSION_PREFIX}:{session_id}': True for session_id in session_ids}
+    if not marks:
+        return
+    try:
+        ensure_revocation_epoch()
+        cache.set_many(marks, timeout=settings.JWT_ACCESS_EXPIRATION_DELTA)
+    except Exception as e:
+        logger.error(f"Session revocation write failed, dropping the revocation epoch: {str(e)}")
+        cache.delete(REVOCATION_EPOCH_KEY)
+
+
+def _session_inactive(session_id) -> bool:
+    return not UserSession.objects.filter(id=session_id, is_active=True).exists()
+
+
+def is_session_revoked(session_id, issued_at: float) -> bool:
+    """
+    Whether access tokens of the session have been revoked.
+
+    One cache round trip reads the session's mark and the revocation epoch.
+    A missing mark is trusted only for tokens issued at or after the epoch; a
+    flushed cache (no epoch) or an older token falls back to the session row,
+    as does a cache error. An individually evicted mark cannot be detected, so
+    the cache Redis should run with `maxmemory-policy noeviction`.
+
+    Args:
+        session_id: The token's `sid`
+        issued_at: The token's `iat` (epoch seconds, with sub-second precision)
+    """
+    mark = f'{REVOKED_SESSION_PREFIX}:{session_id}'
+    try:
+        values = cache.get_many([mark, REVOCATION_EPOCH_KEY])
+        if values.get(mark):
+            return True
+        epoch = values.get(REVOCATION_EPOCH_KEY)
+        if epoch is None:
+            epoch = ensure_revocation_epoch()
+    except Exception as e:
+        logger.warning(f"Session revocation read failed: {str(e)}")
+        return _session_inactive(session_id)
+    if issued_at < epoch:
+        return _session_inactive(session_id)
+    return False
+
+
+def _authenticate_legacy(token: str, payload: dict) -> User:
+    """Tokens issued before the access/refresh split carry no type; they are checked against their session"""
+    try:
+        session = UserSession.objects.select_related('user').get(
+            token_digest=token_digest(token),
+            user_id=payload['user_id'],
+            is_active=True,
+            expires_at__gt=timezone.now()
+        )
+    except UserSession.DoesNotExist:
+        raise exceptions.AuthenticationFailed('Session expired')
+    return session.user
+
+
+def authenticate_token(token: str) -> User:
+    """
+    Resolve an access token to its user without reading the database.
+
+    The signature and expiry are checked locally, revocation through a
+    session mark in the shared cache (see is_session_revoked for when the
+    session row is read instead) and the user comes from the principal cache.
+
+    Raises:
+        exceptions.AuthenticationFailed: Invalid, expired or revoked token, or unknown user
+    """
+    payload = _decode(token)
+    token_type = payload.get('type')
+    if token_type is None:
+        return _authenticate_legacy(token, payload)
+    if token_type != ACCESS_TOKEN:
+        raise exceptions.AuthenticationFailed('Invalid token')
+    if is_session_revoked(payload['sid'], payload['iat']):
+        raise exceptions.AuthenticationFailed('Session expired')
+    return get_principal(payload['user_id'])
+
+
+def _encode(user, session_id, token_type: str, issued_at, lifetime: int) -> Tuple[str, str]:
+    """(token, jti) of a new token for the session"""
+    jti = uuid.uuid4().hex
     payload = {
         'user_id': str(user.id),
         'email': user.email,
-        'exp': datetime.utcnow() + timedelta(seconds=settings.JWT_EXPIRATION_DELTA),
-        'iat': datetime.utcnow()
+        'sid': str(session_id),
+        'jti': jti,
+        'type': token_type,
+        'exp': issued_at + timedelta(seconds=lifetime),
+        'iat': issued_at.timestamp()  # not rounded, so it compares exactly with the revocation epoch
     }
-    
-    token = jwt.encode(payload, settings.JWT_SECRET_KEY, algorithm=settings.JWT_ALGORITHM)
-    
-    # Create or update user session
-    expires_at = datetime.utcnow() + timedelta(seconds=settings.JWT_EXPIRATION_DELTA)
-    UserSession.objects.update_or_create(
+    return jwt.encode(payload, settings.JWT_SECRET_KEY, algorithm=settings.JWT_ALGORITHM), jti
+
+
+def _start_revocation_epoch() -> None:
+    """Make sure an epoch exists before issuing, so new tokens can skip the database check"""
+    try:
+        ensure_revocation_epoch()
+    except Exception as e:
+        logger.warning(f"Revocation epoch write failed: {str(e)}")
+
+
+def _token_pair(user, session_id) -> Tuple[str, str, str, object]:
+    """Access token, refresh token, refresh jti and refresh expiry for a session"""
+    issued_at = timezone.now()
+    access, _ = _encode(user, session_id, ACCESS_TOKEN, issued_at, settings.JWT_ACCESS_EXPIRATION_DELTA)
+    refresh, jti = _encode(user, session_id, REFRESH_TOKEN, issued_at, settings.JWT_REFRESH_EXPIRATION_DELTA)
+    return access, refresh, jti, issued_at + timedelta(seconds=settings.JWT_REFRESH_EXPIRATION_DELTA)
+
+
+def generate_token_pair(user, device_info=None) -> Tuple[str, str]:
+    """
+    Open a new session for user and return its (access token, refresh token).
+
+    Each login gets its own session row, so a user can stay signed in on
+    several devices at once. The row tracks the current refresh token; access
+    tokens are short-lived and never looked up.
+    """
+    session_id = uuid.uuid4()
+    _start_revocation_epoch()
+    access, refresh, jti, expires_at = _token_pair(user, session_id)
+    UserSession.objects.create(
+        id=session_id,
         user=user,
-        defaults={
-            'token': token,
-            'expires_at': expires_at,
-            'is_active': True
-        }
+        jti=jti,
+        token_digest=token_digest(refresh),
+        expires_at=expires_at,
+        device_info=(device_info or '')[:200] or None
     )
-    
-    return token
+    return access, refresh
+
+
+def rotate_refresh_token(refresh: str) -> Tuple[str, str]:
+    """
+    Exchange a refresh token for a new (access token, refresh token).
+
+    The presented refresh token is single use: the session row moves to the
+    new one, so replaying the old token fails.
+
+    Raises:
+        exceptions.AuthenticationFailed: Invalid, expired, reused or revoked refresh token
+    """
+    payload = _decode(refresh)
+    if payload.get('type') != REFRESH_TOKEN:
+        raise exceptions.AuthenticationFailed('Invalid token')
+
+    digest = token_digest(refresh)
+    session = UserSession.objects.select_related('user').filter(
+        token_digest=digest,
+        is_active=True,
+        expires_at__gt=timezone.now()
+    ).first()
+    if session is None:
+        raise exceptions.AuthenticationFailed('Session expired')
+
+    _start_revocation_epoch()
+    access, new_refresh, jti, expires_at = _token_pair(session.user, session.id)
+    rotated = UserSession.objects.filter(pk=session.pk, token_digest=digest, is_active=True).update(
+        jti=jti,
+        token_digest=token_digest(new_refresh),
+        expires_at=expires_at
+    )
+    if not rotated:  # a concurrent refresh won
+        raise exceptions.AuthenticationFailed('Session expired')
+    return access, new_refresh
 
 
 def verify_jwt_token(token):
     """Verify JWT token and return user"""
     try:
-        payload = jwt.decode(
-            token, 
-            settings.JWT_SECRET_KEY, 
-            algorithms=[settings.JWT_ALGORITHM]
-        )
-        
-        user = User.objects.get(id=payload['user_id'])
-        
-        # Check if session is still active
-        session = UserSession.objects.get(
-            token=token,
-            user=user,
-            is_active=True,
-            expires_at__gt=datetime.now()
-        )
-        
-        return user
-        
-    except (jwt.ExpiredSignatureError, jwt.InvalidTokenError, User.DoesNotExist, UserSession.DoesNotExist):
+        return authenticate_token(token)
+    except exceptions.AuthenticationFailed:
         return None
 
 
+def revoke_session(token):
+    """Invalidate the single session `token` belongs to, e.g. on logout"""
+    payload = _decode(token)
+    if 'sid' in payload:
+        UserSession.objects.filter(id=payload['sid'], is_active=True).update(is_active=False)
+        revoke_session_ids([payload['sid']])
+    else:
+        UserSession.objects.filter(token_digest=token_digest(token), is_active=True).update(is_active=False)
+
+
 def invalidate_user_sessions(user):
     """Invalidate all sessions for a user"""
-    UserSession.objects.filter(user=user, is_active=True).update(is_active=False)
+    session_ids = list(UserSession.objects.filter(user=user, is_active=True).values_list('id', flat=True))
+    UserSession.objects.filter(id__in=session_ids).update(is_active=False)
+    revoke_session_ids(session_ids)
@@ -0,0 +1,84 @@
+from typing import Dict, Iterable, Optional, Tuple
+from uuid import UUID
+
+import numpy as np
+
+from .models import Transaction, TransactionMember, TripBalance
+
+# (trip_id, user_id) -> net balance in paise
+Balances = Dict[Tuple[UUID, UUID], int]
+
+
+def _to_paise(amounts) -> np.ndarray:
+    """Vectorized rupees -> int64 paise for two-decimal amounts"""
+    return np.rint(np.asarray(amounts, dtype=np.float64) * 100).astype(np.int64)
+
+
+def _net_by_key(trip_ids, user_ids, paise: np.ndarray) -> Balances:
+    """Sum signed paise per (trip, user) in one vectorized pass"""
+    if not len(paise):
+        return {}
+
+    trips, trip_idx = np.unique(np.asarray(trip_ids, dtype=object), return_inverse=True)
+    users, user_idx = np.unique(np.asarray(user_ids, dtype=object), return_inverse=True)
+    keys = trip_idx.astype(np.int64) * len(users) + user_idx
+
+    unique_keys, slot = np.unique(keys, return_inverse=True)
+    totals = np.zeros(len(unique_keys), dtype=np.int64)
+    np.add.at(totals, slot, paise)
+
+    nonzero = np.flatnonzero(totals)
+    key_trip, key_user = np.divmod(unique_keys[nonzero], len(users))
+    return {
+        (trips[t], users[u]): int(total)
+        for t, u, total in zip(key_trip.tolist(), key_user.tolist(), totals[nonzero].tolist())
+    }
+
+
+def compute_balances(trip_ids: Optional[Iterable] = None) -> Balances:
+    """
+    Net balances for many trips at once, straight from raw transactions.
+
+    Loads (trip_id, payer_id, paise) and (trip_id, member_id, paise) columns with
+    values_list and nets them with NumPy, so the cost is two queries plus a few
+    array operations however many trips are involved.
+
+    Args:
+        trip_ids: Restrict to these trips (default: every trip)
+
+    Returns:
+        Mapping of (trip_id, user_id) to non-zero net balance in paise
+    """
+    paid = Transaction.objects.filter(is_enabled=True)
+    owed = TransactionMember.objects.filter(transaction__is_enabled=True, is_included=True)
+    if trip_ids is not None:
+        trip_ids = list(trip_ids)
+        paid = paid.filter(trip_id__in=trip_ids)
+        owed = owed.filter(transaction__trip_id__in=trip_ids)
+
+    paid_rows = list(paid.values_list('trip_id', 'paid_by_id', 'amount').order_by())
+    owed_rows = list(owed.values_list('transaction__trip_id', 'user_id', 'amount_owed').order_by())
+    if not paid_rows and not owed_rows:
+        return {}
+
+    paid_trips, payers, paid_amounts = zip(*paid_rows) if paid_rows else ((), (), ())
+    owed_trips, members, owed_amounts = zip(*owed_rows) if owed_rows else ((), (), ())
+    paise = np.concatenate([_to_paise(paid_amounts), -_to_paise(owed_amounts)])
+    return _net_by_key(paid_trips + owed_trips, payers + members, paise)
+
+
+def stored_balances(trip_ids: Optional[Iterable] = None) -> Balances:
+    """Non-zero TripBalance rows keyed by (trip_id, user_id)"""
+    rows = TripBalance.objects.exclude(net_paise=0)
+    if trip_ids is not None:
+        rows = rows.filter(trip_id__in=list(trip_ids))
+    return {(trip_id, user_id): net_paise for trip_id, user_id, net_paise in rows.values_list('trip_id', 'user_id', 'net_paise')}
+
+
+def diff_balances(stored: Balances, expected: Balances) -> Dict[Tuple[UUID, UUID], Tuple[int, int]]:
+    """(trip_id, user_id) -> (stored, expected) for every disagreement"""
+    return {
+        key: (stored.get(key, 0), expected.get(key, 0))
+        for key in stored.keys() | expected.keys()
+        if stored.get(key, 0) != expected.get(key, 0)
+    }
@@ -0,0 +1,113 @@
+import random
+import time
+import tracemalloc
+import uuid
+from typing import Callable, Dict, NamedTuple
+
+from django.contrib.auth.hashers import make_password
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from .ledger import rebuild_trip_ledger
+from .models import Transaction, TransactionMember, Trip, TripMember, User
+from .settlement import split_paise, from_paise
+
+
+class TripShape(NamedTuple):
+    """Shape of a synthetic trip"""
+    members: int = 10
+    transactions: int = 100
+    density: float = 0.5   # fraction of members included in each expense
+    skew: float = 1.0      # Zipf exponent for who pays; 0 means everyone pays equally often
+
+    @classmethod
+    def parse(cls, spec: str) -> 'TripShape':
+        """Parse 'members=50,transactions=500,density=0.3,skew=1.2' (any subset of keys)"""
+        values = {}
+        for part in filter(None, spec.split(',')):
+            key, _, value = part.partition('=')
+            key = key.strip()
+            if key not in cls._fields:
+                raise ValueError(f'Unknown trip shape key: {key}')
+            values[key] = type(cls._field_defaults[key])(value)
+        return cls(**values)
+
+    def label(self) -> str:
+        return f'members={self.members},transactions={self.transactions},density={self.density},skew={self.skew}'
+
+
+def synthetic_balances(members: int, seed: int) -> Dict[uuid.UUID, int]:
+    """Random zero-sum balances (in paise) for `members` users"""
+    rng = random.Random(seed)
+    balances = {uuid.UUID(int=rng.getrandbits(128)): rng.randint(-500000, 500000) for _ in range(members)}
+    first = next(iter(balances))
+    balances[first] -= sum(balances.values())
+    return balances
+
+
+def generate_trip(shape: TripShape, seed: int = 42) -> Trip:
+    """
+    Create a trip of the given shape with bulk inserts and build its ledger.
+
+    Payers are drawn with Zipf weights (a few members pay for most things when
+    `skew` is high); each expense is split evenly across a random
+    `density` fraction of the members.
+    """
+    rng = random.Random(seed)
+    tag = uuid.UUID(int=rng.getrandbits(128)).hex[:8]
+    password = make_password(None)
+
+    users = User.objects.bulk_create([
+        User(
+            username=f'bench-{tag}-{i}@example.com',
+            email=f'bench-{tag}-{i}@example.com',
+            name=f'Bench User {i}',
+            password=password
+        )
+        for i in range(shape.members)
+    ])
+    trip = Trip.objects.create(name=f'Benchmark trip {tag}', owner=users[0])
+    TripMember.objects.bulk_create([TripMember(trip=trip, user=user) for user in users])
+
+    payer_weights = [1 / (rank + 1) ** shape.skew for rank in range(shape.members)]
+    split_size = max(1, round(shape.density * shape.members))
+
+    transactions = []
+    member_rows = []
+    for i in range(shape.transactions):
+        amount = rng.randint(100, 5000000)
+        transaction_obj = Transaction(
+            trip=trip,
+            name=f'Expense {i}',
+            amount=from_paise(amount),
+            paid_by=rng.choices(users, weights=payer_weights)[0]
+        )
+        transactions.append(transaction_obj)
+
+        included = sorted(rng.sample(users, split_size), key=lambda user: str(user.id))
+        for user, share in zip(included, split_paise(amount, [1] * len(included))):
+            member_rows.append(TransactionMember(transaction=transaction_obj, user=user, amount_owed=from_paise(share)))
+
+    Transaction.objects.bulk_create(transactions, batch_size=1000)
+    TransactionMember.objects.bulk_create(member_rows, batch_size=1000)
+    rebuild_trip_ledger(trip)
+    trip.refresh_from_db()
+    return trip
+
+
+def measure(fn: Callable[[], object]) -> Dict:
+    """Run `fn` once and record wall time, query count and peak traced memory"""
+    tracemalloc.start()
+    try:
+        with CaptureQueriesContext(connection) as ctx:
+            started = time.perf_counter()
+            fn()
+            wall_ms = (time.perf_counter() - started) * 1000
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        'wall_ms': round(wall_ms, 3),
+        'queries': len(ctx.captured_queries),
+        'peak_kib': round(peak / 1024, 1),
+    }
@@ -0,0 +1,307 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, FrozenSet, Iterable, NamedTuple, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import F
+
+from .models import Trip
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+class LRUCache:
+    """Small thread-safe in-process LRU cache with an optional per-entry TTL"""
+
+    def __init__(self, maxsize: int = 1024, ttl: Optional[float] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                return default
+            value, expires_at = entry
+            if expires_at is not None and expires_at < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl: Optional[float] = None):
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def delete_where(self, predicate: Callable[[Any], bool]):
+        """Drop every entry whose key matches `predicate`"""
+        with self._lock:
+            for key in [key for key in self._data if predicate(key)]:
+                del self._data[key]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class TieredCache:
+    """
+    In-process LRU in front of the configured Django cache (Redis).
+
+    Use it for immutable values, e.g. ones whose key embeds a version: the
+    local tier is never invalidated across processes. Mutable values need a
+    `local_ttl` bounding how long other processes may serve a deleted entry,
+    or `maxsize=0` to skip the local tier when no staleness is acceptable.
+    Shared-cache errors are logged and treated as misses so an unavailable
+    Redis only costs speed.
+    """
+
+    def __init__(self, prefix: str, maxsize: int, timeout: int, local_ttl: Optional[float] = None):
+        self.prefix = prefix
+        self.timeout = timeout
+        self.local = LRUCache(maxsize=maxsize, ttl=local_ttl) if maxsize else None
+
+    def _key(self, key: str) -> str:
+        return f'{self.prefix}:{key}'
+
+    def get(self, key: str, default=None):
+        key = self._key(key)
+        if self.local is not None:
+            value = self.local.get(key, _MISSING)
+            if value is not _MISSING:
+                return value
+        try:
+            value = cache.get(key, _MISSING)
+        except Exception as e:
+            logger.warning(f"Shared cache read failed for {key}: {str(e)}")
+            value = _MISSING
+        if value is _MISSING:
+            return default
+        if self.local is not None:
+            self.local.set(key, value)
+        return value
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Any]:
+        """Like get for several keys, with one shared-cache round trip for the local misses"""
+        found = {}
+        missing = {}
+        for key in keys:
+            full_key = self._key(key)
+            value = self.local.get(full_key, _MISSING) if self.local is not None else _MISSING
+            if value is _MISSING:
+                missing[full_key] = key
+            else:
+                found[key] = value
+        if not missing:
+            return found
+        try:
+            values = cache.get_many(list(missing))
+        except Exception as e:
+            logger.warning(f"Shared cache read failed for {len(missing)} keys: {str(e)}")
+            values = {}
+        for full_key, value in values.items():
+            if self.local is not None:
+                self.local.set(full_key, value)
+            found[missing[full_key]] = value
+        return found
+
+    def set(self, key: str, value) -> None:
+        key = self._key(key)
+        if self.local is not None:
+            self.local.set(key, value)
+        try:
+            cache.set(key, value, self.timeout)
+        except Exception as e:
+            logger.warning(f"Shared cache write failed for {key}: {str(e)}")
+
+    def delete(self, key: str) -> None:
+        """Drop the entry from the shared tier and this process's local tier"""
+        key = self._key(key)
+        if self.local is not None:
+            self.local.delete(key)
+        try:
+            cache.delete(key)
+        except Exception as e:
+            logger.warning(f"Shared cache delete failed for {key}: {str(e)}")
+
+    def get_or_set(self, key: str, compute: Callable[[], Any]):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = compute()
+            self.set(key, value)
+        return value
+
+    def clear_local(self) -> None:
+        if self.local is not None:
+            self.local.clear()
+
+
+# Settlement plans and summaries, keyed by (trip, ledger version)
+trip_cache = TieredCache(
+    prefix='trip',
+    maxsize=settings.TRIP_CACHE_LOCAL_SIZE,
+    timeout=settings.TRIP_CACHE_TIMEOUT
+)
+
+
+def trip_cache_key(kind: str, trip: Trip, *parts) -> str:
+    """Cache key for data derived from `trip` at its current ledger version"""
+    return ':'.join([kind, str(trip.id), str(trip.ledger_version), *map(str, parts)])
+
+
+def bump_trip_version(trip_id) -> None:
+    """
+    Invalidate everything cached for a trip by moving it to a new ledger version.
+    Call it inside the same database transaction as the write it accounts for.
+    """
+    Trip.objects.filter(pk=trip_id).update(ledger_version=F('ledger_version') + 1)
+
+
+def bump_user_trip_versions(user_id) -> None:
+    """Invalidate every trip the user belongs to, e.g. after their name or UPI ID changes"""
+    Trip.objects.filter(tripmember__user_id=user_id).update(ledger_version=F('ledger_version') + 1)
+
+
+class TripMembership(NamedTuple):
+    """Who may act on a trip, as cached by get_trip_membership"""
+    owner_id: str
+    is_active: bool
+    member_ids: FrozenSet[str]
+
+    def is_member(self, user_id) -> bool:
+        """Whether `user_id` is an active member of an active trip"""
+        return self.is_active and str(user_id) in self.member_ids
+
+
+# Active-member sets of trips, keyed by (trip, membership generation); see get_trip_membership.
+# Shared tier only: they authorize socket events and validate splits, so no worker may keep
+# serving a set another worker has invalidated.
+membership_cache = TieredCache(
+    prefix='members',
+    maxsize=0,
+    timeout=settings.MEMBERSHIP_CACHE_TIMEOUT
+)
+
+MEMBERSHIP_INVALIDATION_ATTEMPTS = 3
+
+
+def membership_generation_key(trip_id) -> str:
+    return f'members-gen:{trip_id}'
+
+
+def _membership_generation(trip_id) -> Optional[int]:
+    """
+    Current membership generation of a trip, starting one if the cache has
+    none, or None when the cache is unreachable.
+
+    Generations start at the current time in nanoseconds rather than 0, so
+    after an eviction or expiry a set cached under an earlier generation is
+    never read again.
+    """
+    key = membership_generation_key(trip_id)
+    try:
+        generation = cache.get(key)
+        if generation is None:
+            cache.add(key, time.time_ns(), settings.MEMBERSHIP_CACHE_TIMEOUT)
+            generation = cache.get(key)
+        return generation
+    except Exception as e:
+        logger.warning(f"Membership generation read failed for {key}: {str(e)}")
+        return None
+
+
+def _load_trip_membership(trip_id) -> Optional[TripMembership]:
+    """Trip row and member rows in one LEFT JOIN query"""
+    try:
+        rows = list(Trip.objects.filter(pk=trip_id).values_list(
+            'owner_id', 'is_active', 'tripmember__user_id', 'tripmember__is_active'
+        ))
+    except (ValidationError, ValueError):
+        return None
+    if not rows:
+        return None
+    owner_id, is_active = rows[0][:2]
+    member_ids = frozenset(str(user_id) for _, _, user_id, member_active in rows if user_id and member_active)
+    return TripMembership(owner_id=str(owner_id), is_active=is_active, member_ids=member_ids)
+
+
+def get_trip_membership(trip_id) -> Optional[TripMembership]:
+    """
+    Owner, active flag and active member IDs of a trip.
+
+    Served from Redis and only loaded from the database on a miss. Sets are
+    keyed by the trip's membership generation, which is read before the
+    database is, and every membership write moves it on. A reader that loaded
+    the old members therefore caches them under a generation nobody reads
+    any more. There is no in-process copy, so every worker sees a kick or a
+    join as soon as it commits.
+
+    Args:
+        trip_id: Trip ID (malformed IDs are treated as missing trips)
+
+    Returns:
+        TripMembership, or None if the trip does not exist
+    """
+    generation = _membership_generation(trip_id)
+    if generation is None:
+        return _load_trip_membership(trip_id)
+    key = f'{trip_id}:{generation}'
+    membership = membership_cache.get(key)
+    if membership is None:
+        membership = _load_trip_membership(trip_id)
+        if membership is not None:
+            membership_cache.set(key, membership)
+    return membership
+
+
+def _bump_membership_generation(trip_id) -> None:
+    key = membership_generation_key(trip_id)
+    for attempt in range(1, MEMBERSHIP_INVALIDATION_ATTEMPTS + 1):
+        try:
+            cache.incr(key)
+            return
+        except ValueError:
+            # No generation yet: the next reader starts a fresh one
+            return
+        except Exception as e:
+            if attempt == MEMBERSHIP_INVALIDATION_ATTEMPTS:
+                logger.error(
+                    f"Membership invalidation failed for {key}; cached members may be stale "
+                    f"for up to {settings.MEMBERSHIP_CACHE_TIMEOUT}s: {str(e)}"
+                )
+                return
+            time.sleep(0.05 * attempt)
+
+
+def invalidate_trip_membership(trip_id) -> None:
+    """
+    Move a trip to a new membership generation now and again once the
+    current transaction commits. A reader that loaded the old members before
+    the commit caches them under a generation that is already retired.
+
+    Cache errors are retried; if every attempt fails, the stale set lives at
+    most MEMBERSHIP_CACHE_TIMEOUT seconds.
+    """
+    _bump_membership_generation(trip_id)
+    transaction.on_commit(lambda: _bump_membership_generation(trip_id))
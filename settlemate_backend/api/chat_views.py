@@ -2,40 +2,31 @@ from rest_framework import status, generics, permissions
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
-from django.shortcuts import get_object_or_404
 from django.db import transaction
 from django.utils import timezone
 import logging
 
-from .models import Trip, ChatMessage, TripMember
+from .models import ChatMessage
 from .serializers import ChatMessageSerializer
+from .access import trip_access
 
 logger = logging.getLogger(__name__)
 
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
-def add_chat_message(request):
+@trip_access()
+def add_chat_message(request, trip):
     """Add a chat message to a trip"""
     try:
-        tripid = request.data.get('tripid')
         msg_data = request.data.get('msg')
         
-        if not tripid or not msg_data:
+        if not msg_data:
             return Response({
                 'success': False,
-                'errors': [{'msg': 'Trip ID and message data are required'}]
+                'errors': [{'msg': 'Message data is required'}]
             }, status=status.HTTP_400_BAD_REQUEST)
         
-        trip = get_object_or_404(Trip, id=tripid, is_active=True)
-        
-        # Check if user is a member of this trip
-        if not TripMember.objects.filter(trip=trip, user=request.user, is_active=True).exists():
-            return Response({
-                'success': False,
-                'errors': [{'msg': 'You are not a member of this trip'}]
-            }, status=status.HTTP_403_FORBIDDEN)
-        
         # Create chat message
         chat_message = ChatMessage.objects.create(
             trip=trip,
@@ -61,25 +52,10 @@ def add_chat_message(request):
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
-def clear_chat(request):
+@trip_access(owner_only=True, denied='Only trip owner can clear chat')
+def clear_chat(request, trip):
     """Clear all chat messages for a trip (admin only)"""
     try:
-        tripid = request.data.get('tripid')
-        if not tripid:
-            return Response({
-                'success': False,
-                'errors': [{'msg': 'Trip ID is required'}]
-            }, status=status.HTTP_400_BAD_REQUEST)
-        
-        trip = get_object_or_404(Trip, id=tripid, is_active=True)
-        
-        # Check if user is the trip owner
-        if trip.owner != request.user:
-            return Response({
-                'success': False,
-                'errors': [{'msg': 'Only trip owner can clear chat'}]
-            }, status=status.HTTP_403_FORBIDDEN)
-        
         # Clear all chat messages
         ChatMessage.objects.filter(trip=trip).delete()
         
@@ -98,25 +74,10 @@ def clear_chat(request):
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
-def get_chat_messages(request):
+@trip_access()
+def get_chat_messages(request, trip):
     """Get all chat messages for a trip"""
     try:
-        tripid = request.GET.get('tripid')
-        if not tripid:
-            return Response({
-                'success': False,
-                'errors': [{'msg': 'Trip ID is required'}]
-            }, status=status.HTTP_400_BAD_REQUEST)
-        
-        trip = get_object_or_404(Trip, id=tripid, is_active=True)
-        
-        # Check if user is a member of this trip
-        if not TripMember.objects.filter(trip=trip, user=request.user, is_active=True).exists():
-            return Response({
-                'success': False,
-                'errors': [{'msg': 'You are not a member of this trip'}]
-            }, status=status.HTTP_403_FORBIDDEN)
-        
         # Get chat messages
         messages = ChatMessage.objects.filter(trip=trip).select_related('user').order_by('created_at')
         serializer = ChatMessageSerializer(messages, many=True)
@@ -0,0 +1,93 @@
+import hashlib
+from functools import wraps
+from typing import Optional
+
+from django.db.models import Count, OuterRef, Subquery
+from rest_framework import status
+from rest_framework.response import Response
+
+from .access import get_request_tripid, resolve_trip
+from .models import ChatMessage
+
+# Let browsers keep per-user copies but revalidate them on every use
+CACHE_CONTROL = 'private, no-cache'
+
+
+def _request_params(request) -> str:
+    """Canonical form of the query string and body, since they select what the view returns"""
+    params = sorted(request.GET.lists())
+    if hasattr(request.data, 'items'):
+        params += sorted((key, str(value)) for key, value in request.data.items())
+    return repr(params)
+
+
+def compute_trip_etag(request, tripid, view_name: str, include_chat: bool = False) -> Optional[str]:
+    """
+    ETag for a trip read, from the trip lookup shared with the view (see access.resolve_trip).
+
+    The tag covers the trip's ledger version (moved by every transaction,
+    membership, trip and profile write), `last_edited`, optionally the chat
+    high-water mark, the caller and the request parameters.
+
+    Returns:
+        The ETag, or None when the trip is missing or the caller is not a
+        member, so the view produces its usual error
+    """
+    if not tripid:
+        return None
+
+    annotations = {}
+    if include_chat:
+        chat = ChatMessage.objects.filter(trip=OuterRef('pk'))
+        annotations['chat_last'] = Subquery(chat.order_by('-created_at').values('created_at')[:1])
+        annotations['chat_count'] = Subquery(
+            chat.order_by().values('trip').annotate(count=Count('pk')).values('count')
+        )
+
+    trip = resolve_trip(request, tripid, **annotations)
+    if trip is None or not trip.is_member:
+        return None
+    row = {'ledger_version': trip.ledger_version, 'last_edited': trip.last_edited}
+    row.update((name, getattr(trip, name)) for name in annotations)
+
+    key = '|'.join([view_name, str(request.user.pk), repr(sorted(row.items())), _request_params(request)])
+    return f'W/"{hashlib.blake2b(key.encode(), digest_size=16).hexdigest()}"'
+
+
+def _matches(etag: str, if_none_match: str) -> bool:
+    """Weak comparison against an If-None-Match header"""
+    if if_none_match.strip() == '*':
+        return True
+    opaque = etag[2:] if etag.startswith('W/') else etag
+    candidates = (tag.strip() for tag in if_none_match.split(','))
+    return any((tag[2:] if tag.startswith('W/') else tag) == opaque for tag in candidates)
+
+
+def trip_etag(include_chat: bool = False):
+    """
+    Conditional GET for trip read views (place it below @api_view).
+
+    Reads `tripid` from the query string or body, answers 304 when the client's
+    If-None-Match still matches and otherwise tags successful responses. The
+    tag is computed before the view runs, so a write racing with the view only
+    ever makes the tag older than the body, which costs one extra full reload.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            tripid = get_request_tripid(request)
+            etag = compute_trip_etag(request, tripid, view.__name__, include_chat=include_chat)
+            if etag is None:
+                return view(request, *args, **kwargs)
+
+            if_none_match = request.headers.get('If-None-Match')
+            if if_none_match and _matches(etag, if_none_match):
+                return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag, 'Cache-Control': CACHE_CONTROL})
+
+            response = view(request, *args, **kwargs)
+            if response.status_code == status.HTTP_200_OK:
+                response['ETag'] = etag
+                response['Cache-Control'] = CACHE_CONTROL
+            return response
+        return wrapper
+    return decorator
@@ -12,6 +12,7 @@ import logging
 
 from .models import Trip, TripMember, FileUpload
 from .serializers import FileUploadSerializer
+from .access import trip_access
 
 logger = logging.getLogger(__name__)
 
@@ -135,26 +136,10 @@ def get_file_info(request):
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
-def get_trip_files(request):
+@trip_access()
+def get_trip_files(request, trip):
     """Get all files uploaded to a trip"""
     try:
-        tripid = request.GET.get('tripid')
-        if not tripid:
-            return Response({
-                'success': False,
-                'errors': [{'msg': 'Trip ID is required'}]
-            }, status=status.HTTP_400_BAD_REQUEST)
-        
-        trip = get_object_or_404(Trip, id=tripid, is_active=True)
-        
-        # Check if user is a member of this trip
-        from .models import TripMember
-        if not TripMember.objects.filter(trip=trip, user=request.user, is_active=True).exists():
-            return Response({
-                'success': False,
-                'errors': [{'msg': 'You are not a member of this trip'}]
-            }, status=status.HTTP_403_FORBIDDEN)
-        
         # Get files for this trip
         files = FileUpload.objects.filter(trip=trip).order_by('-uploaded_at')
         serializer = FileUploadSerializer(files, many=True)
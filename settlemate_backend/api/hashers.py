@@ -0,0 +1,46 @@
+import logging
+
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+
+logger = logging.getLogger(__name__)
+
+try:
+    import greenlet
+    from eventlet import tpool
+except ImportError:  # eventlet is only needed to serve through app.py
+    greenlet = tpool = None
+else:
+    # Takes effect when the pool starts, i.e. on the first offloaded hash
+    tpool.set_num_threads(settings.PASSWORD_HASHING_THREADS)
+
+
+def on_green_thread() -> bool:
+    """Whether the caller is an eventlet green thread, i.e. shares its OS thread with the hub"""
+    return greenlet is not None and greenlet.getcurrent().parent is not None
+
+
+def offload(fn, *args, **kwargs):
+    """
+    Run CPU-bound `fn` in eventlet's native thread pool when called from a
+    green thread, so the hub keeps serving Socket.IO clients meanwhile.
+
+    The pool has PASSWORD_HASHING_THREADS threads; further callers wait
+    cooperatively. Outside eventlet `fn` runs inline.
+    """
+    if on_green_thread():
+        return tpool.execute(fn, *args, **kwargs)
+    return fn(*args, **kwargs)
+
+
+class OffloadedPBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    """
+    Django's PBKDF2 hasher with the key derivation moved off the eventlet hub.
+
+    Keeps the `pbkdf2_sha256` algorithm name, so stored hashes stay valid.
+    Hashing (set_password) and checking (authenticate, check_password) both go
+    through encode().
+    """
+
+    def encode(self, password, salt, iterations=None):
+        return offload(super().encode, password, salt, iterations)
@@ -0,0 +1,147 @@
+from collections import defaultdict
+from typing import Dict, Iterable
+from uuid import UUID
+
+from django.db import transaction as db_transaction
+from django.db.models import BigIntegerField, Case, F, Sum, Value, When
+
+from .caching import bump_trip_version
+from .models import Trip, Transaction, TransactionMember, TripBalance
+from .settlement import to_paise
+
+
+def transaction_deltas(transaction_obj: Transaction) -> Dict[UUID, int]:
+    """
+    Per-user balance deltas (in paise) contributed by a single transaction.
+    Disabled transactions contribute nothing.
+    """
+    if not transaction_obj.is_enabled:
+        return {}
+
+    deltas = defaultdict(int)
+    deltas[transaction_obj.paid_by_id] += to_paise(transaction_obj.amount)
+
+    owed = TransactionMember.objects.filter(
+        transaction=transaction_obj,
+        is_included=True
+    ).values_list('user_id', 'amount_owed')
+    for user_id, amount_owed in owed:
+        deltas[user_id] -= to_paise(amount_owed)
+
+    return {user_id: delta for user_id, delta in deltas.items() if delta}
+
+
+def diff_deltas(before: Dict[UUID, int], after: Dict[UUID, int]) -> Dict[UUID, int]:
+    """Deltas needed to move the ledger from `before` to `after`"""
+    changes = {}
+    for user_id in set(before) | set(after):
+        delta = after.get(user_id, 0) - before.get(user_id, 0)
+        if delta:
+            changes[user_id] = delta
+    return changes
+
+
+def apply_deltas(trip_id, deltas: Dict[UUID, int], sign: int = 1) -> None:
+    """
+    Atomically add `deltas` (multiplied by `sign`) to the trip's ledger rows.
+    Missing rows are created first so concurrent writers only ever increment.
+    """
+    deltas = {user_id: sign * delta for user_id, delta in deltas.items() if delta}
+    if not deltas:
+        return
+
+    with db_transaction.atomic():
+        TripBalance.objects.bulk_create(
+            [TripBalance(trip_id=trip_id, user_id=user_id) for user_id in deltas],
+            ignore_conflicts=True
+        )
+        TripBalance.objects.filter(trip_id=trip_id, user_id__in=list(deltas)).update(
+            net_paise=F('net_paise') + Case(
+                *[When(user_id=user_id, then=Value(delta)) for user_id, delta in deltas.items()],
+                default=Value(0),
+                output_field=BigIntegerField()
+            )
+        )
+
+
+def record_transaction(transaction_obj: Transaction) -> None:
+    """Add a newly created transaction to its trip's ledger"""
+    apply_deltas(transaction_obj.trip_id, transaction_deltas(transaction_obj))
+
+
+def record_transactions(trip_id, transactions: Iterable[Transaction], members: Iterable[TransactionMember]) -> None:
+    """
+    Add a batch of newly created transactions to a trip's ledger with one update.
+
+    Deltas are summed from the in-memory objects, so no rows are read back.
+    """
+    deltas = defaultdict(int)
+    enabled = set()
+    for transaction_obj in transactions:
+        if transaction_obj.is_enabled:
+            enabled.add(transaction_obj.pk)
+            deltas[transaction_obj.paid_by_id] += to_paise(transaction_obj.amount)
+    for member in members:
+        if member.is_included and member.transaction_id in enabled:
+            deltas[member.user_id] -= to_paise(member.amount_owed)
+    apply_deltas(trip_id, deltas)
+
+
+def get_trip_balances(trip: Trip) -> Dict[UUID, int]:
+    """Non-zero net balances (in paise) for a trip, read from the ledger only"""
+    return dict(
+        TripBalance.objects.filter(trip=trip).exclude(net_paise=0).values_list('user_id', 'net_paise')
+    )
+
+
+def compute_trip_balances(trip: Trip) -> Dict[UUID, int]:
+    """Non-zero net balances (in paise) recomputed from raw transactions"""
+    balances = defaultdict(int)
+
+    paid = Transaction.objects.filter(
+        trip=trip,
+        is_enabled=True
+    ).values('paid_by_id').annotate(total=Sum('amount')).order_by()
+    for row in paid:
+        balances[row['paid_by_id']] += to_paise(row['total'])
+
+    owed = TransactionMember.objects.filter(
+        transaction__trip=trip,
+        transaction__is_enabled=True,
+        is_included=True
+    ).values('user_id').annotate(total=Sum('amount_owed')).order_by()
+    for row in owed:
+        balances[row['user_id']] -= to_paise(row['total'])
+
+    return {user_id: balance for user_id, balance in balances.items() if balance}
+
+
+def verify_trip_ledger(trip: Trip) -> Dict[UUID, Dict[str, int]]:
+    """
+    Compare the stored ledger against raw transactions.
+
+    Returns:
+        Mapping of user id to {'stored': ..., 'expected': ...} for every mismatch
+    """
+    stored = get_trip_balances(trip)
+    expected = compute_trip_balances(trip)
+    return {
+        user_id: {'stored': stored.get(user_id, 0), 'expected': expected.get(user_id, 0)}
+        for user_id in set(stored) | set(expected)
+        if stored.get(user_id, 0) != expected.get(user_id, 0)
+    }
+
+
+def rebuild_trip_ledger(trip: Trip) -> Dict[UUID, int]:
+    """Replace a trip's ledger rows with balances recomputed from raw transactions"""
+    with db_transaction.atomic():
+        # Hold the trip row while the ledger is swapped out
+        list(Trip.objects.select_for_update().filter(pk=trip.pk).values_list('pk', flat=True))
+        balances = compute_trip_balances(trip)
+        TripBalance.objects.filter(trip=trip).delete()
+        TripBalance.objects.bulk_create([
+            TripBalance(trip=trip, user_id=user_id, net_paise=balance)
+            for user_id, balance in balances.items()
+        ])
+        bump_trip_version(trip.pk)
+    return balances
@@ -0,0 +1,329 @@
+import io
+import json
+import platform
+import statistics
+import time
+from datetime import datetime, timezone
+
+from django.contrib.auth.hashers import check_password, make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test.utils import override_settings
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from api.benchmarking import TripShape, generate_trip, measure, synthetic_balances
+from api.caching import bump_trip_version, trip_cache
+from api.models import Transaction
+from api.parsers import ORJSONParser
+from api.projections import TRANSACTION_FIELDS, project_transactions
+from api.renderers import ORJSONRenderer
+from api.serializers import TransactionSerializer
+from api.settlement import settle
+from api.utils import calculate_minimum_transfers, get_cached_trip_summary, get_trip_summary
+
+SUITES = ('solvers', 'trip', 'renderers', 'login_storm')
+
+DEFAULT_SHAPES = [
+    'members=5,transactions=50,density=1.0,skew=0',
+    'members=20,transactions=500,density=0.5,skew=1.0',
+    'members=100,transactions=5000,density=0.2,skew=1.5',
+]
+
+RENDERER_SHAPES = ['members=30,transactions=2000,density=0.5,skew=1.0']
+
+# Hashers compared by the login_storm suite: PBKDF2 on the eventlet hub vs in its thread pool
+STORM_HASHERS = [
+    ('inline', 'django.contrib.auth.hashers.PBKDF2PasswordHasher'),
+    ('offloaded', 'api.hashers.OffloadedPBKDF2PasswordHasher'),
+]
+
+# How often the login_storm probe schedules a broadcast on the hub
+PROBE_INTERVAL = 0.01
+
+LOCMEM_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+class _Rollback(Exception):
+    """Raised to roll back the synthetic data of a benchmark run"""
+
+
+def _summarize(runs):
+    """Median wall time plus worst-case queries and memory across runs"""
+    return {
+        'runs': len(runs),
+        'wall_ms_median': round(statistics.median(run['wall_ms'] for run in runs), 3),
+        'wall_ms_best': min(run['wall_ms'] for run in runs),
+        'queries': max(run['queries'] for run in runs),
+        'peak_kib': max(run['peak_kib'] for run in runs),
+    }
+
+
+class Command(BaseCommand):
+    help = 'Benchmark settlement planning, the trip settlement/summary paths, renderers and logins under eventlet'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--suite', action='append', dest='suites', choices=SUITES,
+                            help='Suite to run, can be given multiple times (default: solvers)')
+        parser.add_argument('--members', type=int, default=5000, help='Number of members with a non-zero balance (solvers suite)')
+        parser.add_argument('--repeat', type=int, default=5, help='Timed runs per solver or target')
+        parser.add_argument('--seed', type=int, default=42, help='Random seed for the synthetic data')
+        parser.add_argument('--solver', action='append', dest='solvers', help='Solver to time (default: greedy and heap)')
+        parser.add_argument('--target-ms', type=float, default=100.0,
+                            help='Fail if the median plan time (solvers suite) or the p99 broadcast delay '
+                                 'with offloaded hashing (login_storm suite) exceeds this')
+        parser.add_argument('--logins', type=int, default=32, help='Concurrent password checks per storm (login_storm suite)')
+        parser.add_argument('--shape', action='append', dest='shapes',
+                            help='Trip shape for the trip suite, e.g. "members=50,transactions=500,density=0.3,skew=1.2"')
+        parser.add_argument('--locmem-cache', action='store_true',
+                            help='Use an in-process cache instead of the configured one (trip suite)')
+        parser.add_argument('--output', help='Write results as JSON to this file')
+
+    def handle(self, *args, **options):
+        suites = options['suites'] or ['solvers']
+        results = []
+        failures = []
+
+        for suite in suites:
+            if suite == 'solvers':
+                failures += self.run_solvers(options, results)
+            elif suite == 'trip':
+                self.run_trip(options, results)
+            elif suite == 'renderers':
+                self.run_renderers(options, results)
+            elif suite == 'login_storm':
+                failures += self.run_login_storm(options, results)
+
+        if options['output']:
+            report = {
+                'generated_at': datetime.now(timezone.utc).isoformat(),
+                'python': platform.python_version(),
+                'seed': options['seed'],
+                'repeat': options['repeat'],
+                'results': results,
+            }
+            with open(options['output'], 'w') as fh:
+                json.dump(report, fh, indent=2)
+            self.stdout.write(f'Wrote {len(results)} results to {options["output"]}')
+
+        if failures:
+            raise CommandError(f'Slower than {options["target_ms"]}ms: {", ".join(failures)}')
+
+    def run_login_storm(self, options, results):
+        """
+        Delay of chat broadcasts on the eventlet hub while `--logins` password
+        checks run at once, with PBKDF2 inline and offloaded; returns
+        ['login_storm'] if the offloaded p99 delay is over target.
+
+        A probe green thread schedules a broadcast every PROBE_INTERVAL and
+        records how late the hub runs it, which is the extra latency every
+        Socket.IO client sees.
+        """
+        try:
+            import eventlet
+        except ImportError:
+            raise CommandError('The login_storm suite needs eventlet')
+
+        encoded = make_password('correct horse battery staple')
+        self.stdout.write(f'Login storm: {options["logins"]} concurrent password checks')
+
+        runs = [('idle', None)] + STORM_HASHERS
+        slow = []
+        for name, hasher in runs:
+            overrides = {'PASSWORD_HASHERS': [hasher]} if hasher else {}
+            with override_settings(**overrides):
+                delays, storm_ms = self.measure_storm(eventlet, encoded, options['logins'] if hasher else 0)
+
+            delays.sort()
+            summary = {
+                'delay_ms_p50': round(statistics.median(delays), 3),
+                'delay_ms_p99': round(delays[min(len(delays) - 1, int(len(delays) * 0.99))], 3),
+                'delay_ms_max': round(delays[-1], 3),
+            }
+            self.stdout.write(
+                f'  {name:>9}: broadcast delay p50 {summary["delay_ms_p50"]:.1f}ms, '
+                f'p99 {summary["delay_ms_p99"]:.1f}ms, max {summary["delay_ms_max"]:.1f}ms, '
+                f'storm {storm_ms:.0f}ms'
+            )
+            results.append({
+                'suite': 'login_storm',
+                'name': name,
+                'logins': options['logins'] if hasher else 0,
+                'storm_ms': round(storm_ms, 3),
+                'samples': len(delays),
+                **summary
+            })
+            if name == 'offloaded' and summary['delay_ms_p99'] > options['target_ms']:
+                slow.append('login_storm')
+
+        if not slow:
+            self.stdout.write(self.style.SUCCESS(f'Offloaded broadcast delay p99 under {options["target_ms"]}ms'))
+        return slow
+
+    def measure_storm(self, eventlet, encoded, logins):
+        """(broadcast delays in ms, storm wall time in ms) for `logins` concurrent checks on the hub"""
+        delays = []
+        done = eventlet.event.Event()
+
+        def probe():
+            while not done.ready() or len(delays) < 10:
+                scheduled = time.perf_counter() + PROBE_INTERVAL
+                eventlet.sleep(PROBE_INTERVAL)
+                delays.append(max(0.0, time.perf_counter() - scheduled) * 1000)
+
+        prober = eventlet.spawn(probe)
+        eventlet.sleep(0)
+        started = time.perf_counter()
+        pool = eventlet.GreenPool(max(logins, 1))
+        checks = pool.imap(lambda _: check_password('correct horse battery staple', encoded), range(logins))
+        if not all(checks):
+            raise CommandError('Password check failed')
+        storm_ms = (time.perf_counter() - started) * 1000
+        done.send()
+        prober.wait()
+        return delays, storm_ms
+
+    def run_solvers(self, options, results):
+        """Time each solver on synthetic balances; returns the solvers over target"""
+        balances = synthetic_balances(options['members'], options['seed'])
+        solvers = options['solvers'] or ['greedy', 'heap']
+
+        self.stdout.write(f'Settling {len(balances)} balances, {options["repeat"]} runs per solver')
+        slow = []
+        for solver in solvers:
+            timings = []
+            for _ in range(options['repeat']):
+                started = time.perf_counter()
+                result = settle(balances, solver=solver)
+                timings.append((time.perf_counter() - started) * 1000)
+
+            median = statistics.median(timings)
+            self.stdout.write(
+                f'  {result.solver:>8}: median {median:.1f}ms, best {min(timings):.1f}ms, '
+                f'{len(result.plan)} transfers'
+            )
+            results.append({
+                'suite': 'solvers',
+                'name': result.solver,
+                'members': len(balances),
+                'transfers': len(result.plan),
+                'runs': len(timings),
+                'wall_ms_median': round(median, 3),
+                'wall_ms_best': round(min(timings), 3),
+            })
+            if median > options['target_ms']:
+                slow.append(solver)
+
+        if not slow:
+            self.stdout.write(self.style.SUCCESS(f'All solvers under {options["target_ms"]}ms'))
+        return slow
+
+    def parse_shapes(self, options, default):
+        try:
+            return [TripShape.parse(spec) for spec in options['shapes'] or default]
+        except (TypeError, ValueError) as e:
+            raise CommandError(f'Invalid --shape: {str(e)}')
+
+    def run_rolled_back(self, fn, *args):
+        """Run `fn` in a transaction that is always rolled back"""
+        try:
+            with transaction.atomic():
+                fn(*args)
+                raise _Rollback()
+        except _Rollback:
+            pass
+
+    def run_trip(self, options, results):
+        """Time settlement and summary end to end on generated trips, then roll them back"""
+        shapes = self.parse_shapes(options, DEFAULT_SHAPES)
+
+        overrides = {'ALLOWED_HOSTS': ['testserver']}
+        if options['locmem_cache']:
+            overrides['CACHES'] = LOCMEM_CACHES
+
+        with override_settings(**overrides):
+            for shape in shapes:
+                self.run_rolled_back(self.run_trip_shape, shape, options, results)
+
+    def run_renderers(self, options, results):
+        """Compare stdlib and orjson encoding/decoding of large API payloads"""
+        for shape in self.parse_shapes(options, RENDERER_SHAPES):
+            self.run_rolled_back(self.run_renderers_shape, shape, options, results)
+
+    def run_renderers_shape(self, shape, options, results):
+        trip = generate_trip(shape, seed=options['seed'])
+        self.stdout.write(f'{shape.label()}')
+
+        transactions = Transaction.objects.filter(trip=trip).select_related('paid_by').prefetch_related('members__user')
+        payloads = {
+            'getTransactions': {'success': True, 'data': TransactionSerializer(transactions, many=True).data},
+            'getTransactions flat': dict(zip(('data', 'users'), project_transactions(
+                transactions.order_by('-created_at').values(*TRANSACTION_FIELDS)
+            )), success=True),
+            'getTripSummary': {'success': True, 'data': get_trip_summary(trip)},
+        }
+        codecs = [('json', JSONRenderer(), JSONParser()), ('orjson', ORJSONRenderer(), ORJSONParser())]
+
+        for payload_name, payload in payloads.items():
+            for codec, renderer, parser in codecs:
+                body = renderer.render(payload)
+                steps = [
+                    ('render', lambda: renderer.render(payload)),
+                    ('parse', lambda: parser.parse(io.BytesIO(body))),
+                ]
+                for step, fn in steps:
+                    summary = _summarize([measure(fn) for _ in range(options['repeat'])])
+                    self.stdout.write(
+                        f'  {payload_name} {step} [{codec}]: median {summary["wall_ms_median"]:.2f}ms, '
+                        f'peak {summary["peak_kib"]:.0f}KiB, {len(body) / 1024:.0f}KiB body'
+                    )
+                    results.append({
+                        'suite': 'renderers',
+                        'name': f'{payload_name} {step}',
+                        'codec': codec,
+                        'bytes': len(body),
+                        'shape': shape._asdict(),
+                        **summary
+                    })
+
+    def run_trip_shape(self, shape, options, results):
+        started = time.perf_counter()
+        trip = generate_trip(shape, seed=options['seed'])
+        self.stdout.write(f'{shape.label()} (generated in {(time.perf_counter() - started) * 1000:.0f}ms)')
+
+        client = APIClient()
+        client.force_authenticate(user=trip.owner)
+
+        def new_version():
+            # Cold runs: move the trip to a fresh ledger version so nothing is cached
+            bump_trip_version(trip.id)
+            trip.refresh_from_db(fields=['ledger_version'])
+            trip_cache.clear_local()
+
+        def post_transfers():
+            response = client.post('/api/calculateTransfers', {'tripid': str(trip.id)}, format='json')
+            if response.status_code != 200:
+                raise CommandError(f'calculateTransfers returned {response.status_code}: {response.content[:200]}')
+
+        targets = [
+            ('calculate_minimum_transfers', lambda: calculate_minimum_transfers(trip)),
+            ('get_trip_summary', lambda: get_cached_trip_summary(trip)),
+            ('calculateTransfers view', post_transfers),
+        ]
+        for name, fn in targets:
+            for mode in ('cold', 'warm'):
+                runs = []
+                if mode == 'warm':
+                    fn()
+                for _ in range(options['repeat']):
+                    if mode == 'cold':
+                        new_version()
+                    runs.append(measure(fn))
+
+                summary = _summarize(runs)
+                self.stdout.write(
+                    f'  {name} [{mode}]: median {summary["wall_ms_median"]:.1f}ms, '
+                    f'{summary["queries"]} queries, peak {summary["peak_kib"]:.0f}KiB'
+                )
+                results.append({'suite': 'trip', 'name': name, 'mode': mode, 'shape': shape._asdict(), **summary})
@@ -87,6 +87,10 @@ class Command(BaseCommand):
                         amount_owed=amount_per_person
                     )
             
+            # Transactions were created directly, so build the balance ledger from them
+            from api.ledger import rebuild_trip_ledger
+            rebuild_trip_ledger(trip)
+            
             # Create sample chat messages
             chat_messages = [
                 {'user': users[0], 'message': 'Hey everyone! Excited for the trip!'},
@@ -0,0 +1,72 @@
+import re
+import uuid
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+from api.models import (
+    ChatMessage, SyncTombstone, Transaction, TripBalance, TripInvite, TripMember, UserSession
+)
+from api.utils import trip_stakeholders
+
+# Full table scans: "SCAN api_transaction" in SQLite (but not "SCAN ... USING INDEX"), "Seq Scan on" in PostgreSQL
+SEQUENTIAL_SCAN = {
+    'sqlite': re.compile(r'\bSCAN (?!.*\bUSING\b)'),
+    'postgresql': re.compile(r'\bSeq Scan on\b'),
+}
+
+
+def hot_queries():
+    """(name, queryset) for the query shapes every request path depends on"""
+    trip_id, user_id = uuid.uuid4(), uuid.uuid4()
+    since = timezone.now() - timedelta(minutes=5)
+    return [
+        ('membership check', TripMember.objects.filter(trip_id=trip_id, user_id=user_id, is_active=True).values('pk')[:1]),
+        ('trip members', TripMember.objects.filter(trip_id=trip_id, is_active=True)),
+        ("user's trips", TripMember.objects.filter(user_id=user_id, is_active=True).values('trip_id')),
+        ('transaction list', Transaction.objects.filter(trip_id=trip_id, is_enabled=True).order_by('-created_at', '-id')[:50]),
+        ('transaction sync', Transaction.objects.filter(trip_id=trip_id, updated_at__gt=since)),
+        ('chat history', ChatMessage.objects.filter(trip_id=trip_id).order_by('created_at')),
+        ('pending invites', TripInvite.objects.filter(invited_email='someone@example.com', status='pending')),
+        ('session lookup', UserSession.objects.filter(token_digest='0' * 64, is_active=True)),
+        ('active sessions', UserSession.objects.filter(user_id=user_id, is_active=True)),
+        ('trip ledger', TripBalance.objects.filter(trip_id=trip_id)),
+        ('summary users', trip_stakeholders(trip_id, [user_id])),
+        ('sync tombstones', SyncTombstone.objects.filter(trip_id=trip_id, created_at__gt=since)),
+    ]
+
+
+class Command(BaseCommand):
+    help = 'EXPLAIN the hot query shapes and fail if any of them falls back to a sequential scan'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verbose-plans', action='store_true', help='Print every plan, not only failing ones')
+
+    def handle(self, *args, **options):
+        pattern = SEQUENTIAL_SCAN.get(connection.vendor)
+        if pattern is None:
+            raise CommandError(f'Unsupported database backend: {connection.vendor}')
+
+        failures = []
+        with transaction.atomic():
+            if connection.vendor == 'postgresql':
+                # Small development tables make seq scans cheapest; ask whether an index path exists at all
+                with connection.cursor() as cursor:
+                    cursor.execute('SET LOCAL enable_seqscan = off')
+
+            for name, queryset in hot_queries():
+                plan = queryset.explain()
+                scans = [line.strip() for line in plan.splitlines() if pattern.search(line)]
+                if scans:
+                    failures.append(name)
+                    self.stdout.write(self.style.ERROR(f'  {name}: sequential scan'))
+                else:
+                    self.stdout.write(f'  {name}: ok')
+                if scans or options['verbose_plans']:
+                    for line in plan.splitlines():
+                        self.stdout.write(f'      {line}')
+
+        if failures:
+            raise CommandError(f'Sequential scan in: {", ".join(failures)}')
+        self.stdout.write(self.style.SUCCESS('Every hot query uses an index'))
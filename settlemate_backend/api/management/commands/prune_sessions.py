@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from django.utils import timezone
+from api.models import UserSession
+
+
+class Command(BaseCommand):
+    help = 'Delete revoked and expired user sessions, which can never authenticate again'
+
+    def handle(self, *args, **options):
+        deleted, _ = UserSession.objects.filter(Q(is_active=False) | Q(expires_at__lte=timezone.now())).delete()
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} revoked or expired session(s)'))
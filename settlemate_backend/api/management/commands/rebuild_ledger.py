@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand, CommandError
+from api.ledger import rebuild_trip_ledger, verify_trip_ledger
+from api.models import Trip
+
+
+class Command(BaseCommand):
+    help = 'Rebuild and verify the per-trip balance ledger from raw transactions'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--trip',
+            action='append',
+            dest='trips',
+            help='Only process this trip ID (can be given multiple times)'
+        )
+        parser.add_argument(
+            '--verify-only',
+            action='store_true',
+            help='Report ledger mismatches without rewriting anything'
+        )
+
+    def handle(self, *args, **options):
+        trips = Trip.objects.all().order_by('created_at')
+        if options['trips']:
+            trips = trips.filter(id__in=options['trips'])
+
+        mismatched = 0
+        for trip in trips.iterator():
+            if not options['verify_only']:
+                rebuild_trip_ledger(trip)
+
+            mismatches = verify_trip_ledger(trip)
+            if mismatches:
+                mismatched += 1
+                self.stdout.write(self.style.WARNING(f'Ledger mismatch in trip {trip.id} ({trip.name}):'))
+                for user_id, values in mismatches.items():
+                    self.stdout.write(
+                        f'  user {user_id}: stored {values["stored"]} paise, expected {values["expected"]} paise'
+                    )
+            elif options['verbosity'] > 1:
+                self.stdout.write(f'Trip {trip.id} ({trip.name}) OK')
+
+        if mismatched:
+            raise CommandError(f'{mismatched} trip(s) have ledger mismatches')
+
+        action = 'verified' if options['verify_only'] else 'rebuilt and verified'
+        self.stdout.write(self.style.SUCCESS(f'Ledger {action} successfully!'))
@@ -0,0 +1,54 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from api.models import Trip
+
+
+class Command(BaseCommand):
+    help = 'Recompute all trip balances in one vectorized pass and report differences against the ledger'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--trip',
+            action='append',
+            dest='trips',
+            help='Only reconcile this trip ID (can be given multiple times)'
+        )
+        parser.add_argument(
+            '--fix',
+            action='store_true',
+            help='Rebuild the ledger of every trip that has differences'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            from api.batch_balances import compute_balances, diff_balances, stored_balances
+        except ImportError:
+            raise CommandError('numpy is required for batch reconciliation (pip install numpy)')
+
+        started = time.perf_counter()
+        expected = compute_balances(options['trips'])
+        stored = stored_balances(options['trips'])
+        differences = diff_balances(stored, expected)
+        elapsed = (time.perf_counter() - started) * 1000
+
+        trip_count = len({trip_id for trip_id, _ in expected.keys() | stored.keys()})
+        self.stdout.write(f'Recomputed {len(expected)} balances across {trip_count} trips in {elapsed:.1f}ms')
+
+        for (trip_id, user_id), (stored_paise, expected_paise) in sorted(differences.items(), key=str):
+            self.stdout.write(self.style.WARNING(
+                f'  trip {trip_id} user {user_id}: stored {stored_paise} paise, expected {expected_paise} paise'
+            ))
+
+        if not differences:
+            self.stdout.write(self.style.SUCCESS('Ledger matches raw transactions'))
+            return
+
+        mismatched = {trip_id for trip_id, _ in differences}
+        if options['fix']:
+            from api.ledger import rebuild_trip_ledger
+            for trip in Trip.objects.filter(id__in=mismatched):
+                rebuild_trip_ledger(trip)
+            self.stdout.write(self.style.SUCCESS(f'Rebuilt ledger for {len(mismatched)} trip(s)'))
+        else:
+            raise CommandError(f'{len(differences)} balance(s) differ across {len(mismatched)} trip(s)')
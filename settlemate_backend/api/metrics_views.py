@@ -0,0 +1,35 @@
+import hmac
+import logging
+
+from django.conf import settings
+from django.http import Http404, HttpResponse
+from rest_framework.decorators import api_view, authentication_classes, permission_classes
+from rest_framework.permissions import AllowAny
+
+from .throttling import metrics as rate_limit_metrics
+
+logger = logging.getLogger(__name__)
+
+
+@api_view(['GET'])
+@authentication_classes([])
+@permission_classes([AllowAny])
+def metrics(request):
+    """
+    Prometheus scrape endpoint for this worker's counters.
+
+    Requires `Authorization: Bearer <METRICS_TOKEN>`; answers 404 while
+    METRICS_TOKEN is unset so the endpoint stays hidden by default.
+    """
+    token = settings.METRICS_TOKEN
+    presented = request.META.get('HTTP_AUTHORIZATION', '')
+    if not token or not hmac.compare_digest(presented.encode(), f'Bearer {token}'.encode()):
+        raise Http404
+
+    lines = [
+        '# HELP settlemate_rate_limit_decisions_total Rate limit decisions by scope and outcome',
+        '# TYPE settlemate_rate_limit_decisions_total counter',
+    ]
+    for (scope, outcome), count in sorted(rate_limit_metrics.snapshot().items()):
+        lines.append(f'settlemate_rate_limit_decisions_total{{scope="{scope}",outcome="{outcome}"}} {count}')
+    return HttpResponse('\n'.join(lines) + '\n', content_type='text/plain; version=0.0.4; charset=utf-8')
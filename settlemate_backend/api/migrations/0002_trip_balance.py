@@ -0,0 +1,58 @@
+# Generated by Django 5.0.8 on 2026-10-17 18:36
+
+import django.db.models.deletion
+from collections import defaultdict
+from decimal import Decimal, ROUND_HALF_UP
+from django.conf import settings
+from django.db import migrations, models
+
+
+def to_paise(amount):
+    return int((Decimal(str(amount)) * 100).quantize(Decimal('1'), rounding=ROUND_HALF_UP))
+
+
+def populate_trip_balances(apps, schema_editor):
+    Transaction = apps.get_model('api', 'Transaction')
+    TransactionMember = apps.get_model('api', 'TransactionMember')
+    TripBalance = apps.get_model('api', 'TripBalance')
+
+    balances = defaultdict(int)
+    paid = Transaction.objects.filter(is_enabled=True).values_list('trip_id', 'paid_by_id', 'amount')
+    for trip_id, user_id, amount in paid.iterator():
+        balances[(trip_id, user_id)] += to_paise(amount)
+    owed = TransactionMember.objects.filter(
+        transaction__is_enabled=True,
+        is_included=True
+    ).values_list('transaction__trip_id', 'user_id', 'amount_owed')
+    for trip_id, user_id, amount_owed in owed.iterator():
+        balances[(trip_id, user_id)] -= to_paise(amount_owed)
+
+    TripBalance.objects.bulk_create([
+        TripBalance(trip_id=trip_id, user_id=user_id, net_paise=net_paise)
+        for (trip_id, user_id), net_paise in balances.items()
+        if net_paise
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TripBalance',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('net_paise', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('trip', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='balances', to='api.trip')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='trip_balances', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('trip', 'user')},
+            },
+        ),
+        migrations.RunPython(populate_trip_balances, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.8 on 2026-10-17 18:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_trip_balance'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trip',
+            name='ledger_version',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.0.8 on 2026-10-17 18:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_trip_ledger_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SyncTombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('trip_id', models.UUIDField()),
+                ('kind', models.CharField(choices=[('transaction', 'Transaction'), ('member', 'Member')], max_length=20)),
+                ('object_id', models.UUIDField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['trip_id', 'created_at'], name='synctombstone_trip_created_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.0.8 on 2026-10-17 19:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_sync_tombstone'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='chatmessage',
+            index=models.Index(fields=['trip', 'created_at'], name='chatmessage_trip_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(condition=models.Q(('is_enabled', True)), fields=['trip', '-created_at', '-id'], name='transaction_trip_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['trip', 'updated_at'], name='transaction_trip_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tripinvite',
+            index=models.Index(fields=['invited_email', 'status'], name='tripinvite_email_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tripmember',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['user', 'trip'], name='tripmember_user_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='usersession',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['user'], name='usersession_user_active_idx'),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.0.8 on 2026-10-17 21:04
+
+import hashlib
+import uuid
+
+from django.db import migrations, models
+
+
+def fill_token_digests(apps, schema_editor):
+    """Existing sessions keep working: their tokens carry no jti, so they are found by digest"""
+    UserSession = apps.get_model('api', 'UserSession')
+    sessions = list(UserSession.objects.only('id', 'token'))
+    for session in sessions:
+        session.jti = uuid.uuid4().hex
+        session.token_digest = hashlib.sha256(session.token.encode()).hexdigest()
+    UserSession.objects.bulk_update(sessions, ['jti', 'token_digest'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='usersession',
+            name='jti',
+            field=models.CharField(max_length=32, null=True),
+        ),
+        migrations.AddField(
+            model_name='usersession',
+            name='token_digest',
+            field=models.CharField(max_length=64, null=True),
+        ),
+        migrations.RunPython(fill_token_digests, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='usersession',
+            name='token',
+        ),
+        migrations.AlterField(
+            model_name='usersession',
+            name='jti',
+            field=models.CharField(max_length=32, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='usersession',
+            name='token_digest',
+            field=models.CharField(max_length=64, unique=True),
+        ),
+    ]
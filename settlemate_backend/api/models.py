@@ -33,6 +33,7 @@ class Trip(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     last_edited = models.DateTimeField(auto_now=True)
+    ledger_version = models.PositiveBigIntegerField(default=0)  # bumped by transaction and membership writes
 
     class Meta:
         ordering = ['-created_at']
@@ -40,6 +41,15 @@ class Trip(models.Model):
     def __str__(self):
         return f"{self.name} (Owner: {self.owner.name})"
 
+    def save(self, *args, **kwargs):
+        # ledger_version only moves through F() updates; never write back a stale in-memory copy
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'ledger_version'
+            ]
+        super().save(*args, **kwargs)
+
 
 class TripMember(models.Model):
     """Through model for Trip-Member relationship"""
@@ -50,6 +60,10 @@ class TripMember(models.Model):
 
     class Meta:
         unique_together = ['trip', 'user']
+        indexes = [
+            # Trip-first lookups use the unique_together index; this one serves "which trips is the user in"
+            models.Index(fields=['user', 'trip'], condition=models.Q(is_active=True), name='tripmember_user_active_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user.name} in {self.trip.name}"
@@ -71,6 +85,15 @@ class Transaction(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Newest-first listing and keyset pages of enabled transactions
+            models.Index(
+                fields=['trip', '-created_at', '-id'],
+                condition=models.Q(is_enabled=True),
+                name='transaction_trip_recent_idx'
+            ),
+            models.Index(fields=['trip', 'updated_at'], name='transaction_trip_updated_idx'),  # delta sync
+        ]
 
     def __str__(self):
         return f"{self.name} - ₹{self.amount}"
@@ -90,6 +113,41 @@ class TransactionMember(models.Model):
         return f"{self.user.name} owes ₹{self.amount_owed} in {self.transaction.name}"
 
 
+class TripBalance(models.Model):
+    """Materialized net balance of a user within a trip, in integer paise"""
+    trip = models.ForeignKey(Trip, on_delete=models.CASCADE, related_name='balances')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='trip_balances')
+    net_paise = models.BigIntegerField(default=0)  # positive: is owed money, negative: owes money
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ['trip', 'user']
+
+    def __str__(self):
+        return f"{self.user.name} in {self.trip.name}: {self.net_paise} paise"
+
+
+class SyncTombstone(models.Model):
+    """Record of a transaction or membership removed from a trip, for delta sync clients"""
+    KIND_TRANSACTION = 'transaction'
+    KIND_MEMBER = 'member'
+
+    # Plain column rather than a foreign key: tombstones may be written while the trip itself is being deleted
+    trip_id = models.UUIDField()
+    kind = models.CharField(max_length=20, choices=[
+        (KIND_TRANSACTION, 'Transaction'),
+        (KIND_MEMBER, 'Member'),
+    ])
+    object_id = models.UUIDField()  # transaction id, or user id for memberships
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['trip_id', 'created_at'], name='synctombstone_trip_created_idx')]
+
+    def __str__(self):
+        return f"Removed {self.kind} {self.object_id} from trip {self.trip_id}"
+
+
 class ChatMessage(models.Model):
     """Chat message model for trip chat"""
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
@@ -102,6 +160,7 @@ class ChatMessage(models.Model):
 
     class Meta:
         ordering = ['created_at']
+        indexes = [models.Index(fields=['trip', 'created_at'], name='chatmessage_trip_created_idx')]
 
     def __str__(self):
         return f"{self.user.name}: {self.message[:50]}..."
@@ -125,6 +184,7 @@ class TripInvite(models.Model):
 
     class Meta:
         unique_together = ['trip', 'invited_email']
+        indexes = [models.Index(fields=['invited_email', 'status'], name='tripinvite_email_status_idx')]
 
     def __str__(self):
         return f"Invite for {self.invited_email} to {self.trip.name}"
@@ -157,7 +217,9 @@ class UserSession(models.Model):
     """User session model for JWT token management"""
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='sessions')
-    token = models.CharField(max_length=500, unique=True)
+    # One row per signed-in device: the `jti` claim and sha256 hex digest of its current refresh token
+    jti = models.CharField(max_length=32, unique=True)
+    token_digest = models.CharField(max_length=64, unique=True)
     created_at = models.DateTimeField(auto_now_add=True)
     expires_at = models.DateTimeField()
     is_active = models.BooleanField(default=True)
@@ -165,6 +227,9 @@ class UserSession(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user'], condition=models.Q(is_active=True), name='usersession_user_active_idx'),
+        ]
 
     def __str__(self):
         return f"Session for {self.user.email}"
@@ -0,0 +1,62 @@
+import base64
+import json
+import uuid
+from typing import List, Optional, Tuple
+
+from django.db.models import Q, QuerySet
+from django.utils.dateparse import parse_datetime
+
+
+class InvalidCursor(ValueError):
+    """Raised when a pagination cursor cannot be decoded"""
+
+
+def encode_cursor(created_at, object_id) -> str:
+    """Opaque cursor pointing just past the row with this (created_at, id)"""
+    payload = json.dumps({'c': created_at.isoformat(), 'i': str(object_id)}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Tuple:
+    """(created_at, id) from a cursor made by encode_cursor"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        created_at = parse_datetime(payload['c'])
+        object_id = uuid.UUID(payload['i'])
+    except (ValueError, TypeError, KeyError, AttributeError):
+        raise InvalidCursor('Invalid cursor')
+    if created_at is None:
+        raise InvalidCursor('Invalid cursor')
+    return created_at, object_id
+
+
+def paginate_keyset(queryset: QuerySet, cursor: Optional[str], page_size: int) -> Tuple[List, Optional[str]]:
+    """
+    Newest-first keyset pagination on (created_at, id).
+
+    Each page is a range scan starting after the cursor, so its cost does not
+    depend on how deep the client has paged, and rows inserted meanwhile
+    never shift later pages.
+
+    Args:
+        queryset: Model or .values() queryset with created_at and id columns
+        cursor: Token from a previous page, or None for the first page
+        page_size: Maximum rows to return
+
+    Returns:
+        (rows, next_cursor) where next_cursor is None on the last page
+    """
+    queryset = queryset.order_by('-created_at', '-id')
+    if cursor:
+        created_at, object_id = decode_cursor(cursor)
+        queryset = queryset.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=object_id))
+
+    rows = list(queryset[:page_size + 1])
+    if len(rows) <= page_size:
+        return rows, None
+    rows = rows[:page_size]
+    last = rows[-1]
+    if isinstance(last, dict):  # .values() querysets
+        return rows, encode_cursor(last['created_at'], last['id'])
+    return rows, encode_cursor(last.created_at, last.id)
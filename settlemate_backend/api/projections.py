@@ -0,0 +1,70 @@
+from collections import defaultdict
+from typing import Dict, Iterable, List, Tuple
+
+from django.core.files.storage import default_storage
+
+from .models import TransactionMember, User
+
+# Columns loaded for each transaction row; pass a queryset's .values(*TRANSACTION_FIELDS) to project_transactions
+TRANSACTION_FIELDS = (
+    'id', 'name', 'description', 'amount', 'paid_by_id', 'bill_image', 'bill_drive_id',
+    'is_enabled', 'created_at', 'updated_at',
+)
+
+USER_FIELDS = ('id', 'name', 'email', 'upi')
+
+
+def project_users(user_ids: Iterable) -> Dict[str, Dict]:
+    """Side map of user id to the few user fields list views need, in one query"""
+    return {
+        str(row['id']): {**row, 'id': str(row['id'])}
+        for row in User.objects.filter(id__in=set(user_ids)).values(*USER_FIELDS)
+    }
+
+
+def project_transactions(rows: Iterable[Dict]) -> Tuple[List[Dict], Dict[str, Dict]]:
+    """
+    Flat read-side representation of transactions.
+
+    Builds plain dicts from `.values()` rows instead of nesting a full user
+    serializer under every payer and member: transactions refer to users by id,
+    and each user appears once in the returned side map. Costs two queries
+    (member rows and users) whatever the number of transactions.
+
+    Args:
+        rows: Dicts with TRANSACTION_FIELDS, in the order they should be returned
+
+    Returns:
+        (transactions, users) where users maps user id to {'id', 'name', 'email', 'upi'}
+    """
+    rows = list(rows)
+    members = defaultdict(list)
+    user_ids = {row['paid_by_id'] for row in rows}
+    member_rows = TransactionMember.objects.filter(
+        transaction_id__in=[row['id'] for row in rows]
+    ).values_list('transaction_id', 'user_id', 'amount_owed', 'is_included').order_by('user_id')
+    for transaction_id, user_id, amount_owed, is_included in member_rows:
+        user_ids.add(user_id)
+        members[transaction_id].append({
+            'user': str(user_id),
+            'amount_owed': str(amount_owed),
+            'is_included': is_included,
+        })
+
+    transactions = [
+        {
+            'id': str(row['id']),
+            'name': row['name'],
+            'description': row['description'],
+            'amount': str(row['amount']),
+            'paid_by': str(row['paid_by_id']),
+            'bill_image': default_storage.url(row['bill_image']) if row['bill_image'] else None,
+            'bill_drive_id': row['bill_drive_id'],
+            'is_enabled': row['is_enabled'],
+            'members': members[row['id']],
+            'created_at': row['created_at'],
+            'updated_at': row['updated_at'],
+        }
+        for row in rows
+    ]
+    return transactions, project_users(user_ids)
@@ -5,6 +5,7 @@ from .models import (
     User, Trip, TripMember, Transaction, TransactionMember, 
     ChatMessage, TripInvite, PasswordResetToken, FileUpload
 )
+from .settlement import from_paise, split_paise, to_paise
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -37,10 +38,7 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
         email = validated_data.get('email', '').lower()
         validated_data['email'] = email
         validated_data.setdefault('username', email)
-        user = User.objects.create_user(**validated_data)
-        user.set_password(password)
-        user.save()
-        return user
+        return User.objects.create_user(password=password, **validated_data)
 
 
 class UserLoginSerializer(serializers.Serializer):
@@ -93,7 +91,11 @@ class TripSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'owner', 'created_at', 'updated_at', 'last_edited']
     
     def get_member_count(self, obj):
-        return obj.members.count()
+        # Querysets from annotate_member_counts carry the count already
+        count = getattr(obj, 'active_member_count', None)
+        if count is None:
+            count = TripMember.objects.filter(trip=obj, is_active=True).count()
+        return count
 
 
 class TripCreateSerializer(serializers.ModelSerializer):
@@ -127,8 +129,27 @@ class TransactionSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'paid_by', 'created_at', 'updated_at']
     
     def get_members(self, obj):
-        members = obj.members.all()
+        # List views prefetch members__user; single objects load members and users in one query
+        if 'members' in getattr(obj, '_prefetched_objects_cache', {}):
+            members = obj.members.all()
+        else:
+            members = obj.members.select_related('user')
         return TransactionMemberSerializer(members, many=True).data
+    
+    def update(self, instance, validated_data):
+        old_amount = instance.amount
+        instance = super().update(instance, validated_data)
+        
+        # Re-split a changed amount across the included members so shares still add up exactly
+        if 'amount' in validated_data and to_paise(instance.amount) != to_paise(old_amount):
+            included = sorted(instance.members.filter(is_included=True), key=lambda m: str(m.user_id))
+            if included:
+                shares = split_paise(to_paise(instance.amount), [1] * len(included))
+                for member, share in zip(included, shares):
+                    member.amount_owed = from_paise(share)
+                TransactionMember.objects.bulk_update(included, ['amount_owed'])
+        
+        return instance
 
 
 class TransactionCreateSerializer(serializers.ModelSerializer):
@@ -147,20 +168,24 @@ class TransactionCreateSerializer(serializers.ModelSerializer):
         member_ids = validated_data.pop('member_ids')
         validated_data['paid_by'] = self.context['request'].user
         transaction = super().create(validated_data)
-        
-        # Create TransactionMember instances
-        for member_id in member_ids:
-            try:
-                user = User.objects.get(id=member_id)
-                TransactionMember.objects.create(
-                    transaction=transaction,
-                    user=user,
-                    amount_owed=transaction.amount / len(member_ids)
-                )
-            except User.DoesNotExist:
-                pass
-        
+        TransactionMember.objects.bulk_create(self.build_members(transaction, member_ids))
         return transaction
+    
+    @staticmethod
+    def build_members(transaction, member_ids):
+        """
+        Unsaved TransactionMember rows splitting `transaction.amount` across `member_ids`.
+        
+        The amount is split in integer paise; the largest-remainder rule hands out
+        leftover paise in member id order so the shares sum to the amount exactly.
+        Member ids must already be validated against the trip.
+        """
+        member_ids = sorted(set(member_ids), key=str)
+        shares = split_paise(to_paise(transaction.amount), [1] * len(member_ids))
+        return [
+            TransactionMember(transaction=transaction, user_id=member_id, amount_owed=from_paise(share))
+            for member_id, share in zip(member_ids, shares)
+        ]
 
 
 class TransactionMemberSerializer(serializers.ModelSerializer):
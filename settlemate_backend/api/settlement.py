@@ -0,0 +1,356 @@
+import heapq
+import logging
+import time
+from array import array
+from collections import defaultdict
+from decimal import Decimal, ROUND_HALF_UP
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# A settlement plan is a list of (from_user_id, to_user_id, amount_paise) tuples
+Plan = List[Tuple[Any, Any, int]]
+
+
+class SettlementError(ValueError):
+    """Raised when a settlement plan does not bring every balance to zero"""
+
+
+class SolverTimeout(Exception):
+    """Raised when a solver runs past its time budget"""
+
+
+class TooManyBalances(Exception):
+    """Raised when a group is larger than the exact search accepts at all"""
+
+
+class SettlementResult(NamedTuple):
+    """A settlement plan together with how it was produced"""
+    plan: Plan
+    solver: str          # solver that produced the plan
+    requested: str       # solver that was asked for
+    elapsed_ms: float
+
+
+def to_paise(amount) -> int:
+    """Convert a rupee amount (Decimal/str/number) to integer paise"""
+    return int((Decimal(str(amount)) * 100).quantize(Decimal('1'), rounding=ROUND_HALF_UP))
+
+
+def from_paise(paise: int) -> Decimal:
+    """Convert integer paise back to a two-decimal rupee amount"""
+    return Decimal(paise) / 100
+
+
+def split_paise(total: int, weights: Sequence[int]) -> List[int]:
+    """
+    Split `total` paise in proportion to `weights` using the largest-remainder rule.
+
+    Every share is first rounded down; the paise left over go one each to the
+    shares with the largest remainders, ties broken by position. The result
+    always sums to `total` and depends only on the inputs.
+
+    Args:
+        total: Amount to split, in paise
+        weights: Non-negative integer weights, one per share
+
+    Returns:
+        List of shares in paise, aligned with `weights`
+    """
+    weight_sum = sum(weights)
+    if weight_sum <= 0:
+        raise ValueError('At least one weight must be positive')
+
+    shares = []
+    remainders = []
+    for index, weight in enumerate(weights):
+        share, remainder = divmod(total * weight, weight_sum)
+        shares.append(share)
+        remainders.append((-remainder, index))
+
+    leftover = total - sum(shares)
+    for _, index in sorted(remainders)[:leftover]:
+        shares[index] += 1
+    return shares
+
+
+def normalize_balances(balances: Dict[Any, int]) -> Dict[Any, int]:
+    """
+    Drop settled users and make the balances sum to exactly zero.
+
+    Splits stored before amounts were kept in integer paise can leave a few
+    paise of rounding residue (e.g. 100.00 split three ways as 33.33 each).
+    That residue is taken off the largest balance on the side that has it, so
+    the plan can still settle everyone exactly.
+    """
+    balances = {user_id: balance for user_id, balance in balances.items() if balance}
+    residue = sum(balances.values())
+    if residue:
+        logger.warning(f"Settlement balances off by {residue} paise; absorbing rounding residue")
+        side = [user_id for user_id, balance in balances.items() if (balance > 0) == (residue > 0)]
+        target = max(side, key=lambda user_id: (abs(balances[user_id]), str(user_id)))
+        balances[target] -= residue
+        if not balances[target]:
+            del balances[target]
+    return balances
+
+
+def verify_plan(balances: Dict[Any, int], plan: Plan) -> None:
+    """Raise SettlementError unless applying `plan` brings every balance to zero"""
+    remaining = dict(balances)
+    for from_id, to_id, amount in plan:
+        if amount <= 0:
+            raise SettlementError(f'Non-positive transfer of {amount} paise')
+        remaining[from_id] = remaining.get(from_id, 0) + amount
+        remaining[to_id] = remaining.get(to_id, 0) - amount
+    unsettled = {user_id: balance for user_id, balance in remaining.items() if balance}
+    if unsettled:
+        raise SettlementError(f'Plan leaves balances unsettled: {unsettled}')
+
+
+def settle_greedy(balances: Dict[Any, int]) -> Plan:
+    """
+    Greedy settlement: repeatedly match the largest remaining debtor with the
+    largest remaining creditor after a single sort.
+
+    Args:
+        balances: Mapping of user id to net balance in paise; positive means owed money
+
+    Returns:
+        Plan of (from_user_id, to_user_id, amount_paise) tuples that sums to zero
+    """
+    balances = normalize_balances(balances)
+
+    # Separate creditors (positive balance) and debtors (negative balance);
+    # ties are ordered by id so the plan is deterministic
+    creditors = sorted(
+        ([user_id, balance] for user_id, balance in balances.items() if balance > 0),
+        key=lambda entry: (-entry[1], str(entry[0]))
+    )
+    debtors = sorted(
+        ([user_id, -balance] for user_id, balance in balances.items() if balance < 0),
+        key=lambda entry: (-entry[1], str(entry[0]))
+    )
+
+    plan = []
+    creditor_index = debtor_index = 0
+    while creditor_index < len(creditors) and debtor_index < len(debtors):
+        creditor = creditors[creditor_index]
+        debtor = debtors[debtor_index]
+        amount = min(creditor[1], debtor[1])
+        plan.append((debtor[0], creditor[0], amount))
+
+        creditor[1] -= amount
+        debtor[1] -= amount
+        if creditor[1] == 0:
+            creditor_index += 1
+        if debtor[1] == 0:
+            debtor_index += 1
+
+    verify_plan(balances, plan)
+    return plan
+
+
+def settle_heap(balances: Dict[Any, int]) -> Plan:
+    """
+    Large-group settlement in O(n log n): the largest remaining debtor always
+    pays the largest remaining creditor, tracked with two priority queues.
+
+    Balances are held in compact parallel arrays (ids and int64 amounts); the
+    heaps only carry (key, index) pairs, so no per-user objects are built.
+
+    Args:
+        balances: Mapping of user id to net balance in paise; positive means owed money
+
+    Returns:
+        Plan of (from_user_id, to_user_id, amount_paise) tuples that sums to zero
+    """
+    balances = normalize_balances(balances)
+    ids = sorted(balances, key=str)
+    amounts = array('q', (balances[user_id] for user_id in ids))
+
+    # Both heaps are min-heaps keyed on the negated size of the position
+    debtors = [(amount, index) for index, amount in enumerate(amounts) if amount < 0]
+    creditors = [(-amount, index) for index, amount in enumerate(amounts) if amount > 0]
+    heapq.heapify(debtors)
+    heapq.heapify(creditors)
+
+    plan = []
+    while debtors and creditors:
+        _, debtor = heapq.heappop(debtors)
+        _, creditor = heapq.heappop(creditors)
+        amount = min(-amounts[debtor], amounts[creditor])
+        plan.append((ids[debtor], ids[creditor], amount))
+
+        amounts[debtor] += amount
+        amounts[creditor] -= amount
+        if amounts[debtor]:
+            heapq.heappush(debtors, (amounts[debtor], debtor))
+        if amounts[creditor]:
+            heapq.heappush(creditors, (-amounts[creditor], creditor))
+
+    verify_plan(balances, plan)
+    return plan
+
+
+def _pair_exact_matches(balances: Dict[Any, int]) -> Tuple[Plan, Dict[Any, int]]:
+    """
+    Settle every debtor whose debt exactly matches some creditor's credit with a
+    single transfer. Some optimal plan always contains such a pair, so this is
+    safe to do before the exhaustive search and shrinks it considerably.
+    """
+    creditors_by_amount = defaultdict(list)
+    for user_id in sorted(balances, key=str):
+        if balances[user_id] > 0:
+            creditors_by_amount[balances[user_id]].append(user_id)
+
+    plan = []
+    remaining = dict(balances)
+    for user_id in sorted(balances, key=str):
+        amount = -balances[user_id]
+        if amount > 0 and creditors_by_amount.get(amount):
+            creditor_id = creditors_by_amount[amount].pop()
+            plan.append((user_id, creditor_id, amount))
+            del remaining[user_id]
+            del remaining[creditor_id]
+    return plan, remaining
+
+
+def _zero_sum_groups(user_ids: List[Any], amounts: List[int], deadline: Optional[float]) -> List[List[Any]]:
+    """
+    Partition balances into the largest possible number of zero-sum groups.
+
+    A group of k balances can always be settled with k - 1 transfers, so the
+    partition with the most groups gives the fewest transfers overall. Uses a
+    bitmask DP over subsets: best[mask] is the most zero-sum groups that a
+    removal order of `mask` passes through, built up one element at a time.
+    """
+    n = len(amounts)
+    full = (1 << n) - 1
+    sums = [0] * (full + 1)
+    best = [0] * (full + 1)
+    for mask in range(1, full + 1):
+        if deadline is not None and not mask & 0x3FF and time.perf_counter() > deadline:
+            raise SolverTimeout()
+
+        low = mask & -mask
+        sums[mask] = sums[mask ^ low] + amounts[low.bit_length() - 1]
+
+        top = 0
+        rest = mask
+        while rest:
+            bit = rest & -rest
+            if best[mask ^ bit] > top:
+                top = best[mask ^ bit]
+            rest ^= bit
+        best[mask] = top + (1 if sums[mask] == 0 else 0)
+
+    # Walk back down from the full set; every zero-sum mask on the way closes a group
+    groups = []
+    current = []
+    mask = full
+    while mask:
+        target = best[mask] - (1 if sums[mask] == 0 else 0)
+        rest = mask
+        while rest:
+            bit = rest & -rest
+            if best[mask ^ bit] == target:
+                break
+            rest ^= bit
+        current.append(user_ids[bit.bit_length() - 1])
+        mask ^= bit
+        if sums[mask] == 0:
+            groups.append(current)
+            current = []
+    return groups
+
+
+def settle_optimal(balances: Dict[Any, int], deadline: Optional[float] = None) -> Plan:
+    """
+    Minimum-transfer settlement via exact zero-sum subgroup search.
+
+    Args:
+        balances: Mapping of user id to net balance in paise; positive means owed money
+        deadline: time.perf_counter() value after which SolverTimeout is raised
+
+    Raises:
+        TooManyBalances: More than SETTLEMENT_OPTIMAL_MAX_BALANCES balances remain after exact pairs
+        SolverTimeout: The deadline passed during the search
+
+    Returns:
+        Plan of (from_user_id, to_user_id, amount_paise) tuples that sums to zero
+    """
+    balances = normalize_balances(balances)
+    plan, remaining = _pair_exact_matches(balances)
+
+    if len(remaining) > settings.SETTLEMENT_OPTIMAL_MAX_BALANCES:
+        # 2^n subsets: too many to search within any reasonable budget
+        raise TooManyBalances(f'{len(remaining)} balances, limit {settings.SETTLEMENT_OPTIMAL_MAX_BALANCES}')
+
+    user_ids = sorted(remaining, key=str)
+    groups = _zero_sum_groups(user_ids, [remaining[user_id] for user_id in user_ids], deadline)
+    for group in groups:
+        plan.extend(settle_greedy({user_id: remaining[user_id] for user_id in group}))
+
+    verify_plan(balances, plan)
+    return plan
+
+
+SOLVERS = ('auto', 'greedy', 'optimal', 'heap')
+
+
+def settle(balances: Dict[Any, int], solver: Optional[str] = None, time_budget_ms: Optional[float] = None) -> SettlementResult:
+    """
+    Build a settlement plan with the requested solver.
+
+    'greedy' is a single sort-and-match pass. 'optimal' finds the true minimum
+    number of transfers for up to SETTLEMENT_OPTIMAL_MAX_BALANCES non-zero
+    balances and falls back to the greedy plan when the group is larger or
+    the search runs out of time. 'heap' is the priority-queue solver for very
+    large groups. 'auto' uses 'optimal' for up to
+    SETTLEMENT_AUTO_OPTIMAL_MAX_BALANCES balances, which fits the default
+    budget, and 'heap' otherwise.
+
+    Args:
+        balances: Mapping of user id to net balance in paise
+        solver: One of SOLVERS; defaults to settings.SETTLEMENT_SOLVER
+        time_budget_ms: Budget for the optimal search; defaults to
+            settings.SETTLEMENT_TIME_BUDGET_MS
+
+    Returns:
+        SettlementResult with the plan, the solver that produced it and the time taken
+    """
+    requested = solver or settings.SETTLEMENT_SOLVER
+    if requested not in SOLVERS:
+        raise ValueError(f'Unknown settlement solver: {requested}')
+    if time_budget_ms is None:
+        time_budget_ms = settings.SETTLEMENT_TIME_BUDGET_MS
+
+    started = time.perf_counter()
+    used = requested
+    if requested == 'auto':
+        nonzero = sum(1 for balance in balances.values() if balance)
+        used = 'optimal' if nonzero <= settings.SETTLEMENT_AUTO_OPTIMAL_MAX_BALANCES else 'heap'
+
+    if used == 'optimal':
+        try:
+            plan = settle_optimal(balances, deadline=started + time_budget_ms / 1000)
+        except TooManyBalances as e:
+            logger.info(f"Optimal settlement skipped, too many balances ({str(e)}); falling back to greedy")
+            used = 'greedy'
+        except SolverTimeout:
+            logger.info(f"Optimal settlement exceeded {time_budget_ms}ms budget; falling back to greedy")
+            used = 'greedy'
+    if used == 'greedy':
+        plan = settle_greedy(balances)
+    elif used == 'heap':
+        plan = settle_heap(balances)
+
+    return SettlementResult(
+        plan=plan,
+        solver=used,
+        requested=requested,
+        elapsed_ms=round((time.perf_counter() - started) * 1000, 3)
+    )
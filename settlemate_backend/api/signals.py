@@ -0,0 +1,53 @@
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from .caching import bump_trip_version, invalidate_trip_membership
+from .models import SyncTombstone, Transaction, Trip, TripMember
+
+
+@receiver(post_save, sender=TripMember)
+@receiver(post_delete, sender=TripMember)
+def trip_member_changed(sender, instance, **kwargs):
+    """Membership changes alter trip summaries and the cached member set"""
+    bump_trip_version(instance.trip_id)
+    invalidate_trip_membership(instance.trip_id)
+
+
+@receiver(post_save, sender=Trip)
+@receiver(post_delete, sender=Trip)
+def trip_changed(sender, instance, **kwargs):
+    """The owner and active flag are part of the cached membership"""
+    invalidate_trip_membership(instance.pk)
+
+
+@receiver(post_init, sender=TripMember)
+def trip_member_loaded(sender, instance, **kwargs):
+    """Remember whether the membership was active, so saves can tell a kick from a re-save"""
+    instance._was_active = instance.is_active
+
+
+@receiver(post_save, sender=TripMember)
+@receiver(post_delete, sender=TripMember)
+def trip_member_removed(sender, instance, created=False, **kwargs):
+    """Kicked or deleted memberships leave one tombstone for delta sync"""
+    if kwargs.get('signal') is post_delete:
+        removed = instance._was_active
+    else:
+        removed = not created and instance._was_active and not instance.is_active
+        instance._was_active = instance.is_active
+    if removed:
+        SyncTombstone.objects.create(
+            trip_id=instance.trip_id,
+            kind=SyncTombstone.KIND_MEMBER,
+            object_id=instance.user_id
+        )
+
+
+@receiver(post_delete, sender=Transaction)
+def transaction_deleted(sender, instance, **kwargs):
+    """Hard-deleted transactions leave a tombstone; soft deletes show up through updated_at"""
+    SyncTombstone.objects.create(
+        trip_id=instance.trip_id,
+        kind=SyncTombstone.KIND_TRANSACTION,
+        object_id=instance.pk
+    )
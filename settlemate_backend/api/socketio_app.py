@@ -1,9 +1,11 @@
 import socketio
 import logging
+from urllib.parse import urlparse
 from django.conf import settings
 from django.utils import timezone
-from .models import Trip, ChatMessage, TripMember, User
+from .models import ChatMessage, User
 from .authentication import verify_jwt_token
+from .caching import get_trip_membership
 
 logger = logging.getLogger(__name__)
 
@@ -12,8 +14,30 @@ Socket.IO server configured to run with 'eventlet' for proper WebSocket support.
 Falls back to long-polling when websocket isn't available.
 """
 
+
+def build_client_manager(write_only=False):
+    """
+    Client manager for SOCKETIO_MESSAGE_QUEUE, or None for in-process rooms.
+
+    Every worker publishes emits to the queue and delivers those addressed to
+    its own clients, so several processes can share rooms. Redis URLs use
+    socketio.RedisManager, other URLs kombu.
+
+    Args:
+        write_only: Only publish, for emitting from processes without a Socket.IO server
+    """
+    url = settings.SOCKETIO_MESSAGE_QUEUE
+    if not url:
+        return None
+    scheme = urlparse(url).scheme.split('+', 1)[0]
+    if scheme in ('redis', 'rediss', 'unix'):
+        return socketio.RedisManager(url, channel=settings.SOCKETIO_CHANNEL, write_only=write_only)
+    return socketio.KombuManager(url, channel=settings.SOCKETIO_CHANNEL, write_only=write_only)
+
+
 # Create Socket.IO server (eventlet mode)
 sio = socketio.Server(async_mode='eventlet',
+    client_manager=build_client_manager(),
     cors_allowed_origins=settings.CORS_ALLOWED_ORIGINS,
     logger=True,
     engineio_logger=True
@@ -64,23 +88,21 @@ def join_room(sid, data):
             return
         
         # Verify user is member of the trip
-        try:
-            trip = Trip.objects.get(id=room_id, is_active=True)
-            user = User.objects.get(id=session['user_id'])
-            
-            if not TripMember.objects.filter(trip=trip, user=user, is_active=True).exists():
-                sio.emit('error', {'message': 'You are not a member of this trip'}, room=sid)
-                return
-            
-            # Join the room
-            sio.enter_room(sid, room_id)
-            logger.info(f"User {user.email} joined room {room_id}")
-            
-            # Send confirmation
-            sio.emit('joined_room', {'roomId': room_id}, room=sid)
-            
-        except (Trip.DoesNotExist, User.DoesNotExist):
+        membership = get_trip_membership(room_id)
+        if membership is None or not membership.is_active:
             sio.emit('error', {'message': 'Invalid trip or user'}, room=sid)
+            return
+        
+        if not membership.is_member(session['user_id']):
+            sio.emit('error', {'message': 'You are not a member of this trip'}, room=sid)
+            return
+        
+        # Join the room
+        sio.enter_room(sid, room_id)
+        logger.info(f"User {session.get('user_email')} joined room {room_id}")
+        
+        # Send confirmation
+        sio.emit('joined_room', {'roomId': room_id}, room=sid)
             
     except Exception as e:
         logger.error(f"Join room error: {str(e)}")
@@ -126,17 +148,21 @@ def msg(sid, data):
             return
         
         # Verify user is member of the trip
+        membership = get_trip_membership(room_id)
+        if membership is None or not membership.is_active:
+            sio.emit('error', {'message': 'Invalid trip or user'}, room=sid)
+            return
+        
+        if not membership.is_member(session['user_id']):
+            sio.emit('error', {'message': 'You are not a member of this trip'}, room=sid)
+            return
+        
         try:
-            trip = Trip.objects.get(id=room_id, is_active=True)
             user = User.objects.get(id=session['user_id'])
             
-            if not TripMember.objects.filter(trip=trip, user=user, is_active=True).exists():
-                sio.emit('error', {'message': 'You are not a member of this trip'}, room=sid)
-                return
-            
             # Create chat message
             chat_message = ChatMessage.objects.create(
-                trip=trip,
+                trip_id=room_id,
                 user=user,
                 message=message_data.get('msg', ''),
                 is_image=message_data.get('isImage', False),
@@ -161,7 +187,7 @@ def msg(sid, data):
             
             logger.info(f"Message from {user.email} broadcasted to room {room_id}")
             
-        except (Trip.DoesNotExist, User.DoesNotExist):
+        except User.DoesNotExist:
             sio.emit('error', {'message': 'Invalid trip or user'}, room=sid)
             
     except Exception as e:
@@ -213,16 +239,20 @@ def clear_chat(sid, data):
             return
         
         # Verify user is trip owner
+        membership = get_trip_membership(room_id)
+        if membership is None or not membership.is_active:
+            sio.emit('error', {'message': 'Invalid trip or user'}, room=sid)
+            return
+        
+        if membership.owner_id != session['user_id']:
+            sio.emit('error', {'message': 'Only trip owner can clear chat'}, room=sid)
+            return
+        
         try:
-            trip = Trip.objects.get(id=room_id, is_active=True)
             user = User.objects.get(id=session['user_id'])
             
-            if trip.owner != user:
-                sio.emit('error', {'message': 'Only trip owner can clear chat'}, room=sid)
-                return
-            
             # Clear chat messages
-            ChatMessage.objects.filter(trip=trip).delete()
+            ChatMessage.objects.filter(trip_id=room_id).delete()
             
             # Broadcast clear message
             clear_message = {
@@ -241,7 +271,7 @@ def clear_chat(sid, data):
             
             logger.info(f"Chat cleared by {user.email} in room {room_id}")
             
-        except (Trip.DoesNotExist, User.DoesNotExist):
+        except User.DoesNotExist:
             sio.emit('error', {'message': 'Invalid trip or user'}, room=sid)
             
     except Exception as e:
@@ -0,0 +1,98 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+from typing import Dict, Optional
+
+from django.conf import settings
+from django.core import signing
+from django.utils import timezone
+
+from .models import SyncTombstone, Transaction, Trip, TripMember
+from .projections import TRANSACTION_FIELDS, project_transactions
+from .serializers import TransactionSerializer
+
+SYNC_TOKEN_SALT = 'api.sync'
+
+
+class SyncTokenExpired(Exception):
+    """The token predates the tombstone retention window; the client must reload the trip"""
+
+
+def make_sync_token(trip: Trip, synced_at: datetime) -> str:
+    """Signed token recording that the client has seen `trip` as of `synced_at`"""
+    return signing.dumps({'trip': str(trip.id), 't': synced_at.timestamp()}, salt=SYNC_TOKEN_SALT, compress=True)
+
+
+def read_sync_token(token: str, trip: Trip) -> datetime:
+    """
+    Validate a sync token for `trip` and return the time it was issued.
+
+    Raises:
+        signing.BadSignature: Tampered token, or one issued for another trip
+        SyncTokenExpired: Older than SYNC_TOMBSTONE_RETENTION_DAYS
+    """
+    max_age = timedelta(days=settings.SYNC_TOMBSTONE_RETENTION_DAYS)
+    try:
+        payload = signing.loads(token, salt=SYNC_TOKEN_SALT, max_age=max_age)
+    except signing.SignatureExpired:
+        raise SyncTokenExpired('Sync token has expired, reload the trip')
+    if payload.get('trip') != str(trip.id):
+        raise signing.BadSignature('Sync token belongs to another trip')
+    return datetime.fromtimestamp(payload['t'], tz=dt_timezone.utc)
+
+
+def _member_payload(member: TripMember) -> Dict:
+    return {'_id': str(member.user.id), 'name': member.user.name, 'email': member.user.email}
+
+
+def get_trip_changes(trip: Trip, since: Optional[datetime], flat: bool = False) -> Dict:
+    """
+    Transactions and memberships of a trip changed after `since`.
+
+    Changed transactions come from `updated_at` (soft-deleted ones are included
+    with is_enabled false), new members from `joined_at`, and removals from the
+    tombstone feed. The window is widened by SYNC_OVERLAP_SECONDS so rows
+    committed late by concurrent writers are not missed; clients apply the
+    result as upserts, so the occasional repeat is harmless.
+
+    Args:
+        trip: Trip object
+        since: Time from a previous sync token, or None for a full snapshot
+        flat: Return flat transaction rows plus a 'users' map (see projections)
+
+    Returns:
+        Dict with 'transactions', 'members', 'removed' and a fresh 'token'
+    """
+    synced_at = timezone.now()
+    transactions = Transaction.objects.filter(trip=trip)
+    members = TripMember.objects.filter(trip=trip, is_active=True).select_related('user')
+    removed = {'transactions': [], 'members': []}
+
+    if since is None:
+        transactions = transactions.filter(is_enabled=True)
+    else:
+        since = since - timedelta(seconds=settings.SYNC_OVERLAP_SECONDS)
+        transactions = transactions.filter(updated_at__gt=since)
+        members = members.filter(joined_at__gt=since)
+        tombstones = SyncTombstone.objects.filter(
+            trip_id=trip.id,
+            created_at__gt=since
+        ).exclude(
+            kind=SyncTombstone.KIND_MEMBER,
+            object_id__in=TripMember.objects.filter(trip=trip, is_active=True).values('user_id')
+        ).values_list('kind', 'object_id').order_by('created_at')
+        for kind, object_id in tombstones:
+            key = 'transactions' if kind == SyncTombstone.KIND_TRANSACTION else 'members'
+            if str(object_id) not in removed[key]:
+                removed[key].append(str(object_id))
+
+    changes = {
+        'members': [_member_payload(member) for member in members],
+        'removed': removed,
+        'token': make_sync_token(trip, synced_at),
+    }
+    transactions = transactions.order_by('-created_at')
+    if flat:
+        changes['transactions'], changes['users'] = project_transactions(transactions.values(*TRANSACTION_FIELDS))
+    else:
+        transactions = transactions.select_related('paid_by').prefetch_related('members__user')
+        changes['transactions'] = TransactionSerializer(transactions, many=True).data
+    return changes
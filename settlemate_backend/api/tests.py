@@ -1,3 +1,1602 @@
-from django.test import TestCase
+import collections
+import contextlib
+import json
+import os
+import random
+import socketserver
+import threading
+import time
+import traceback
+import uuid
+from collections import Counter
+from datetime import timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
 
-# Create your tests here.
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from .caching import (
+    get_trip_membership, invalidate_trip_membership, membership_cache, membership_generation_key, trip_cache
+)
+from .ledger import compute_trip_balances, get_trip_balances, verify_trip_ledger
+from .models import ChatMessage, SyncTombstone, Transaction, TransactionMember, Trip, TripBalance, TripInvite, TripMember, User
+from .settlement import normalize_balances, settle, settle_greedy, split_paise, verify_plan
+from .throttling import local_buckets
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class TripTestCase(TestCase):
+    """Base test case with a trip of `member_count` members and an authenticated client"""
+    member_count = 3
+
+    def setUp(self):
+        trip_cache.clear_local()
+        membership_cache.clear_local()
+        self.users = [
+            User.objects.create_user(
+                username=f'user{i}@example.com',
+                email=f'user{i}@example.com',
+                name=f'User {i}',
+                password='password123'
+            )
+            for i in range(self.member_count)
+        ]
+        self.owner = self.users[0]
+        self.trip = Trip.objects.create(name='Goa', owner=self.owner)
+        for user in self.users:
+            TripMember.objects.create(trip=self.trip, user=user)
+        self.client = self.client_for(self.owner)
+
+    def client_for(self, user):
+        client = APIClient()
+        client.force_authenticate(user=user)
+        return client
+
+    def create_transaction(self, amount, payer=None, members=None):
+        client = self.client_for(payer) if payer else self.client
+        members = members if members is not None else self.users
+        response = client.post('/api/createtransaction', {
+            'tripid': str(self.trip.id),
+            'name': 'Expense',
+            'amount': amount,
+            'member_ids': [str(u.id) for u in members],
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        return response.json()['transactionid']
+
+
+class TripBalanceLedgerTests(TripTestCase):
+    def test_create_transaction_updates_ledger(self):
+        self.create_transaction('300.00')
+
+        balances = get_trip_balances(self.trip)
+        self.assertEqual(balances[self.owner.id], 20000)
+        self.assertEqual(balances[self.users[1].id], -10000)
+        self.assertEqual(balances, compute_trip_balances(self.trip))
+
+    def test_edit_and_delete_keep_ledger_in_sync(self):
+        transaction_id = self.create_transaction('90.00', payer=self.users[1])
+
+        response = self.client.put('/api/edittransaction', {
+            'tripid': str(self.trip.id),
+            'transactionid': transaction_id,
+            'is_enabled': False,
+        }, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(get_trip_balances(self.trip), {})
+
+        self.client.put('/api/edittransaction', {
+            'tripid': str(self.trip.id),
+            'transactionid': transaction_id,
+            'is_enabled': True,
+        }, format='json')
+        self.assertEqual(verify_trip_ledger(self.trip), {})
+
+        response = self.client.delete('/api/deleteTransaction', {
+            'tripid': str(self.trip.id),
+            'transactionid': transaction_id,
+        }, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(get_trip_balances(self.trip), {})
+
+    def test_transfers_read_from_ledger(self):
+        self.create_transaction('300.00')
+
+        response = self.client.post('/api/calculateTransfers', {'tripid': str(self.trip.id)}, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        transfers = response.json()['data']
+        self.assertEqual(len(transfers), 2)
+        self.assertEqual({t['to_user']['id'] for t in transfers}, {str(self.owner.id)})
+        self.assertEqual(sum(Decimal(str(t['amount'])) for t in transfers), Decimal('200'))
+
+    def test_rebuild_ledger_command_repairs_drift(self):
+        self.create_transaction('300.00')
+        TripBalance.objects.filter(trip=self.trip, user=self.owner).update(net_paise=1)
+
+        self.assertNotEqual(verify_trip_ledger(self.trip), {})
+        call_command('rebuild_ledger', stdout=StringIO())
+        self.assertEqual(verify_trip_ledger(self.trip), {})
+
+    def test_admin_cannot_write_around_ledger(self):
+        from django.test import Client
+
+        transaction_id = self.create_transaction('300.00')
+        User.objects.filter(pk=self.owner.pk).update(is_staff=True, is_superuser=True)
+        admin_client = Client()
+        admin_client.force_login(self.owner)
+
+        self.assertEqual(admin_client.get(f'/admin/api/transaction/{transaction_id}/change/').status_code, 200)
+        for url in ['/admin/api/transaction/add/', f'/admin/api/transaction/{transaction_id}/delete/',
+                    '/admin/api/transactionmember/add/', '/admin/api/tripbalance/add/']:
+            with self.subTest(url=url):
+                self.assertEqual(admin_client.post(url, {'name': 'Edited', 'amount': '1.00'}).status_code, 403)
+        admin_client.post(f'/admin/api/transaction/{transaction_id}/change/', {'name': 'Edited', 'amount': '1.00'})
+        self.assertEqual(Transaction.objects.get(pk=transaction_id).name, 'Expense')
+        self.assertEqual(verify_trip_ledger(self.trip), {})
+
+
+class TripSummaryTests(TripTestCase):
+    member_count = 8
+
+    def summary_queries(self, member_count, transaction_count):
+        """Number of queries for the summary endpoint on a trip of the given shape"""
+        TripMember.objects.filter(trip=self.trip).update(is_active=False)
+        TripMember.objects.filter(trip=self.trip, user__in=self.users[:member_count]).update(is_active=True)
+        members = self.users[:member_count]
+        for i in range(transaction_count):
+            self.create_transaction('100.00', payer=members[i % member_count], members=members)
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post('/api/getTripSummary', {'tripid': str(self.trip.id)}, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        return len(ctx.captured_queries), response.json()['data']
+
+    def test_summary_totals(self):
+        _, summary = self.summary_queries(member_count=4, transaction_count=4)
+
+        self.assertEqual(summary['total_spent'], 400.0)
+        self.assertEqual(summary['total_transactions'], 4)
+        for entry in summary['members'].values():
+            self.assertEqual(entry['total_spent'], 100.0)
+            self.assertEqual(entry['total_owed'], 100.0)
+            self.assertEqual(entry['balance'], 0.0)
+
+    def test_query_count_does_not_grow_with_trip_size(self):
+        small, _ = self.summary_queries(member_count=2, transaction_count=1)
+        TripBalance.objects.all().delete()
+        Transaction.objects.all().delete()
+        large, summary = self.summary_queries(member_count=8, transaction_count=24)
+
+        self.assertEqual(len(summary['members']), 8)
+        self.assertEqual(small, large)
+        # trip access lookup + paid, owed and user aggregates
+        self.assertEqual(large, 4)
+
+
+class PaiseSettlementTests(SimpleTestCase):
+    def test_split_paise_largest_remainder(self):
+        self.assertEqual(split_paise(10000, [1, 1, 1]), [3334, 3333, 3333])
+        self.assertEqual(split_paise(1001, [1, 2, 2]), [200, 401, 400])
+        self.assertEqual(sum(split_paise(99999, [3, 7, 11, 13])), 99999)
+
+    def test_greedy_plan_sums_to_zero(self):
+        balances = {'a': 6667, 'b': -3334, 'c': -3333, 'd': 500, 'e': -500}
+        plan = settle_greedy(balances)
+        verify_plan(balances, plan)
+        self.assertTrue(all(isinstance(amount, int) for _, _, amount in plan))
+
+    def test_rounding_residue_is_absorbed(self):
+        # Legacy 100.00 / 3 split stored as 33.33 each leaves one paisa unaccounted for
+        balances = normalize_balances({'payer': 6667, 'b': -3333, 'c': -3333})
+        self.assertEqual(sum(balances.values()), 0)
+        verify_plan(balances, settle_greedy(balances))
+
+
+class TransactionSplitTests(TripTestCase):
+    def test_shares_sum_to_amount_exactly(self):
+        transaction_id = self.create_transaction('100.00')
+        owed = TransactionMember.objects.filter(transaction_id=transaction_id).values_list('amount_owed', flat=True)
+        self.assertEqual(sorted(owed), [Decimal('33.33'), Decimal('33.33'), Decimal('33.34')])
+
+    def test_edited_amount_is_resplit(self):
+        transaction_id = self.create_transaction('100.00')
+        self.client.put('/api/edittransaction', {
+            'tripid': str(self.trip.id),
+            'transactionid': transaction_id,
+            'amount': '200.00',
+        }, format='json')
+
+        owed = TransactionMember.objects.filter(transaction_id=transaction_id).values_list('amount_owed', flat=True)
+        self.assertEqual(sum(owed), Decimal('200.00'))
+        self.assertEqual(verify_trip_ledger(self.trip), {})
+
+
+class BulkTransactionTests(TripTestCase):
+    def post_batch(self, items, client=None):
+        return (client or self.client).post('/api/createTransactions', {
+            'tripid': str(self.trip.id),
+            'transactions': items,
+        }, format='json')
+
+    def batch(self, count):
+        return [
+            {
+                'name': f'Expense {i}',
+                'amount': '100.00',
+                'member_ids': [str(u.id) for u in self.users],
+            }
+            for i in range(count)
+        ]
+
+    def test_batch_updates_ledger_once(self):
+        self.trip.refresh_from_db()
+        version = self.trip.ledger_version
+        response = self.post_batch(self.batch(4))
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(len(response.json()['transactionids']), 4)
+        self.assertEqual(Transaction.objects.filter(trip=self.trip).count(), 4)
+        self.assertEqual(verify_trip_ledger(self.trip), {})
+        self.assertAlmostEqual(get_trip_balances(self.trip)[self.users[2].id], -13333, delta=4)
+
+        self.trip.refresh_from_db()
+        self.assertEqual(self.trip.ledger_version, version + 1)
+
+    def test_creator_pays_and_can_delete(self):
+        member = self.users[1]
+        client = self.client_for(member)
+        items = [{**item, 'paid_by': str(self.owner.id)} for item in self.batch(2)]
+        response = client.post('/api/createTransactions', {'tripid': str(self.trip.id), 'transactions': items}, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        transaction_ids = response.json()['transactionids']
+        self.assertEqual(set(Transaction.objects.filter(id__in=transaction_ids).values_list('paid_by', flat=True)), {member.id})
+
+        response = client.delete('/api/deleteTransaction', {
+            'tripid': str(self.trip.id), 'transactionid': transaction_ids[0]
+        }, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(verify_trip_ledger(self.trip), {})
+
+    def test_query_count_does_not_grow_with_batch_size(self):
+        get_trip_membership(self.trip.id)  # measure both batches against a warm membership cache
+        with CaptureQueriesContext(connection) as small:
+            self.assertEqual(self.post_batch(self.batch(2)).status_code, 201)
+        with CaptureQueriesContext(connection) as large:
+            self.assertEqual(self.post_batch(self.batch(40)).status_code, 201)
+        self.assertEqual(len(small.captured_queries), len(large.captured_queries))
+
+    def test_invalid_entry_rejects_whole_batch(self):
+        outsider = User.objects.create_user(
+            username='outsider@example.com', email='outsider@example.com', name='Outsider', password='password123'
+        )
+        items = self.batch(2) + [{'name': 'Bad', 'amount': '10.00', 'member_ids': [str(outsider.id)]}]
+        response = self.post_batch(items)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('Transaction 3', response.json()['errors'][0]['msg'])
+        self.assertFalse(Transaction.objects.exists())
+
+        response = self.post_batch(self.batch(1), client=self.client_for(outsider))
+        self.assertEqual(response.status_code, 403)
+
+
+class TransactionPaginationTests(TripTestCase):
+    def get_page(self, **params):
+        response = self.client.get('/api/getTransactions', {'tripid': str(self.trip.id), **params})
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def test_pages_cover_every_transaction_once(self):
+        created = {self.create_transaction('10.00') for _ in range(5)}
+        # Same timestamp for everything so the id tie-breaker is exercised
+        Transaction.objects.filter(trip=self.trip).update(created_at=Transaction.objects.first().created_at)
+
+        seen = []
+        body = self.get_page(page_size=2)
+        while True:
+            seen += [item['id'] for item in body['data']]
+            if not body['has_more']:
+                break
+            body = self.get_page(page_size=2, cursor=body['next_cursor'])
+
+        self.assertEqual(len(seen), 5)
+        self.assertEqual(set(seen), created)
+        self.assertIsNone(body['next_cursor'])
+        self.assertNotIn('next_cursor', self.get_page())
+
+    def test_rejects_bad_cursor_and_page_size(self):
+        for params in ({'cursor': 'not-a-cursor'}, {'page_size': '0'}, {'page_size': 'lots'}):
+            response = self.client.get('/api/getTransactions', {'tripid': str(self.trip.id), **params})
+            self.assertEqual(response.status_code, 400, params)
+
+
+class TripSyncTests(TripTestCase):
+    def sync(self, token=None, expected_status=200):
+        params = {'tripid': str(self.trip.id)}
+        if token:
+            params['token'] = token
+        response = self.client.get('/api/syncTrip', params)
+        self.assertEqual(response.status_code, expected_status, response.content)
+        return response.json()
+
+    def test_only_changes_since_token_are_returned(self):
+        old_id = self.create_transaction('30.00')
+        Transaction.objects.filter(id=old_id).update(updated_at=timezone.now() - timedelta(hours=1))
+        TripMember.objects.filter(trip=self.trip).update(joined_at=timezone.now() - timedelta(hours=1))
+
+        body = self.sync()
+        self.assertTrue(body['full'])
+        self.assertEqual(len(body['data']['transactions']), 1)
+        self.assertEqual(len(body['data']['members']), 3)
+
+        token = body['token']
+
+        new_id = self.create_transaction('60.00')
+        response = self.client.delete('/api/deleteTransaction', {'tripid': str(self.trip.id), 'transactionid': new_id}, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.client.post('/api/kickMember', {'tripid': str(self.trip.id), 'userid': str(self.users[2].id)}, format='json')
+        Transaction.objects.get(id=old_id).delete()
+
+        body = self.sync(token)
+        self.assertFalse(body['full'])
+        self.assertEqual([(t['id'], t['is_enabled']) for t in body['data']['transactions']], [(new_id, False)])
+        self.assertEqual(body['data']['members'], [])
+        self.assertEqual(body['data']['removed'], {'transactions': [old_id], 'members': [str(self.users[2].id)]})
+
+    def test_one_member_tombstone_per_removal(self):
+        member = TripMember.objects.get(trip=self.trip, user=self.users[2])
+        member.is_active = False
+        member.save()
+        member.save()
+        TripMember.objects.get(pk=member.pk).save()
+        self.assertEqual(SyncTombstone.objects.filter(kind=SyncTombstone.KIND_MEMBER).count(), 1)
+
+        # Deleting the already-removed row adds nothing; deleting an active one does
+        member.delete()
+        TripMember.objects.get(trip=self.trip, user=self.users[1]).delete()
+        self.assertEqual(SyncTombstone.objects.filter(kind=SyncTombstone.KIND_MEMBER).count(), 2)
+
+    def test_rejects_foreign_and_expired_tokens(self):
+        token = self.sync()['token']
+        other_trip = Trip.objects.create(name='Manali', owner=self.owner)
+        TripMember.objects.create(trip=other_trip, user=self.owner)
+        self.trip = other_trip
+        self.sync(token, expected_status=400)
+
+        with self.settings(SYNC_TOMBSTONE_RETENTION_DAYS=0):
+            self.sync(self.sync()['token'], expected_status=410)
+
+
+class FlatProjectionTests(TripTestCase):
+    def test_flat_shape_matches_nested_content(self):
+        self.create_transaction('100.00')
+        self.create_transaction('45.50', payer=self.users[1], members=self.users[:2])
+
+        params = {'tripid': str(self.trip.id)}
+        nested = self.client.get('/api/getTransactions', params)
+        flat = self.client.get('/api/getTransactions', {**params, 'shape': 'flat'})
+        self.assertEqual(flat.status_code, 200, flat.content)
+        self.assertLess(len(flat.content), len(nested.content))
+
+        body = flat.json()
+        self.assertEqual(set(body['users']), {str(u.id) for u in self.users})
+        self.assertNotIn('profile_picture', body['users'][str(self.owner.id)])
+        for flat_row, nested_row in zip(body['data'], nested.json()['data']):
+            self.assertEqual(flat_row['id'], nested_row['id'])
+            self.assertEqual(flat_row['amount'], nested_row['amount'])
+            self.assertEqual(flat_row['paid_by'], nested_row['paid_by']['id'])
+            self.assertEqual(
+                sorted((m['user'], m['amount_owed']) for m in flat_row['members']),
+                sorted((m['user']['id'], m['amount_owed']) for m in nested_row['members'])
+            )
+
+        page = self.client.get('/api/getTransactions', {**params, 'shape': 'flat', 'page_size': 1}).json()
+        self.assertEqual(len(page['data']), 1)
+        self.assertTrue(page['has_more'])
+        self.assertEqual(self.client.get('/api/getTransactions', {**params, 'shape': 'tree'}).status_code, 400)
+
+
+class ConditionalGetTests(TripTestCase):
+    def get_transactions(self, etag=None):
+        headers = {'HTTP_IF_NONE_MATCH': etag} if etag else {}
+        return self.client.get('/api/getTransactions', {'tripid': str(self.trip.id)}, **headers)
+
+    def test_unchanged_trip_gets_304_after_one_query(self):
+        self.create_transaction('90.00')
+        response = self.get_transactions()
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.get_transactions(etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(len(ctx.captured_queries), 1)
+
+        self.create_transaction('10.00')
+        response = self.get_transactions(etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_etag_tracks_chat_profile_and_caller(self):
+        def trip_data(client, etag=None):
+            headers = {'HTTP_IF_NONE_MATCH': etag} if etag else {}
+            return client.post('/api/getTripData', {'tripid': str(self.trip.id)}, format='json', **headers)
+
+        etag = trip_data(self.client)['ETag']
+        self.assertEqual(trip_data(self.client, etag).status_code, 304)
+        self.assertEqual(trip_data(self.client_for(self.users[1]), etag).status_code, 200)
+
+        ChatMessage.objects.create(trip=self.trip, user=self.users[1], message='hi')
+        etag = trip_data(self.client, etag)['ETag']
+        self.assertEqual(trip_data(self.client, etag).status_code, 304)
+
+        self.client_for(self.users[1]).put('/api/editprofile', {'name': 'Renamed'}, format='json')
+        self.assertEqual(trip_data(self.client, etag).status_code, 200)
+
+        outsider = User.objects.create_user(
+            username='outsider@example.com', email='outsider@example.com', name='Outsider', password='password123'
+        )
+        self.assertEqual(trip_data(self.client_for(outsider), etag).status_code, 403)
+
+
+class TripAccessTests(TripTestCase):
+    def test_errors_for_missing_unknown_and_foreign_trips(self):
+        outsider = User.objects.create_user(
+            username='outsider@example.com', email='outsider@example.com', name='Outsider', password='password123'
+        )
+        cases = [
+            (self.client, {}, 400),
+            (self.client, {'tripid': 'not-a-uuid'}, 400),
+            (self.client, {'tripid': str(uuid.uuid4())}, 404),
+            (self.client_for(outsider), {'tripid': str(self.trip.id)}, 403),
+        ]
+        for client, params, expected in cases:
+            with self.subTest(params=params, expected=expected):
+                response = client.get('/api/getChatMessages', params)
+                self.assertEqual(response.status_code, expected)
+                self.assertFalse(response.json()['success'])
+
+    def test_owner_only_views_reject_members(self):
+        response = self.client_for(self.users[1]).post('/api/clearChat', {'tripid': str(self.trip.id)}, format='json')
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(response.json()['errors'][0]['msg'], 'Only trip owner can clear chat')
+
+        response = self.client.post('/api/clearChat', {'tripid': str(self.trip.id)}, format='json')
+        self.assertEqual(response.status_code, 200)
+
+    def test_authorization_costs_one_query(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/api/getChatMessages', {'tripid': str(self.trip.id)})
+        self.assertEqual(response.status_code, 200)
+        # Trip, owner and membership come from one lookup; the other query loads the messages
+        self.assertEqual(len(ctx.captured_queries), 2)
+        self.assertIn('api_tripmember', ctx.captured_queries[0]['sql'])
+
+
+class MembershipCacheTests(TripTestCase):
+    def test_cached_membership_needs_no_queries(self):
+        membership = get_trip_membership(self.trip.id)
+        self.assertEqual(membership.member_ids, {str(user.id) for user in self.users})
+        self.assertEqual(membership.owner_id, str(self.owner.id))
+
+        with self.assertNumQueries(0):
+            self.assertTrue(get_trip_membership(self.trip.id).is_member(self.users[1].id))
+        self.assertIsNone(get_trip_membership(uuid.uuid4()))
+        self.assertIsNone(get_trip_membership('not-a-uuid'))
+
+    def test_kick_and_rejoin_invalidate(self):
+        kicked = self.users[2]
+        self.assertTrue(get_trip_membership(self.trip.id).is_member(kicked.id))
+
+        response = self.client.post('/api/kickMember', {'tripid': str(self.trip.id), 'userid': str(kicked.id)}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(get_trip_membership(self.trip.id).is_member(kicked.id))
+
+        # A kicked member can no longer be split into new transactions
+        response = self.client.post('/api/createtransaction', {
+            'tripid': str(self.trip.id), 'name': 'Dinner', 'amount': '90.00', 'member_ids': [str(kicked.id)],
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+
+        invite = TripInvite.objects.create(
+            trip=self.trip, invited_by=self.owner, invited_email=kicked.email,
+            expires_at=timezone.now() + timedelta(days=1)
+        )
+        response = self.client_for(kicked).post('/api/acceptInvite', {'invite_id': str(invite.id)}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(get_trip_membership(self.trip.id).is_member(kicked.id))
+
+    def test_other_worker_invalidation_is_seen_at_once(self):
+        from django.core.cache import cache
+
+        kicked = self.users[2]
+        self.assertTrue(get_trip_membership(self.trip.id).is_member(kicked.id))
+
+        # Another worker kicks the member: the row changes and its invalidation reaches
+        # only the shared tier, never this process's memory
+        TripMember.objects.filter(trip=self.trip, user=kicked).update(is_active=False)
+        cache.incr(membership_generation_key(self.trip.id))
+        self.assertFalse(get_trip_membership(self.trip.id).is_member(kicked.id))
+
+        TripMember.objects.filter(trip=self.trip, user=kicked).update(is_active=True)
+        cache.incr(membership_generation_key(self.trip.id))
+        self.assertTrue(get_trip_membership(self.trip.id).is_member(kicked.id))
+
+    def test_reader_racing_a_kick_cannot_recache_old_members(self):
+        from unittest import mock
+        from . import caching
+
+        kicked = self.users[2]
+        load = caching._load_trip_membership
+
+        def load_before_kick(trip_id):
+            membership = load(trip_id)
+            TripMember.objects.filter(trip=self.trip, user=kicked).update(is_active=False)
+            invalidate_trip_membership(self.trip.id)
+            return membership
+
+        with mock.patch.object(caching, '_load_trip_membership', side_effect=load_before_kick):
+            self.assertTrue(get_trip_membership(self.trip.id).is_member(kicked.id))
+        self.assertFalse(get_trip_membership(self.trip.id).is_member(kicked.id))
+
+    def test_invalidation_retries_cache_errors(self):
+        from unittest import mock
+        from django.core.cache import cache
+
+        get_trip_membership(self.trip.id)
+        TripMember.objects.filter(trip=self.trip, user=self.users[2]).update(is_active=False)
+        incr = cache.incr
+        failures = [ConnectionError('down'), ConnectionError('down')]
+
+        def flaky_incr(key, *args, **kwargs):
+            if failures:
+                raise failures.pop()
+            return incr(key, *args, **kwargs)
+
+        with mock.patch.object(cache, 'incr', side_effect=flaky_incr), mock.patch('api.caching.time.sleep'):
+            invalidate_trip_membership(self.trip.id)
+        self.assertFalse(get_trip_membership(self.trip.id).is_member(self.users[2].id))
+
+        with mock.patch.object(cache, 'incr', side_effect=ConnectionError('down')), \
+                mock.patch('api.caching.time.sleep'), self.assertLogs('api.caching', 'ERROR'):
+            invalidate_trip_membership(self.trip.id)
+
+    def test_socket_join_checks_cached_membership(self):
+        from unittest import mock
+        from . import socketio_app
+
+        outsider = User.objects.create_user(
+            username='outsider@example.com', email='outsider@example.com', name='Outsider', password='password123'
+        )
+        get_trip_membership(self.trip.id)
+        for user, event in [(self.users[1], 'joined_room'), (outsider, 'error')]:
+            with self.subTest(user=user.email), \
+                    mock.patch.object(socketio_app.sio, 'get_session', return_value={'user_id': str(user.id)}), \
+                    mock.patch.object(socketio_app.sio, 'enter_room'), \
+                    mock.patch.object(socketio_app.sio, 'emit') as emit, \
+                    self.assertNumQueries(0):
+                socketio_app.join_room('sid', {'roomId': str(self.trip.id)})
+                self.assertEqual(emit.call_args.args[0], event)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class PrincipalCacheTests(TestCase):
+    def setUp(self):
+        from .authentication import principal_cache
+        principal_cache.clear_local()
+        local_buckets.clear()
+        self.user = User.objects.create_user(
+            username='user@example.com', email='user@example.com', name='User', password='password123'
+        )
+        self.client = APIClient()
+        response = self.client.post('/api/login', {'email': 'user@example.com', 'password': 'password123'}, format='json')
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {response.json()["authToken"]}')
+
+    def get_user_data(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/api/getUserData')
+        return response, len(ctx.captured_queries)
+
+    def test_repeat_requests_skip_auth_queries(self):
+        response, cold = self.get_user_data()
+        self.assertEqual(response.status_code, 200)
+        response, warm = self.get_user_data()
+        self.assertEqual(response.status_code, 200)
+        # Access tokens never touch the session table and the user lookup is cached;
+        # only the pending invite count remains
+        self.assertEqual(cold - warm, 1)
+        self.assertEqual(warm, 1)
+
+    def test_logout_and_password_change_evict(self):
+        from .models import PasswordResetToken
+
+        self.get_user_data()
+        self.assertEqual(self.client.post('/api/logout').status_code, 200)
+        self.assertEqual(self.get_user_data()[0].status_code, 401)
+
+        response = APIClient().post('/api/login', {'email': 'user@example.com', 'password': 'password123'}, format='json')
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {response.json()["authToken"]}')
+        self.assertEqual(self.get_user_data()[0].status_code, 200)
+        reset = PasswordResetToken.objects.create(user=self.user, token=str(uuid.uuid4()))
+        response = APIClient().post('/api/changePassword', {
+            'token': reset.token, 'password': 'Xk29!pqrs', 'password_confirm': 'Xk29!pqrs'
+        }, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(self.get_user_data()[0].status_code, 401)
+
+    def test_profile_edit_refreshes_snapshot(self):
+        self.get_user_data()
+        self.assertEqual(self.client.put('/api/editprofile', {'name': 'Renamed'}, format='json').status_code, 200)
+        response, _ = self.get_user_data()
+        self.assertEqual(response.json()['data']['name'], 'Renamed')
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class UserSessionTests(TestCase):
+    def setUp(self):
+        local_buckets.clear()
+        self.user = User.objects.create_user(
+            username='user@example.com', email='user@example.com', name='User', password='password123'
+        )
+
+    def login(self, agent):
+        client = APIClient(HTTP_USER_AGENT=agent)
+        response = client.post('/api/login', {'email': 'user@example.com', 'password': 'password123'}, format='json')
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {response.json()["authToken"]}')
+        return client
+
+    def test_devices_keep_separate_sessions(self):
+        from .models import UserSession
+
+        phone, laptop = self.login('phone'), self.login('laptop')
+        sessions = UserSession.objects.filter(user=self.user)
+        self.assertEqual(sorted(sessions.values_list('device_info', flat=True)), ['laptop', 'phone'])
+        self.assertTrue(all(len(session.token_digest) == 64 for session in sessions))
+
+        self.assertEqual(phone.post('/api/logout').status_code, 200)
+        self.assertEqual(phone.get('/api/getUserData').status_code, 401)
+        self.assertEqual(laptop.get('/api/getUserData').status_code, 200)
+
+    def test_prune_sessions_removes_revoked_ones(self):
+        from .models import UserSession
+
+        self.login('phone').post('/api/logout')
+        self.login('laptop')
+        call_command('prune_sessions', stdout=StringIO())
+        self.assertEqual(list(UserSession.objects.values_list('device_info', flat=True)), ['laptop'])
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class RefreshTokenTests(TestCase):
+    def setUp(self):
+        local_buckets.clear()
+        self.user = User.objects.create_user(
+            username='user@example.com', email='user@example.com', name='User', password='password123'
+        )
+        response = APIClient().post('/api/login', {'email': 'user@example.com', 'password': 'password123'}, format='json')
+        self.tokens = response.json()
+
+    def get_user_data(self, token):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        return client.get('/api/getUserData').status_code
+
+    def refresh(self, token):
+        return APIClient().post('/api/refreshToken', {'refreshToken': token}, format='json')
+
+    def test_refresh_rotates_tokens(self):
+        response = self.refresh(self.tokens['refreshToken'])
+        self.assertEqual(response.status_code, 200, response.content)
+        rotated = response.json()
+        self.assertEqual(self.get_user_data(rotated['authToken']), 200)
+
+        # Refresh tokens are single use and never accepted as access tokens
+        self.assertEqual(self.refresh(self.tokens['refreshToken']).status_code, 401)
+        self.assertEqual(self.get_user_data(rotated['refreshToken']), 401)
+        self.assertEqual(self.refresh(rotated['authToken']).status_code, 401)
+
+    def test_logout_revokes_access_and_refresh_tokens(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.tokens["authToken"]}')
+        self.assertEqual(client.post('/api/logout').status_code, 200)
+
+        self.assertEqual(self.get_user_data(self.tokens['authToken']), 401)
+        self.assertEqual(self.refresh(self.tokens['refreshToken']).status_code, 401)
+
+    def test_revocation_survives_cache_flush(self):
+        from django.core.cache import cache
+        from .models import UserSession
+
+        # Revoked while the cache was unavailable, then the cache comes back empty
+        UserSession.objects.filter(user=self.user).update(is_active=False)
+        cache.clear()
+        self.assertEqual(self.get_user_data(self.tokens['authToken']), 401)
+
+        # Tokens issued after the flush skip the session table again
+        UserSession.objects.filter(user=self.user).delete()
+        response = APIClient().post('/api/login', {'email': 'user@example.com', 'password': 'password123'}, format='json')
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {response.json()["authToken"]}')
+        client.get('/api/getUserData')
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(client.get('/api/getUserData').status_code, 200)
+        self.assertFalse(any('api_usersession' in query['sql'] for query in ctx.captured_queries))
+
+    def test_failed_revocation_write_falls_back_to_sessions(self):
+        from unittest import mock
+        from django.core.cache import cache
+
+        self.assertEqual(self.get_user_data(self.tokens['authToken']), 200)
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.tokens["authToken"]}')
+        with mock.patch.object(cache, 'set_many', side_effect=ConnectionError('down')):
+            self.assertEqual(client.post('/api/logout').status_code, 200)
+        self.assertEqual(self.get_user_data(self.tokens['authToken']), 401)
+
+    def test_tokens_without_type_use_their_session(self):
+        import jwt
+        from django.conf import settings
+        from .authentication import token_digest
+        from .models import UserSession
+
+        legacy = jwt.encode({
+            'user_id': str(self.user.id), 'email': self.user.email, 'exp': timezone.now() + timedelta(hours=1)
+        }, settings.JWT_SECRET_KEY, algorithm=settings.JWT_ALGORITHM)
+        session = UserSession.objects.create(
+            user=self.user, jti=uuid.uuid4().hex, token_digest=token_digest(legacy),
+            expires_at=timezone.now() + timedelta(hours=1)
+        )
+        self.assertEqual(self.get_user_data(legacy), 200)
+        session.is_active = False
+        session.save()
+        self.assertEqual(self.get_user_data(legacy), 401)
+
+
+@override_settings(
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+    RATE_LIMITS={
+        'login': {'ip': '5/minute', 'account': '2/minute'},
+        'invite': {'account': '1/hour'},
+    },
+    METRICS_TOKEN='scrape-token'
+)
+class RateLimitTests(TestCase):
+    def setUp(self):
+        from .throttling import metrics
+
+        local_buckets.clear()
+        metrics.clear()
+        self.user = User.objects.create_user(
+            username='user@example.com', email='user@example.com', name='User', password='password123'
+        )
+
+    def login(self, email, ip='10.0.0.1'):
+        return APIClient(REMOTE_ADDR=ip).post('/api/login', {'email': email, 'password': 'wrong'}, format='json')
+
+    def test_account_bucket_spans_addresses(self):
+        self.assertEqual(self.login('user@example.com', '10.0.0.1').status_code, 400)
+        self.assertEqual(self.login('USER@example.com', '10.0.0.2').status_code, 400)
+        response = self.login('user@example.com', '10.0.0.3')
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response.json()['success'], False)
+        self.assertGreaterEqual(int(response['Retry-After']), 1)
+        # Other accounts are unaffected
+        self.assertEqual(self.login('other@example.com', '10.0.0.3').status_code, 400)
+
+    def test_ip_bucket_spans_accounts(self):
+        statuses = [self.login(f'guess{i}@example.com').status_code for i in range(6)]
+        self.assertEqual(statuses, [400] * 5 + [429])
+        self.assertEqual(self.login('guess0@example.com', '10.0.0.9').status_code, 400)
+
+    def test_spoofed_forwarded_for_keeps_ip_bucket(self):
+        def login(forwarded_for):
+            return APIClient(REMOTE_ADDR='10.0.0.1', HTTP_X_FORWARDED_FOR=forwarded_for).post(
+                '/api/login', {'email': f'{forwarded_for}@example.com', 'password': 'wrong'}, format='json'
+            )
+
+        statuses = [login(f'203.0.113.{i}').status_code for i in range(6)]
+        self.assertEqual(statuses, [400] * 5 + [429])
+
+    def test_bucket_refills(self):
+        from unittest import mock
+        from .throttling import LocalBuckets
+
+        buckets = LocalBuckets()
+        with mock.patch('api.throttling.time.monotonic', side_effect=[0.0, 0.0, 0.0, 30.0]):
+            self.assertEqual(buckets.consume('k', capacity=2, rate=2 / 60), 0)
+            self.assertEqual(buckets.consume('k', capacity=2, rate=2 / 60), 0)
+            self.assertAlmostEqual(buckets.consume('k', capacity=2, rate=2 / 60), 30.0)
+            self.assertEqual(buckets.consume('k', capacity=2, rate=2 / 60), 0)
+
+    def test_redis_failure_falls_back_to_local_buckets(self):
+        from unittest import mock
+        from .throttling import consume, redis_buckets
+
+        redis_settings = {'default': {'BACKEND': 'django_redis.cache.RedisCache', 'LOCATION': 'redis://localhost:1/0'}}
+        with override_settings(CACHES=redis_settings), \
+                mock.patch.object(redis_buckets, 'consume', side_effect=ConnectionError('refused')):
+            self.assertEqual(consume('ratelimit:test', '1/minute'), 0)
+            self.assertGreater(consume('ratelimit:test', '1/minute'), 0)
+
+    def test_invite_is_limited_per_inviter(self):
+        trip = Trip.objects.create(name='Trip', owner=self.user)
+        TripMember.objects.create(trip=trip, user=self.user)
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+        first = client.post('/api/invite', {'tripid': str(trip.id), 'email': 'a@example.com'}, format='json')
+        self.assertEqual(first.status_code, 200, first.content)
+        second = client.post('/api/invite', {'tripid': str(trip.id), 'email': 'b@example.com'}, format='json')
+        self.assertEqual(second.status_code, 429)
+
+    def test_metrics_exports_counters(self):
+        for _ in range(3):
+            self.login('user@example.com')
+        self.assertEqual(APIClient().get('/api/metrics').status_code, 404)
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION='Bearer scrape-token')
+        body = client.get('/api/metrics').content.decode()
+        self.assertIn('settlemate_rate_limit_decisions_total{scope="login",outcome="allowed"} 2', body)
+        self.assertIn('settlemate_rate_limit_decisions_total{scope="login",outcome="throttled_account"} 1', body)
+
+
+class ORJSONCodecTests(SimpleTestCase):
+    def test_renderer_matches_stdlib_output(self):
+        import json
+        import uuid
+        from django.utils.translation import gettext_lazy
+        from rest_framework.renderers import JSONRenderer
+        from .renderers import ORJSONRenderer
+
+        payload = {
+            'id': uuid.uuid4(),
+            'amount': Decimal('12.50'),
+            'when': timezone.now(),
+            'day': timezone.now().date(),
+            'label': gettext_lazy('Trip'),
+            'rows': ({'n': 1}, [2, 3]),
+            'balances': {1: 'one'},
+        }
+        self.assertEqual(
+            json.loads(ORJSONRenderer().render(payload)),
+            json.loads(JSONRenderer().render(payload))
+        )
+        self.assertEqual(ORJSONRenderer().render(None), b'')
+
+    def test_parser_rejects_malformed_json(self):
+        from rest_framework.exceptions import ParseError
+        from .parsers import ORJSONParser
+
+        self.assertEqual(ORJSONParser().parse(BytesIO(b'{"a": [1, 2.5]}')), {'a': [1, 2.5]})
+        with self.assertRaises(ParseError):
+            ORJSONParser().parse(BytesIO(b'{"a": '))
+
+
+class SolverTests(SimpleTestCase):
+    # Two zero-sum triples that greedy matching cuts across
+    balances = {'a': 500, 'b': 500, 'c': -300, 'd': -200, 'e': -400, 'f': -100}
+
+    def test_optimal_beats_greedy(self):
+        greedy = settle(self.balances, solver='greedy')
+        optimal = settle(self.balances, solver='optimal')
+
+        self.assertEqual(len(greedy.plan), 5)
+        self.assertEqual(len(optimal.plan), 4)
+        self.assertEqual(optimal.solver, 'optimal')
+        verify_plan(self.balances, optimal.plan)
+
+    def unpaired_balances(self, count, seed):
+        # No exact pairs, so the whole group goes through the exhaustive search
+        rng = random.Random(seed)
+        balances = {f'u{i}': rng.randint(1, 10 ** 6) * rng.choice((1, -1)) for i in range(count)}
+        balances['u0'] -= sum(balances.values())
+        return balances
+
+    def test_falls_back_to_greedy_when_budget_runs_out(self):
+        from unittest import mock
+
+        balances = self.unpaired_balances(12, seed=7)
+        # The clock jumps a minute on every read, so the first deadline check fails
+        clock = iter(range(0, 10 ** 6, 60))
+        with mock.patch('api.settlement.time.perf_counter', side_effect=lambda: next(clock)), \
+                self.assertLogs('api.settlement', 'INFO') as logs:
+            result = settle(balances, solver='optimal', time_budget_ms=1000)
+        self.assertEqual(result.solver, 'greedy')
+        self.assertEqual(result.requested, 'optimal')
+        self.assertIn('exceeded 1000ms budget', logs.output[0])
+        verify_plan(balances, result.plan)
+
+    def test_auto_threshold_and_optimal_cap(self):
+        from unittest import mock
+        from django.conf import settings
+        from . import settlement
+
+        at_threshold = self.unpaired_balances(settings.SETTLEMENT_AUTO_OPTIMAL_MAX_BALANCES, seed=3)
+        above_threshold = self.unpaired_balances(settings.SETTLEMENT_AUTO_OPTIMAL_MAX_BALANCES + 2, seed=3)
+        above_cap = self.unpaired_balances(settings.SETTLEMENT_OPTIMAL_MAX_BALANCES + 1, seed=3)
+
+        with mock.patch.object(settlement, '_zero_sum_groups', side_effect=lambda ids, amounts, deadline: [ids]) as search:
+            self.assertEqual(settle(at_threshold, solver='auto').solver, 'optimal')
+            self.assertEqual(settle(above_threshold, solver='auto').solver, 'heap')
+            # Asked for explicitly, groups past the auto threshold still get the exact search
+            self.assertEqual(settle(above_threshold, solver='optimal', time_budget_ms=10 ** 5).solver, 'optimal')
+            self.assertEqual(search.call_count, 2)
+
+            with self.assertLogs('api.settlement', 'INFO') as logs:
+                result = settle(above_cap, solver='optimal', time_budget_ms=10 ** 5)
+            self.assertEqual(result.solver, 'greedy')
+            self.assertIn('too many balances', logs.output[0])
+            self.assertEqual(search.call_count, 2)
+
+    def test_heap_plan_for_large_group(self):
+        rng = random.Random(11)
+        balances = {f'u{i}': rng.randint(-100000, 100000) for i in range(2000)}
+        balances['u0'] -= sum(balances.values())
+
+        result = settle(balances)
+        self.assertEqual(result.solver, 'heap')
+        self.assertLess(len(result.plan), len(balances))
+        verify_plan(balances, result.plan)
+
+
+class CalculateTransfersSolverTests(TripTestCase):
+    def test_response_reports_solver(self):
+        self.create_transaction('300.00')
+
+        response = self.client.post('/api/calculateTransfers', {
+            'tripid': str(self.trip.id),
+            'solver': 'optimal',
+        }, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.json()['solver']['name'], 'optimal')
+        self.assertIn('elapsed_ms', response.json()['solver'])
+
+        response = self.client.post('/api/calculateTransfers', {
+            'tripid': str(self.trip.id),
+            'solver': 'magic',
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class SettlementCacheTests(TripTestCase):
+    def calculate(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post('/api/calculateTransfers', {'tripid': str(self.trip.id)}, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()['data'], ctx.captured_queries
+
+    def test_unchanged_trip_is_served_from_cache(self):
+        self.create_transaction('300.00')
+        first, _ = self.calculate()
+
+        trip_cache.clear_local()  # exercise the shared tier as well
+        for _ in range(2):
+            again, queries = self.calculate()
+            self.assertEqual(again, first)
+            # Only the trip access lookup, shared by the ETag check and the view, remains
+            self.assertEqual(len(queries), 1)
+            self.assertFalse([q for q in queries if 'api_tripbalance' in q['sql']])
+
+    def test_writes_move_trip_to_new_version(self):
+        self.create_transaction('300.00')
+        version = Trip.objects.get(pk=self.trip.pk).ledger_version
+        first, _ = self.calculate()
+
+        self.create_transaction('90.00', payer=self.users[1])
+        self.assertGreater(Trip.objects.get(pk=self.trip.pk).ledger_version, version)
+        second, _ = self.calculate()
+        self.assertNotEqual(first, second)
+
+    def test_trip_save_does_not_clobber_version(self):
+        stale = Trip.objects.get(pk=self.trip.pk)
+        self.create_transaction('300.00')
+        current = Trip.objects.get(pk=self.trip.pk).ledger_version
+
+        stale.name = 'Renamed'
+        stale.save()
+        self.assertEqual(Trip.objects.get(pk=self.trip.pk).ledger_version, current)
+
+
+class CrossTripSettlementTests(TripTestCase):
+    member_count = 2
+
+    def test_debts_are_netted_across_trips(self):
+        owner, friend = self.users
+        self.create_transaction('200.00', payer=owner)
+
+        other_trip = Trip.objects.create(name='Manali', owner=owner)
+        for user in self.users:
+            TripMember.objects.create(trip=other_trip, user=user)
+        self.trip = other_trip
+        self.create_transaction('100.00', payer=friend)
+
+        response = self.client.get('/api/settleAcrossTrips')
+        self.assertEqual(response.status_code, 200, response.content)
+
+        body = response.json()
+        self.assertEqual(len(body['data']), 1)
+        self.assertEqual(body['data'][0]['from_user']['id'], str(friend.id))
+        self.assertEqual(body['data'][0]['to_user']['id'], str(owner.id))
+        self.assertEqual(body['data'][0]['amount'], 50.0)
+        self.assertEqual(body['balance'], 50.0)
+        self.assertEqual(body['transfers_saved'], 1)
+        self.assertEqual(sorted(t['balance'] for t in body['breakdown']), [-50.0, 100.0])
+
+        # Per-trip plans come from the settlement cache
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get('/api/settleAcrossTrips').json()['data'], body['data'])
+        # ...read from the shared tier in one round trip
+        from unittest import mock
+        from django.core.cache import cache
+        trip_cache.clear_local()
+        with mock.patch.object(cache, 'get_many', wraps=cache.get_many) as get_many:
+            self.assertEqual(self.client.get('/api/settleAcrossTrips').json()['data'], body['data'])
+        get_many.assert_called_once()
+        self.assertEqual(len(get_many.call_args.args[0]), 2)
+        self.assertEqual(self.client_for(friend).get('/api/settleAcrossTrips').json()['data'], body['data'])
+
+
+class CrossTripCallerTests(TripTestCase):
+    member_count = 3
+
+    def test_plan_only_moves_the_callers_money(self):
+        owner, first, second = self.users
+        self.create_transaction('300.00', payer=first)
+
+        other_trip = Trip.objects.create(name='Manali', owner=owner)
+        for user in (owner, second):
+            TripMember.objects.create(trip=other_trip, user=user)
+        self.trip = other_trip
+        self.create_transaction('200.00', payer=owner, members=[owner, second])
+
+        plans = {user: self.client_for(user).get('/api/settleAcrossTrips').json()['data'] for user in self.users}
+        pairs = {
+            user: {(t['from_user']['id'], t['to_user']['id'], t['amount']) for t in plan}
+            for user, plan in plans.items()
+        }
+        for user, transfers in pairs.items():
+            self.assertTrue(all(str(user.id) in (from_id, to_id) for from_id, to_id, _ in transfers))
+        self.assertEqual(pairs[owner], {(str(owner.id), str(first.id), 100.0), (str(second.id), str(owner.id), 100.0)})
+        # Whoever asks, a pair of users sees the same transfer between them
+        self.assertIn((str(owner.id), str(first.id), 100.0), pairs[first])
+        self.assertIn((str(second.id), str(owner.id), 100.0), pairs[second])
+
+
+class BatchBalanceTests(TripTestCase):
+    def test_vectorized_balances_match_ledger(self):
+        from .batch_balances import compute_balances, diff_balances, stored_balances
+
+        self.create_transaction('300.00')
+        self.create_transaction('100.00', payer=self.users[1])
+        other_trip = Trip.objects.create(name='Manali', owner=self.owner)
+        TripMember.objects.create(trip=other_trip, user=self.owner)
+        TripMember.objects.create(trip=other_trip, user=self.users[2])
+        self.trip = other_trip
+        self.create_transaction('55.55', members=[self.owner, self.users[2]])
+
+        expected = compute_balances()
+        self.assertEqual(len({trip_id for trip_id, _ in expected}), 2)
+        self.assertEqual(expected[(other_trip.id, self.owner.id)], -expected[(other_trip.id, self.users[2].id)])
+        self.assertEqual(diff_balances(stored_balances(), expected), {})
+
+        TripBalance.objects.filter(trip=other_trip, user=self.owner).update(net_paise=0)
+        self.assertEqual(
+            diff_balances(stored_balances(), compute_balances()),
+            {(other_trip.id, self.owner.id): (0, expected[(other_trip.id, self.owner.id)])}
+        )
+        call_command('reconcile_balances', '--fix', stdout=StringIO())
+        self.assertEqual(diff_balances(stored_balances(), compute_balances()), {})
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class BenchmarkSuiteTests(TestCase):
+    def test_generated_trip_matches_shape(self):
+        from .benchmarking import TripShape, generate_trip
+
+        shape = TripShape.parse('members=6,transactions=20,density=0.5')
+        self.assertEqual(shape, TripShape(members=6, transactions=20, density=0.5, skew=1.0))
+        with self.assertRaises(ValueError):
+            TripShape.parse('guests=3')
+
+        trip = generate_trip(shape, seed=7)
+        self.assertEqual(trip.members.count(), 6)
+        self.assertEqual(trip.transactions.count(), 20)
+        self.assertEqual(TransactionMember.objects.filter(transaction__trip=trip).count(), 60)
+        self.assertEqual(verify_trip_ledger(trip), {})
+
+    def test_trip_suite_writes_json(self):
+        import json
+        import tempfile
+
+        with tempfile.NamedTemporaryFile(suffix='.json') as output:
+            call_command(
+                'benchmark', '--suite', 'trip', '--shape', 'members=4,transactions=10',
+                '--repeat', '1', '--output', output.name, stdout=StringIO()
+            )
+            report = json.load(open(output.name))
+
+        self.assertEqual(len(report['results']), 6)
+        self.assertEqual({r['mode'] for r in report['results']}, {'cold', 'warm'})
+        self.assertFalse(Trip.objects.exists())
+
+
+class PasswordHashingTests(SimpleTestCase):
+    def test_green_threads_hash_in_thread_pool(self):
+        import eventlet
+        from unittest import mock
+        from django.contrib.auth.hashers import check_password, make_password
+        from . import hashers
+
+        encoded = make_password('password123')
+        self.assertTrue(encoded.startswith('pbkdf2_sha256$'))
+        with mock.patch.object(hashers.tpool, 'execute', wraps=hashers.tpool.execute) as execute:
+            self.assertTrue(check_password('password123', encoded))
+            execute.assert_not_called()
+            self.assertTrue(eventlet.spawn(check_password, 'password123', encoded).wait())
+            self.assertEqual(execute.call_count, 1)
+
+    def test_login_storm_suite_hashes_off_the_hub(self):
+        import json
+        import tempfile
+        from unittest import mock
+        from . import hashers
+
+        with tempfile.NamedTemporaryFile(suffix='.json') as output, \
+                mock.patch.object(hashers.tpool, 'execute', wraps=hashers.tpool.execute) as execute:
+            call_command(
+                'benchmark', '--suite', 'login_storm', '--logins', '4', '--target-ms', '60000',
+                '--output', output.name, stdout=StringIO()
+            )
+            results = {r['name']: r for r in json.load(open(output.name))['results']}
+
+        self.assertEqual(set(results), {'idle', 'inline', 'offloaded'})
+        # Only the offloaded storm's password checks go through the thread pool
+        self.assertEqual(execute.call_count, 4)
+
+
+class ExplainQueriesTests(TestCase):
+    def test_hot_queries_use_indexes(self):
+        out = StringIO()
+        call_command('explain_queries', stdout=out)
+        self.assertIn('Every hot query uses an index', out.getvalue())
+
+
+@override_settings(
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+    METRICS_TOKEN='scrape-token'
+)
+class QueryBudgetTests(TestCase):
+    """
+    Every URL in api/urls.py against a small and a large seeded trip.
+
+    Each endpoint declares a query budget; the count must stay within it and be
+    the same at both sizes, so anything that scales with members, transactions,
+    trips or messages fails here with the call sites that issued the queries.
+    """
+    SIZES = [
+        {'members': 3, 'transactions': 3, 'trips': 1, 'messages': 2},
+        {'members': 12, 'transactions': 40, 'trips': 4, 'messages': 25},
+    ]
+
+    # url name -> (method, request builder returning (user or bearer token, data), query budget)
+    ENDPOINTS = {
+        'signup': ('post', lambda s: (None, {
+            'email': 'new@example.com', 'name': 'New', 'password': 'Xk29!pqrs', 'password_confirm': 'Xk29!pqrs'
+        }), 3),
+        'login': ('post', lambda s: (None, {'email': s.owner.email, 'password': 'password123'}), 2),
+        'logout': ('post', lambda s: (s.owner, {}), 0),
+        'refresh_token': ('post', lambda s: (None, {'refreshToken': s.refresh_token}), 2),
+        'forgot_password': ('post', lambda s: (None, {'email': s.owner.email}), 2),
+        'change_password': ('post', lambda s: (None, {
+            'token': s.reset_token, 'password': 'Xk29!pqrs', 'password_confirm': 'Xk29!pqrs'
+        }), 6),
+        'get_user_data': ('get', lambda s: (s.owner, {}), 1),
+        'edit_profile': ('put', lambda s: (s.owner, {'name': 'Renamed'}), 4),
+        'create_trip': ('post', lambda s: (s.owner, {'name': 'New trip'}), 3),
+        'get_trips_data': ('get', lambda s: (s.owner, {}), 2),
+        'get_trip_data': ('post', lambda s: (s.owner, {'tripid': s.tripid}), 4),
+        'get_trip_members': ('post', lambda s: (s.owner, {'tripid': s.tripid}), 2),
+        'sync_trip': ('get', lambda s: (s.owner, {'tripid': s.tripid}), 5),
+        'kick_member': ('post', lambda s: (s.owner, {'tripid': s.tripid, 'userid': s.member_id}), 5),
+        'admin_member': ('post', lambda s: (s.owner, {'tripid': s.tripid, 'userid': s.member_id}), 7),
+        'invite_member': ('post', lambda s: (s.owner, {'tripid': s.tripid, 'email': 'friend@example.com'}), 5),
+        'accept_invite': ('post', lambda s: (s.owner, {'invite_id': s.invite_id}), 8),
+        'decline_invite': ('post', lambda s: (s.owner, {'invite_id': s.invite_id}), 2),
+        'get_invites': ('get', lambda s: (s.owner, {}), 1),
+        'edit_trip': ('put', lambda s: (s.owner, {'tripid': s.tripid, 'name': 'Renamed'}), 6),
+        'create_transaction': ('post', lambda s: (s.owner, {
+            'tripid': s.tripid, 'name': 'Dinner', 'amount': '120.00', 'member_ids': s.member_ids
+        }), 12),
+        'create_transactions': ('post', lambda s: (s.owner, {'tripid': s.tripid, 'transactions': [
+            {'name': f'Item {i}', 'amount': '50.00', 'member_ids': s.member_ids} for i in range(5)
+        ]}), 11),
+        'get_transactions': ('get', lambda s: (s.owner, {'tripid': s.tripid}), 4),
+        'get_transaction_data': ('post', lambda s: (s.owner, {'tripid': s.tripid, 'transactionid': s.transaction_id}), 5),
+        'edit_transaction': ('put', lambda s: (s.owner, {
+            'tripid': s.tripid, 'transactionid': s.transaction_id, 'amount': '321.00'
+        }), 16),
+        'delete_transaction': ('delete', lambda s: (s.owner, {'tripid': s.tripid, 'transactionid': s.transaction_id}), 12),
+        'calculate_transfers': ('post', lambda s: (s.owner, {'tripid': s.tripid}), 3),
+        'get_trip_transfers': ('post', lambda s: (s.owner, {'tripid': s.tripid}), 3),
+        'get_trip_summary': ('post', lambda s: (s.owner, {'tripid': s.tripid}), 4),
+        'settle_across_trips': ('get', lambda s: (s.owner, {}), 3),
+        'add_chat_message': ('post', lambda s: (s.owner, {'tripid': s.tripid, 'msg': {'msg': 'hi'}}), 2),
+        'clear_chat': ('post', lambda s: (s.owner, {'tripid': s.tripid}), 2),
+        'get_chat_messages': ('get', lambda s: (s.owner, {'tripid': s.tripid}), 2),
+        'metrics': ('get', lambda s: ('scrape-token', {}), 0),
+    }
+
+    def seed(self, members, transactions, trips, messages):
+        """A trip of the given size, plus `trips` other trips and pending invites for its owner"""
+        from types import SimpleNamespace
+        from .authentication import generate_token_pair
+        from .benchmarking import TripShape, generate_trip
+        from .models import PasswordResetToken
+
+        trip = generate_trip(TripShape(members=members, transactions=transactions, density=0.5), seed=members)
+        owner = trip.owner
+        owner.set_password('password123')
+        owner.save()
+
+        others = [generate_trip(TripShape(members=3, transactions=transactions, density=1.0), seed=i) for i in range(trips)]
+        TripMember.objects.bulk_create([TripMember(trip=other, user=owner) for other in others])
+        invites = TripInvite.objects.bulk_create([
+            TripInvite(
+                trip=Trip.objects.create(name=f'Invited {i}', owner=other.owner),
+                invited_by=other.owner,
+                invited_email=owner.email,
+                expires_at=timezone.now() + timedelta(days=7)
+            )
+            for i, other in enumerate(others)
+        ])
+        ChatMessage.objects.bulk_create([
+            ChatMessage(trip=trip, user=owner, message=f'Message {i}') for i in range(messages)
+        ])
+
+        member_ids = [str(user_id) for user_id in trip.tripmember_set.values_list('user_id', flat=True)]
+        return SimpleNamespace(
+            owner=owner,
+            tripid=str(trip.id),
+            member_ids=member_ids,
+            member_id=next(user_id for user_id in member_ids if user_id != str(owner.id)),
+            transaction_id=str(trip.transactions.values_list('id', flat=True).first()),
+            invite_id=str(invites[0].id),
+            reset_token=PasswordResetToken.objects.create(user=owner, token=str(uuid.uuid4())).token,
+            refresh_token=generate_token_pair(owner)[1],
+        )
+
+    def measure(self, name, size):
+        """Query call sites for one request against a freshly seeded, rolled-back database"""
+        from django.db import transaction
+
+        method, build, _ = self.ENDPOINTS[name]
+        with transaction.atomic():
+            state = self.seed(**size)
+            trip_cache.clear_local()
+            local_buckets.clear()
+            user, data = build(state)
+            client = APIClient()
+            if isinstance(user, str):
+                client.credentials(HTTP_AUTHORIZATION=f'Bearer {user}')
+            elif user is not None:
+                client.force_authenticate(user=user)
+
+            call = getattr(client, method)
+            path = reverse(name)
+            with capture_call_sites() as sites:
+                if method == 'get':
+                    response = call(path, data)
+                else:
+                    response = call(path, data, format='json')
+            transaction.set_rollback(True)
+
+        self.assertLess(response.status_code, 400, f'{name}: {response.status_code} {response.content[:300]}')
+        return sites
+
+    def test_every_url_declares_a_budget(self):
+        from .urls import urlpatterns
+
+        names = {pattern.name for pattern in urlpatterns if getattr(pattern, 'name', None)}
+        self.assertEqual(names - set(self.ENDPOINTS), set())
+
+    def test_query_counts_fit_budget_and_do_not_grow(self):
+        for name, (_, _, budget) in self.ENDPOINTS.items():
+            with self.subTest(endpoint=name):
+                small, large = (self.measure(name, size) for size in self.SIZES)
+                report = format_call_sites(large)
+                self.assertLessEqual(len(large), budget, f'{name} exceeds its budget of {budget}:\n{report}')
+                self.assertEqual(
+                    len(small), len(large),
+                    f'{name} grows with data size ({len(small)} -> {len(large)} queries):\n{report}'
+                )
+
+
+class SocketIOScalingTests(SimpleTestCase):
+    """Two app.py workers sharing rooms through a Redis stand-in"""
+
+    def test_client_manager_follows_setting(self):
+        import socketio
+        from .socketio_app import build_client_manager
+
+        with override_settings(SOCKETIO_MESSAGE_QUEUE=''):
+            self.assertIsNone(build_client_manager())
+        with override_settings(SOCKETIO_MESSAGE_QUEUE='redis://localhost:6379/1', SOCKETIO_CHANNEL='chan'):
+            manager = build_client_manager(write_only=True)
+            server_manager = build_client_manager()
+        self.assertIsInstance(manager, socketio.RedisManager)
+        self.assertEqual(manager.channel, 'chan')
+        # Emit-only processes never subscribe to the queue; servers do
+        self.assertTrue(manager.write_only)
+        self.assertFalse(server_manager.write_only)
+
+    def test_broadcasts_reach_clients_on_every_worker(self):
+        from .socketio_app import build_client_manager
+
+        broker = FakeRedis()
+        threading.Thread(target=broker.serve_forever, daemon=True).start()
+        self.addCleanup(broker.server_close)
+        self.addCleanup(broker.shutdown)
+        queue = f'redis://127.0.0.1:{broker.server_address[1]}/0'
+
+        first, second = (PollingClient(start_worker(self, queue)) for _ in range(2))
+        wait_for(lambda: broker.subscriber_count('harness') == 2, 'both workers to subscribe')
+
+        # Published from a third process-level emitter, delivered by each worker to its own clients
+        with override_settings(SOCKETIO_MESSAGE_QUEUE=queue, SOCKETIO_CHANNEL='harness'):
+            emitter = build_client_manager(write_only=True)
+        emitter.emit('notice', {'n': 1})
+        self.assertEqual(first.receive('notice'), {'n': 1})
+        self.assertEqual(second.receive('notice'), {'n': 1})
+
+        # Rooms are per worker; the worker holding the room delivers
+        emitter.emit('notice', {'n': 2}, room=second.sid)
+        emitter.emit('notice', {'n': 3})
+        self.assertEqual(second.receive('notice'), {'n': 2})
+        self.assertEqual(second.receive('notice'), {'n': 3})
+        self.assertEqual(first.receive('notice'), {'n': 3})
+
+    def test_chat_reaches_room_members_on_other_workers(self):
+        import subprocess
+        import sys
+        import tempfile
+        from django.conf import settings
+
+        broker = FakeRedis()
+        threading.Thread(target=broker.serve_forever, daemon=True).start()
+        self.addCleanup(broker.server_close)
+        self.addCleanup(broker.shutdown)
+        queue = f'redis://127.0.0.1:{broker.server_address[1]}/0'
+
+        # Both workers share a scratch database holding a trip with two members;
+        # the cache points at a closed port, so membership is read from the database
+        scratch = tempfile.TemporaryDirectory()
+        self.addCleanup(scratch.cleanup)
+        env = dict(USE_SQLITE='True', SQLITE_PATH=os.path.join(scratch.name, 'db.sqlite3'), REDIS_URL='redis://127.0.0.1:1/0')
+        run = dict(cwd=settings.BASE_DIR, env=dict(os.environ, LOG_FILE='', **env), capture_output=True, text=True, check=True)
+        subprocess.run([sys.executable, 'manage.py', 'migrate', '--no-input'], **run)
+        seeded = subprocess.run([sys.executable, 'manage.py', 'shell', '-c', """
+import json
+from api.authentication import generate_token_pair
+from api.models import Trip, TripMember, User
+users = [User.objects.create_user(username=e, email=e, name=e, password='password123') for e in ('a@x.io', 'b@x.io')]
+trip = Trip.objects.create(name='Goa', owner=users[0])
+for user in users:
+    TripMember.objects.create(trip=trip, user=user)
+print(json.dumps({'trip': str(trip.id), 'tokens': [generate_token_pair(user)[0] for user in users]}))
+"""], **run)
+        fixture = json.loads(seeded.stdout.strip().splitlines()[-1])
+        room = fixture['trip']
+
+        sender, listener = (
+            PollingClient(start_worker(self, queue, **env), auth={'token': token}) for token in fixture['tokens']
+        )
+        wait_for(lambda: broker.subscriber_count('harness') == 2, 'both workers to subscribe')
+
+        for client in (listener, sender):
+            client.emit('join_room', {'roomId': room})
+            self.assertEqual(client.receive('joined_room'), {'roomId': room})
+
+        sender.emit('msg', {'roomId': room, 'message': {'msg': 'hello from A', 'isImage': False}})
+        message = listener.receive('bcast')
+        self.assertEqual(message['msg'], 'hello from A')
+        self.assertEqual(message['user']['email'], 'a@x.io')
+        self.assertEqual(sender.receive('bcast')['msg'], 'hello from A')
+
+
+def wait_for(condition, what, timeout=30):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError(f'Timed out waiting for {what}')
+        time.sleep(0.05)
+
+
+def start_worker(test, queue, **env):
+    """Run app.py on a free port with SOCKETIO_MESSAGE_QUEUE and any extra `env` set; returns the port"""
+    import socket
+    import subprocess
+    import sys
+    import tempfile
+    from django.conf import settings
+
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        port = probe.getsockname()[1]
+
+    log = tempfile.TemporaryFile()
+    test.addCleanup(log.close)
+    env = dict(os.environ, PORT=str(port), SOCKETIO_MESSAGE_QUEUE=queue, SOCKETIO_CHANNEL='harness', LOG_FILE='', **env)
+    worker = subprocess.Popen(
+        [sys.executable, 'app.py'], cwd=settings.BASE_DIR, env=env, stdout=log, stderr=subprocess.STDOUT
+    )
+    test.addCleanup(worker.wait)
+    test.addCleanup(worker.kill)
+
+    def listening():
+        if worker.poll() is not None:
+            log.seek(0)
+            raise AssertionError(f'Worker exited:\n{log.read().decode(errors="replace")[-2000:]}')
+        with socket.socket() as client:
+            return client.connect_ex(('127.0.0.1', port)) == 0
+
+    wait_for(listening, f'worker on port {port}')
+    return port
+
+
+class PollingClient:
+    """Socket.IO client over Engine.IO v4 long-polling, just enough to connect, emit and receive events"""
+
+    def __init__(self, port, auth=None):
+        import http.client
+
+        self.connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        self.events = []
+        handshake = self.request('GET')
+        self.eio_sid = json.loads(handshake[1:])['sid']
+        self.request('POST', '40' + (json.dumps(auth) if auth else ''))
+        self.sid = None
+        wait_for(lambda: self.poll() or self.sid, 'namespace connect')
+
+    def request(self, method, body=None):
+        query = 'EIO=4&transport=polling' + (f'&sid={self.eio_sid}' if getattr(self, 'eio_sid', None) else '')
+        self.connection.request(method, f'/socket.io/?{query}', body=body)
+        return self.connection.getresponse().read().decode()
+
+    def poll(self):
+        for packet in self.request('GET').split('\x1e'):
+            if packet == '2':
+                self.request('POST', '3')
+            elif packet.startswith('40'):
+                self.sid = json.loads(packet[2:])['sid']
+            elif packet.startswith('42'):
+                self.events.append(json.loads(packet[2:]))
+
+    def emit(self, name, data):
+        self.request('POST', '42' + json.dumps([name, data]))
+
+    def receive(self, name):
+        """Data of the next `name` event, waiting for it if needed"""
+        wait_for(lambda: any(event[0] == name for event in self.events) or self.poll(), f'{name} event')
+        event = next(event for event in self.events if event[0] == name)
+        self.events.remove(event)
+        return event[1]
+
+
+class FakeRedis(socketserver.ThreadingTCPServer):
+    """Redis stand-in speaking just enough RESP2/RESP3 for pub/sub: HELLO, SUBSCRIBE, UNSUBSCRIBE, PUBLISH and PING"""
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), FakeRedisConnection)
+        self.lock = threading.Lock()
+        self.channels = collections.defaultdict(set)
+
+    def subscriber_count(self, channel):
+        with self.lock:
+            return len(self.channels[channel.encode()])
+
+
+class FakeRedisConnection(socketserver.StreamRequestHandler):
+    def setup(self):
+        super().setup()
+        self.subscriptions = set()
+        self.protocol = 2
+        self.write_lock = threading.Lock()
+
+    def handle(self):
+        try:
+            while True:
+                command = self.read_command()
+                if command is None:
+                    break
+                self.dispatch(command[0].upper(), command[1:])
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            with self.server.lock:
+                for channel in self.subscriptions:
+                    self.server.channels[channel].discard(self)
+
+    def read_command(self):
+        header = self.rfile.readline()
+        if not header:
+            return None
+        args = []
+        for _ in range(int(header[1:])):
+            size = int(self.rfile.readline()[1:])
+            args.append(self.rfile.read(size + 2)[:-2])
+        return args
+
+    def send(self, reply, push=False):
+        with self.write_lock:
+            self.wfile.write(encode_resp(reply, push=push and self.protocol == 3))
+
+    def dispatch(self, name, args):
+        if name == b'HELLO':
+            self.protocol = int(args[0]) if args else self.protocol
+            info = {b'server': b'fake-redis', b'version': b'7.0.0', b'proto': self.protocol}
+            self.send(info if self.protocol == 3 else [item for pair in info.items() for item in pair])
+        elif name == b'PING':
+            self.send('PONG')
+        elif name in (b'SUBSCRIBE', b'UNSUBSCRIBE'):
+            for channel in args or list(self.subscriptions):
+                with self.server.lock:
+                    if name == b'SUBSCRIBE':
+                        self.subscriptions.add(channel)
+                        self.server.channels[channel].add(self)
+                    else:
+                        self.subscriptions.discard(channel)
+                        self.server.channels[channel].discard(self)
+                self.send([name.lower(), channel, len(self.subscriptions)], push=True)
+        elif name == b'PUBLISH':
+            channel, message = args
+            with self.server.lock:
+                subscribers = list(self.server.channels[channel])
+            for subscriber in subscribers:
+                subscriber.send([b'message', channel, message], push=True)
+            self.send(len(subscribers))
+        else:  # CLIENT SETINFO, SELECT, ...
+            self.send('OK')
+
+
+def encode_resp(reply, push=False):
+    """RESP encoding of a status (str), integer, bulk string (bytes), array, RESP3 map (dict) or push"""
+    if isinstance(reply, int):
+        return b':%d\r\n' % reply
+    if isinstance(reply, list):
+        return b'%s%d\r\n' % (b'>' if push else b'*', len(reply)) + b''.join(encode_resp(item) for item in reply)
+    if isinstance(reply, dict):
+        return b'%%%d\r\n' % len(reply) + b''.join(encode_resp(k) + encode_resp(v) for k, v in reply.items())
+    if isinstance(reply, str):
+        return f'+{reply}\r\n'.encode()
+    return b'$%d\r\n%s\r\n' % (len(reply), reply)
+
+
+@contextlib.contextmanager
+def capture_call_sites():
+    """Collect, for each query, the innermost app frame (outside the tests) that issued it"""
+    app_dir = os.path.dirname(os.path.abspath(__file__))
+    this_file = os.path.abspath(__file__)
+    sites = []
+
+    def wrapper(execute, sql, params, many, context):
+        for frame in reversed(traceback.extract_stack()):
+            filename = os.path.abspath(frame.filename)
+            if filename.startswith(app_dir) and filename != this_file:
+                sites.append(f'{os.path.relpath(filename, os.path.dirname(app_dir))}:{frame.lineno} in {frame.name}')
+                break
+        else:
+            sites.append('<outside api>')
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(wrapper):
+        yield sites
+
+
+def format_call_sites(sites):
+    """One line per call site, most frequent first"""
+    return '\n'.join(f'  {count:>4} x {site}' for site, count in Counter(sites).most_common())
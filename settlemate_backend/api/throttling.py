@@ -0,0 +1,207 @@
+import hashlib
+import logging
+import math
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+from django.conf import settings
+from rest_framework.decorators import throttle_classes
+from rest_framework.exceptions import Throttled
+from rest_framework.throttling import BaseThrottle
+from rest_framework.views import exception_handler as drf_exception_handler
+
+from .caching import LRUCache
+
+logger = logging.getLogger(__name__)
+
+PERIODS = {'s': 1, 'sec': 1, 'second': 1, 'm': 60, 'min': 60, 'minute': 60, 'h': 3600, 'hour': 3600, 'd': 86400, 'day': 86400}
+
+# KEYS[1] bucket; ARGV capacity, refill rate (tokens/s), cost.
+# Uses the server clock so workers with skewed clocks share one timeline.
+TOKEN_BUCKET_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local wait = 0
+if tokens >= cost then
+    tokens = tokens - cost
+else
+    wait = (cost - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return tostring(wait)
+"""
+
+
+def parse_rate(rate: str) -> Tuple[int, float]:
+    """
+    (capacity, refill per second) of a rate such as '5/minute'.
+
+    The bucket holds `capacity` tokens, so up to that many requests can burst,
+    and refills at capacity per period.
+    """
+    count, period = rate.split('/')
+    capacity = int(count)
+    return capacity, capacity / PERIODS[period.strip().lower()]
+
+
+class LocalBuckets:
+    """In-process token buckets, used when the cache is not Redis or Redis is unreachable"""
+
+    def __init__(self, maxsize: int = 10000):
+        self._buckets = LRUCache(maxsize=maxsize)
+        self._lock = threading.Lock()
+
+    def consume(self, key: str, capacity: int, rate: float, cost: int = 1) -> float:
+        """Take `cost` tokens; returns 0 when allowed, otherwise seconds until they are available"""
+        with self._lock:
+            now = time.monotonic()
+            tokens, updated = self._buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            wait = 0.0
+            if tokens >= cost:
+                tokens -= cost
+            else:
+                wait = (cost - tokens) / rate
+            self._buckets.set(key, (tokens, now))
+            return wait
+
+    def clear(self):
+        self._buckets.clear()
+
+
+class RedisBuckets:
+    """Token buckets updated atomically by a Lua script in the cache's Redis"""
+
+    def __init__(self):
+        self._script = None
+
+    def _get_script(self):
+        if self._script is None:
+            from django_redis import get_redis_connection
+            self._script = get_redis_connection('default').register_script(TOKEN_BUCKET_SCRIPT)
+        return self._script
+
+    def consume(self, key: str, capacity: int, rate: float, cost: int = 1) -> float:
+        result = self._get_script()(keys=[key], args=[capacity, rate, cost])
+        return float(result.decode() if isinstance(result, bytes) else result)
+
+
+local_buckets = LocalBuckets()
+redis_buckets = RedisBuckets()
+
+
+class RateLimitMetrics:
+    """Process-local counters of throttling decisions, exported by the metrics endpoint"""
+
+    def __init__(self):
+        self._counts = Counter()
+        self._lock = threading.Lock()
+
+    def record(self, scope: str, outcome: str):
+        with self._lock:
+            self._counts[(scope, outcome)] += 1
+
+    def snapshot(self) -> Dict[Tuple[str, str], int]:
+        with self._lock:
+            return dict(self._counts)
+
+    def clear(self):
+        with self._lock:
+            self._counts.clear()
+
+
+metrics = RateLimitMetrics()
+
+
+def consume(key: str, rate: str) -> float:
+    """Take one token from bucket `key`; 0 when allowed, otherwise seconds to wait"""
+    capacity, refill = parse_rate(rate)
+    if settings.CACHES['default']['BACKEND'].startswith('django_redis.'):
+        try:
+            return redis_buckets.consume(key, capacity, refill)
+        except Exception as e:
+            logger.warning(f"Rate limit store unavailable, using in-process buckets: {str(e)}")
+            metrics.record('-', 'fallback')
+    return local_buckets.consume(key, capacity, refill)
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    Token-bucket throttle with one bucket per client IP and one per account.
+
+    Limits come from RATE_LIMITS[scope], e.g. {'ip': '30/minute', 'account':
+    '5/minute'}; leave a kind out to skip that bucket. The account is the
+    `email` in the request body, or the authenticated user with
+    account='user'. Subclasses set these; see rate_limit().
+    """
+    scope = None
+    account = 'email'
+
+    def get_buckets(self, request) -> List[Tuple[str, str, str]]:
+        """(kind, identity, rate) for every bucket this request draws from"""
+        limits = settings.RATE_LIMITS.get(self.scope, {})
+        buckets = []
+        if 'ip' in limits:
+            buckets.append(('ip', self.get_ident(request), limits['ip']))
+        if 'account' in limits:
+            account = self.get_account(request)
+            if account:
+                buckets.append(('account', account, limits['account']))
+        return buckets
+
+    def get_account(self, request) -> Optional[str]:
+        if self.account == 'user':
+            return str(request.user.pk) if request.user.is_authenticated else None
+        email = request.data.get('email') if hasattr(request.data, 'get') else None
+        return str(email).strip().lower() if email else None
+
+    def allow_request(self, request, view):
+        self.wait_seconds = 0.0
+        if not settings.RATE_LIMIT_ENABLED:
+            return True
+        for kind, identity, rate in self.get_buckets(request):
+            digest = hashlib.sha256(identity.encode()).hexdigest()[:32]
+            wait = consume(f'ratelimit:{self.scope}:{kind}:{digest}', rate)
+            if wait > 0:
+                self.wait_seconds = max(self.wait_seconds, wait)
+                metrics.record(self.scope, f'throttled_{kind}')
+        if self.wait_seconds:
+            return False
+        metrics.record(self.scope, 'allowed')
+        return True
+
+    def wait(self):
+        return math.ceil(self.wait_seconds)
+
+
+def rate_limit(scope: str, account: str = 'email'):
+    """
+    Throttle a function view with the RATE_LIMITS entry for `scope` (place it below @api_view).
+
+    Args:
+        scope: Key into RATE_LIMITS
+        account: 'email' to key account buckets by the email in the body, 'user' by the caller
+    """
+    throttle = type(f'{scope.title().replace("_", "")}Throttle', (TokenBucketThrottle,), {'scope': scope, 'account': account})
+    return throttle_classes([throttle])
+
+
+def exception_handler(exc, context):
+    """DRF's handler, with throttling errors in the API's usual error shape (Retry-After is kept)"""
+    response = drf_exception_handler(exc, context)
+    if response is not None and isinstance(exc, Throttled):
+        response.data = {
+            'success': False,
+            'errors': [{'msg': f'Too many requests, try again in {exc.wait} seconds'}]
+        }
+    return response
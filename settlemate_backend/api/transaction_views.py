@@ -2,42 +2,38 @@ from rest_framework import status, generics, permissions
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
+from django.conf import settings
 from django.shortcuts import get_object_or_404
 from django.db import transaction
 from django.utils import timezone
 import logging
 
-from .models import Trip, Transaction, TransactionMember, User, TripMember
+from .models import Transaction, TransactionMember
 from .serializers import (
     TransactionSerializer, TransactionCreateSerializer, 
     TransactionMemberSerializer
 )
-from .utils import calculate_minimum_transfers
+from .utils import (
+    calculate_cross_trip_settlement, calculate_settlement, get_active_member_ids,
+    get_cached_trip_summary, parse_user_ids
+)
+from .settlement import SOLVERS
+from .ledger import apply_deltas, diff_deltas, record_transaction, record_transactions, transaction_deltas
+from .caching import bump_trip_version
+from .access import trip_access
+from .conditional import trip_etag
+from .pagination import InvalidCursor, paginate_keyset
+from .projections import TRANSACTION_FIELDS, project_transactions
 
 logger = logging.getLogger(__name__)
 
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
-def create_transaction(request):
+@trip_access()
+def create_transaction(request, trip):
     """Create a new transaction"""
     try:
-        tripid = request.data.get('tripid')
-        if not tripid:
-            return Response({
-                'success': False,
-                'errors': [{'msg': 'Trip ID is required'}]
-            }, status=status.HTTP_400_BAD_REQUEST)
-        
-        trip = get_object_or_404(Trip, id=tripid, is_active=True)
-        
-        # Check if user is a member of this trip
-        if not TripMember.objects.filter(trip=trip, user=request.user, is_active=True).exists():
-            return Response({
-                'success': False,
-                'errors': [{'msg': 'You are not a member of this trip'}]
-            }, status=status.HTTP_403_FORBIDDEN)
-        
         # Provide sensible defaults when optional fields are omitted by client
         incoming = request.data.copy()
         # Normalize and validate amount
@@ -62,15 +58,9 @@ def create_transaction(request):
                 'errors': [{'msg': 'member_ids must be an array of user IDs'}]
             }, status=status.HTTP_400_BAD_REQUEST)
         
-        # Validate membership
-        valid_member_ids = []
-        for uid in member_ids:
-            try:
-                user = User.objects.get(id=uid)
-                if TripMember.objects.filter(trip=trip, user=user, is_active=True).exists():
-                    valid_member_ids.append(str(user.id))
-            except User.DoesNotExist:
-                continue
+        # Validate membership with a single query
+        active_ids = get_active_member_ids(trip, member_ids)
+        valid_member_ids = [uid for uid in parse_user_ids(member_ids) if uid in active_ids]
         if not valid_member_ids:
             return Response({
                 'success': False,
@@ -83,6 +73,8 @@ def create_transaction(request):
             with transaction.atomic():
                 # Create transaction with required foreign keys
                 transaction_obj = serializer.save(trip=trip)
+                record_transaction(transaction_obj)
+                bump_trip_version(trip.id)
                 
                 return Response({
                     'success': True,
@@ -103,37 +95,158 @@ def create_transaction(request):
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
-@api_view(['GET'])
+@api_view(['POST'])
 @permission_classes([IsAuthenticated])
-def get_transactions(request):
-    """Get all transactions for a trip"""
+@trip_access()
+def create_transactions(request, trip):
+    """
+    Create many transactions for a trip in one request (e.g. when importing a trip).
+    
+    Every member id in the batch is checked against one membership query, all rows
+    are inserted with bulk_create in a single atomic block and the ledger is updated
+    once. The batch is all-or-nothing: any invalid entry rejects the whole request.
+    Each entry takes the same fields as createtransaction and, as there, is paid
+    by the current user.
+    """
     try:
-        tripid = request.GET.get('tripid')
-        if not tripid:
+        items = request.data.get('transactions')
+        if not isinstance(items, list) or not items or not all(isinstance(item, dict) for item in items):
             return Response({
                 'success': False,
-                'errors': [{'msg': 'Trip ID is required'}]
+                'errors': [{'msg': 'transactions must be a non-empty array of objects'}]
+            }, status=status.HTTP_400_BAD_REQUEST)
+        if len(items) > settings.BULK_TRANSACTION_LIMIT:
+            return Response({
+                'success': False,
+                'errors': [{'msg': f'At most {settings.BULK_TRANSACTION_LIMIT} transactions can be created at once'}]
             }, status=status.HTTP_400_BAD_REQUEST)
         
-        trip = get_object_or_404(Trip, id=tripid, is_active=True)
+        # One membership query covers every id in the batch
+        current_user_id = str(request.user.id)
+        requested_ids = [current_user_id]
+        for item in items:
+            if isinstance(item.get('member_ids'), list):
+                requested_ids.extend(item['member_ids'])
+        active_ids = get_active_member_ids(trip, requested_ids)
+        
+        errors = []
+        transactions = []
+        members = []
+        for index, item in enumerate(items, start=1):
+            member_ids = item.get('member_ids') or [current_user_id]
+            if not isinstance(member_ids, list):
+                errors.append({'msg': f'Transaction {index}: member_ids must be an array of user IDs'})
+                continue
+            valid_member_ids = [uid for uid in parse_user_ids(member_ids) if uid in active_ids]
+            if not valid_member_ids:
+                errors.append({'msg': f'Transaction {index}: No valid members provided for this trip'})
+                continue
+            
+            serializer = TransactionCreateSerializer(data={**item, 'member_ids': valid_member_ids})
+            if not serializer.is_valid():
+                errors.extend(
+                    {'msg': f'Transaction {index}: {error}'}
+                    for field, field_errors in serializer.errors.items() for error in field_errors
+                )
+                continue
+            
+            data = dict(serializer.validated_data)
+            data.pop('member_ids')
+            if data['amount'] < 0:
+                errors.append({'msg': f'Transaction {index}: Amount cannot be negative'})
+                continue
+            
+            transaction_obj = Transaction(trip=trip, paid_by_id=current_user_id, **data)
+            transactions.append(transaction_obj)
+            members.extend(TransactionCreateSerializer.build_members(transaction_obj, valid_member_ids))
         
-        # Check if user is a member of this trip
-        if not TripMember.objects.filter(trip=trip, user=request.user, is_active=True).exists():
+        if errors:
             return Response({
                 'success': False,
-                'errors': [{'msg': 'You are not a member of this trip'}]
-            }, status=status.HTTP_403_FORBIDDEN)
-        
-        transactions = Transaction.objects.filter(
-            trip=trip,
-            is_enabled=True
-        ).select_related('paid_by').prefetch_related('members__user').order_by('-created_at')
+                'errors': errors
+            }, status=status.HTTP_400_BAD_REQUEST)
         
-        serializer = TransactionSerializer(transactions, many=True)
+        with transaction.atomic():
+            Transaction.objects.bulk_create(transactions)
+            TransactionMember.objects.bulk_create(members)
+            record_transactions(trip.id, transactions, members)
+            bump_trip_version(trip.id)
         
         return Response({
             'success': True,
-            'data': serializer.data
+            'message': f'{len(transactions)} transactions created successfully',
+            'transactionids': [str(transaction_obj.id) for transaction_obj in transactions]
+        }, status=status.HTTP_201_CREATED)
+        
+    except Exception as e:
+        logger.error(f"Create transactions error: {str(e)}")
+        return Response({
+            'success': False,
+            'errors': [{'msg': 'An error occurred while creating the transactions'}]
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@trip_etag()
+@trip_access()
+def get_transactions(request, trip):
+    """
+    Get the enabled transactions of a trip, newest first.
+    
+    Passing `cursor` or `page_size` switches to keyset pagination on
+    (created_at, id): the response then carries `next_cursor` (null on the last
+    page) and `has_more`. Without either parameter the full list is returned.
+    `shape=flat` returns transactions that refer to users by id, plus a
+    `users` map listing each user once.
+    """
+    try:
+        shape = request.GET.get('shape', 'nested')
+        if shape not in ('nested', 'flat'):
+            return Response({
+                'success': False,
+                'errors': [{'msg': 'shape must be nested or flat'}]
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        transactions = Transaction.objects.filter(trip=trip, is_enabled=True).order_by('-created_at')
+        if shape == 'flat':
+            transactions = transactions.values(*TRANSACTION_FIELDS)
+        else:
+            transactions = transactions.select_related('paid_by').prefetch_related('members__user')
+        
+        def page_payload(rows):
+            if shape == 'flat':
+                data, users = project_transactions(rows)
+                return {'success': True, 'data': data, 'users': users}
+            return {'success': True, 'data': TransactionSerializer(rows, many=True).data}
+        
+        cursor = request.GET.get('cursor')
+        page_size = request.GET.get('page_size')
+        if cursor is None and page_size is None:
+            return Response(page_payload(transactions), status=status.HTTP_200_OK)
+        
+        try:
+            page_size = int(page_size or settings.TRANSACTIONS_PAGE_SIZE)
+        except ValueError:
+            page_size = 0
+        if not 1 <= page_size <= settings.TRANSACTIONS_MAX_PAGE_SIZE:
+            return Response({
+                'success': False,
+                'errors': [{'msg': f'page_size must be between 1 and {settings.TRANSACTIONS_MAX_PAGE_SIZE}'}]
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        try:
+            page, next_cursor = paginate_keyset(transactions, cursor, page_size)
+        except InvalidCursor as e:
+            return Response({
+                'success': False,
+                'errors': [{'msg': str(e)}]
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        return Response({
+            **page_payload(page),
+            'next_cursor': next_cursor,
+            'has_more': next_cursor is not None
         }, status=status.HTTP_200_OK)
         
     except Exception as e:
@@ -146,28 +259,20 @@ def get_transactions(request):
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
-def get_transaction_data(request):
+@trip_access()
+def get_transaction_data(request, trip):
     """Get detailed data for a specific transaction"""
     try:
-        tripid = request.data.get('tripid')
         transactionid = request.data.get('transactionid')
         
-        if not tripid or not transactionid:
+        if not transactionid:
             return Response({
                 'success': False,
-                'errors': [{'msg': 'Trip ID and Transaction ID are required'}]
+                'errors': [{'msg': 'Transaction ID is required'}]
             }, status=status.HTTP_400_BAD_REQUEST)
         
-        trip = get_object_or_404(Trip, id=tripid, is_active=True)
         transaction_obj = get_object_or_404(Transaction, id=transactionid, trip=trip)
         
-        # Check if user is a member of this trip
-        if not TripMember.objects.filter(trip=trip, user=request.user, is_active=True).exists():
-            return Response({
-                'success': False,
-                'errors': [{'msg': 'You are not a member of this trip'}]
-            }, status=status.HTTP_403_FORBIDDEN)
-        
         # Get transaction data
         transaction_data = TransactionSerializer(transaction_obj).data
         
@@ -206,7 +311,7 @@ def get_transaction_data(request):
             },
             'switchVal': transaction_obj.is_enabled,
             'myId': str(request.user.id),
-            'tripOwner': str(trip.owner.id)
+            'tripOwner': str(trip.owner_id)
         }, status=status.HTTP_200_OK)
         
     except Exception as e:
@@ -219,42 +324,48 @@ def get_transaction_data(request):
 
 @api_view(['PUT'])
 @permission_classes([IsAuthenticated])
-def edit_transaction(request):
+@trip_access()
+def edit_transaction(request, trip):
     """Edit transaction details"""
     try:
-        tripid = request.data.get('tripid')
         transactionid = request.data.get('transactionid')
         
-        if not tripid or not transactionid:
+        if not transactionid:
             return Response({
                 'success': False,
-                'errors': [{'msg': 'Trip ID and Transaction ID are required'}]
+                'errors': [{'msg': 'Transaction ID is required'}]
             }, status=status.HTTP_400_BAD_REQUEST)
         
-        trip = get_object_or_404(Trip, id=tripid, is_active=True)
-        transaction_obj = get_object_or_404(Transaction, id=transactionid, trip=trip)
-        
-        # Check if user is the transaction creator or trip owner
-        if transaction_obj.paid_by != request.user and trip.owner != request.user:
-            return Response({
-                'success': False,
-                'errors': [{'msg': 'You are not authorized to edit this transaction'}]
-            }, status=status.HTTP_403_FORBIDDEN)
-        
-        serializer = TransactionSerializer(transaction_obj, data=request.data, partial=True)
-        if serializer.is_valid():
-            serializer.save()
+        with transaction.atomic():
+            # Lock the row before validating, so the serializer's re-split and the ledger
+            # diff both start from the committed values rather than a concurrent edit's
+            transaction_obj = get_object_or_404(Transaction.objects.select_for_update(), id=transactionid, trip=trip)
             
-            return Response({
-                'success': True,
-                'message': 'Transaction updated successfully',
-                'data': serializer.data
-            }, status=status.HTTP_200_OK)
+            # Check if user is the transaction creator or trip owner
+            if transaction_obj.paid_by_id != request.user.id and trip.owner_id != request.user.id:
+                return Response({
+                    'success': False,
+                    'errors': [{'msg': 'You are not authorized to edit this transaction'}]
+                }, status=status.HTTP_403_FORBIDDEN)
+            
+            serializer = TransactionSerializer(transaction_obj, data=request.data, partial=True)
+            if not serializer.is_valid():
+                return Response({
+                    'success': False,
+                    'errors': [{'msg': str(error)} for field, errors in serializer.errors.items() for error in errors]
+                }, status=status.HTTP_400_BAD_REQUEST)
+            
+            # Keep the trip ledger in step with the edited amount/enabled state
+            before = transaction_deltas(transaction_obj)
+            serializer.save()
+            apply_deltas(trip.id, diff_deltas(before, transaction_deltas(serializer.instance)))
+            bump_trip_version(trip.id)
         
         return Response({
-            'success': False,
-            'errors': [{'msg': str(error)} for field, errors in serializer.errors.items() for error in errors]
-        }, status=status.HTTP_400_BAD_REQUEST)
+            'success': True,
+            'message': 'Transaction updated successfully',
+            'data': serializer.data
+        }, status=status.HTTP_200_OK)
         
     except Exception as e:
         logger.error(f"Edit transaction error: {str(e)}")
@@ -266,31 +377,25 @@ def edit_transaction(request):
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
-def calculate_transfers(request):
+@trip_etag()
+@trip_access()
+def calculate_transfers(request, trip):
     """Calculate minimum transfers for a trip"""
     try:
-        tripid = request.data.get('tripid')
-        if not tripid:
+        solver = request.data.get('solver')
+        if solver is not None and solver not in SOLVERS:
             return Response({
                 'success': False,
-                'errors': [{'msg': 'Trip ID is required'}]
+                'errors': [{'msg': f'Solver must be one of: {", ".join(SOLVERS)}'}]
             }, status=status.HTTP_400_BAD_REQUEST)
         
-        trip = get_object_or_404(Trip, id=tripid, is_active=True)
-        
-        # Check if user is a member of this trip
-        if not TripMember.objects.filter(trip=trip, user=request.user, is_active=True).exists():
-            return Response({
-                'success': False,
-                'errors': [{'msg': 'You are not a member of this trip'}]
-            }, status=status.HTTP_403_FORBIDDEN)
-        
         # Calculate transfers
-        transfers = calculate_minimum_transfers(trip)
+        settlement = calculate_settlement(trip, solver=solver)
         
         return Response({
             'success': True,
-            'data': transfers
+            'data': settlement['transfers'],
+            'solver': settlement['solver']
         }, status=status.HTTP_200_OK)
         
     except Exception as e:
@@ -301,33 +406,79 @@ def calculate_transfers(request):
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+@trip_access()
+def get_trip_summary_view(request, trip):
+    """Get per-member paid/owed totals, balances and transfers for a trip"""
+    try:
+        return Response({
+            'success': True,
+            'data': get_cached_trip_summary(trip)
+        }, status=status.HTTP_200_OK)
+        
+    except Exception as e:
+        logger.error(f"Get trip summary error: {str(e)}")
+        return Response({
+            'success': False,
+            'errors': [{'msg': 'An error occurred while building the trip summary'}]
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def settle_across_trips(request):
+    """Net the current user's debts across all active trips they share with others"""
+    try:
+        settlement = calculate_cross_trip_settlement(request.user)
+        
+        return Response({
+            'success': True,
+            'data': settlement['transfers'],
+            'balance': settlement['balance'],
+            'breakdown': settlement['breakdown'],
+            'transfers_saved': settlement['transfers_saved']
+        }, status=status.HTTP_200_OK)
+        
+    except Exception as e:
+        logger.error(f"Settle across trips error: {str(e)}")
+        return Response({
+            'success': False,
+            'errors': [{'msg': 'An error occurred while calculating transfers'}]
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
 @api_view(['DELETE'])
 @permission_classes([IsAuthenticated])
-def delete_transaction(request):
+@trip_access()
+def delete_transaction(request, trip):
     """Delete a transaction"""
     try:
-        tripid = request.data.get('tripid')
         transactionid = request.data.get('transactionid')
         
-        if not tripid or not transactionid:
+        if not transactionid:
             return Response({
                 'success': False,
-                'errors': [{'msg': 'Trip ID and Transaction ID are required'}]
+                'errors': [{'msg': 'Transaction ID is required'}]
             }, status=status.HTTP_400_BAD_REQUEST)
         
-        trip = get_object_or_404(Trip, id=tripid, is_active=True)
         transaction_obj = get_object_or_404(Transaction, id=transactionid, trip=trip)
         
         # Check if user is the transaction creator or trip owner
-        if transaction_obj.paid_by != request.user and trip.owner != request.user:
+        if transaction_obj.paid_by_id != request.user.id and trip.owner_id != request.user.id:
             return Response({
                 'success': False,
                 'errors': [{'msg': 'You are not authorized to delete this transaction'}]
             }, status=status.HTTP_403_FORBIDDEN)
         
-        # Soft delete by disabling
-        transaction_obj.is_enabled = False
-        transaction_obj.save()
+        # Soft delete by disabling and reverse its effect on the trip ledger
+        with transaction.atomic():
+            transaction_obj = Transaction.objects.select_for_update().get(pk=transaction_obj.pk)
+            before = transaction_deltas(transaction_obj)
+            transaction_obj.is_enabled = False
+            transaction_obj.save()
+            apply_deltas(trip.id, before, sign=-1)
+            bump_trip_version(trip.id)
         
         return Response({
             'success': True,
@@ -5,6 +5,7 @@ from rest_framework.permissions import IsAuthenticated
 from django.shortcuts import get_object_or_404
 from django.db import transaction
 from django.core.mail import send_mail
+from django.core.signing import BadSignature
 from django.conf import settings
 from django.utils import timezone
 import logging
@@ -14,7 +15,12 @@ from .serializers import (
     TripSerializer, TripCreateSerializer, TripMemberSerializer,
     TripInviteSerializer, TripInviteCreateSerializer, ChatMessageSerializer
 )
-from .authentication import generate_jwt_token
+from .caching import bump_trip_version
+from .access import trip_access
+from .conditional import trip_etag
+from .throttling import rate_limit
+from .sync import SyncTokenExpired, get_trip_changes, read_sync_token
+from .utils import annotate_member_counts
 from uuid import UUID
 
 logger = logging.getLogger(__name__)
@@ -57,10 +63,10 @@ def get_trips_data(request):
     """Get all trips for the current user"""
     try:
         # Get trips where user is a member
-        trips = Trip.objects.filter(
+        trips = annotate_member_counts(Trip.objects.filter(
             members=request.user,
             is_active=True
-        ).select_related('owner').prefetch_related('members')
+        ).select_related('owner'))
         
         serializer = TripSerializer(trips, many=True)
         
@@ -86,22 +92,10 @@ def get_trips_data(request):
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
-def get_trip_members(request):
+@trip_etag()
+@trip_access()
+def get_trip_members(request, trip):
     try:
-        tripid = request.data.get('tripid')
-        if not tripid:
-            return Response({'success': False, 'errors': [{'msg': 'Trip ID is required'}]}, status=status.HTTP_400_BAD_REQUEST)
-        try:
-            UUID(str(tripid))
-        except Exception:
-            return Response({'success': False, 'errors': [{'msg': 'Invalid trip ID'}]}, status=status.HTTP_400_BAD_REQUEST)
-
-        trip = get_object_or_404(Trip, id=tripid, is_active=True)
-
-        # Must be a member
-        if not TripMember.objects.filter(trip=trip, user=request.user, is_active=True).exists():
-            return Response({'success': False, 'errors': [{'msg': 'You are not a member of this trip'}]}, status=status.HTTP_403_FORBIDDEN)
-
         members = TripMember.objects.filter(trip=trip, is_active=True).select_related('user')
         members_list = [{'_id': str(m.user.id), 'name': m.user.name, 'email': m.user.email} for m in members]
 
@@ -111,25 +105,56 @@ def get_trip_members(request):
         return Response({'success': False, 'errors': [{'msg': 'An error occurred while fetching members'}]}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@trip_access()
+def sync_trip(request, trip):
+    """
+    Delta sync for a trip's transactions and members.
+
+    Without `token` the full state is returned; with a token from a previous
+    response only what changed since then, plus ids removed in the meantime.
+    Always hands back a new token for the next poll. `shape=flat` works as for
+    getTransactions.
+    """
+    try:
+        since = None
+        token = request.GET.get('token')
+        if token:
+            try:
+                since = read_sync_token(token, trip)
+            except SyncTokenExpired as e:
+                return Response({'success': False, 'errors': [{'msg': str(e)}]}, status=status.HTTP_410_GONE)
+            except BadSignature:
+                return Response({'success': False, 'errors': [{'msg': 'Invalid sync token'}]}, status=status.HTTP_400_BAD_REQUEST)
+
+        shape = request.GET.get('shape', 'nested')
+        if shape not in ('nested', 'flat'):
+            return Response({'success': False, 'errors': [{'msg': 'shape must be nested or flat'}]}, status=status.HTTP_400_BAD_REQUEST)
+
+        changes = get_trip_changes(trip, since, flat=shape == 'flat')
+        token = changes.pop('token')
+        return Response({'success': True, 'full': since is None, 'data': changes, 'token': token}, status=status.HTTP_200_OK)
+    except Exception as e:
+        logger.error(f"Sync trip error: {str(e)}")
+        return Response({'success': False, 'errors': [{'msg': 'An error occurred while syncing trip'}]}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
-def kick_member(request):
+@trip_access(owner_only=True, denied='Only trip owner can kick members')
+def kick_member(request, trip):
     try:
-        tripid = request.data.get('tripid')
         userid = request.data.get('userid')
-        if not tripid or not userid:
-            return Response({'success': False, 'errors': [{'msg': 'Trip ID and User ID are required'}]}, status=status.HTTP_400_BAD_REQUEST)
+        if not userid:
+            return Response({'success': False, 'errors': [{'msg': 'User ID is required'}]}, status=status.HTTP_400_BAD_REQUEST)
         try:
-            UUID(str(tripid)); UUID(str(userid))
+            UUID(str(userid))
         except Exception:
             return Response({'success': False, 'errors': [{'msg': 'Invalid IDs'}]}, status=status.HTTP_400_BAD_REQUEST)
 
-        trip = get_object_or_404(Trip, id=tripid, is_active=True)
-        if trip.owner != request.user:
-            return Response({'success': False, 'errors': [{'msg': 'Only trip owner can kick members'}]}, status=status.HTTP_403_FORBIDDEN)
-
         member = get_object_or_404(TripMember, trip=trip, user_id=userid, is_active=True)
-        if str(trip.owner.id) == str(userid):
+        if str(trip.owner_id) == str(userid):
             return Response({'success': False, 'errors': [{'msg': 'Owner cannot be removed'}]}, status=status.HTTP_400_BAD_REQUEST)
 
         member.is_active = False
@@ -142,24 +167,22 @@ def kick_member(request):
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
-def admin_member(request):
+@trip_access(owner_only=True, denied='Only current owner can transfer ownership')
+def admin_member(request, trip):
     try:
-        tripid = request.data.get('tripid')
         userid = request.data.get('userid')
-        if not tripid or not userid:
-            return Response({'success': False, 'errors': [{'msg': 'Trip ID and User ID are required'}]}, status=status.HTTP_400_BAD_REQUEST)
+        if not userid:
+            return Response({'success': False, 'errors': [{'msg': 'User ID is required'}]}, status=status.HTTP_400_BAD_REQUEST)
         try:
-            UUID(str(tripid)); UUID(str(userid))
+            UUID(str(userid))
         except Exception:
             return Response({'success': False, 'errors': [{'msg': 'Invalid IDs'}]}, status=status.HTTP_400_BAD_REQUEST)
 
-        trip = get_object_or_404(Trip, id=tripid, is_active=True)
-        if trip.owner != request.user:
-            return Response({'success': False, 'errors': [{'msg': 'Only current owner can transfer ownership'}]}, status=status.HTTP_403_FORBIDDEN)
-
         new_owner = get_object_or_404(TripMember, trip=trip, user_id=userid, is_active=True).user
-        trip.owner = new_owner
-        trip.save()
+        with transaction.atomic():
+            trip.owner = new_owner
+            trip.save()
+            bump_trip_version(trip.id)
         return Response({'success': True, 'message': 'Ownership transferred'}, status=status.HTTP_200_OK)
     except Exception as e:
         logger.error(f"Admin member error: {str(e)}")
@@ -168,29 +191,11 @@ def admin_member(request):
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
-def get_trip_data(request):
+@trip_etag(include_chat=True)
+@trip_access()
+def get_trip_data(request, trip):
     """Get detailed data for a specific trip"""
     try:
-        tripid = request.data.get('tripid')
-        if not tripid:
-            return Response({
-                'success': False,
-                'errors': [{'msg': 'Trip ID is required'}]
-            }, status=status.HTTP_400_BAD_REQUEST)
-        try:
-            UUID(str(tripid))
-        except Exception:
-            return Response({'success': False, 'errors': [{'msg': 'Invalid trip ID'}]}, status=status.HTTP_400_BAD_REQUEST)
-        
-        trip = get_object_or_404(Trip, id=tripid, is_active=True)
-        
-        # Check if user is a member of this trip
-        if not TripMember.objects.filter(trip=trip, user=request.user, is_active=True).exists():
-            return Response({
-                'success': False,
-                'errors': [{'msg': 'You are not a member of this trip'}]
-            }, status=status.HTTP_403_FORBIDDEN)
-        
         # Get trip data
         trip_data = TripSerializer(trip).data
         
@@ -233,27 +238,19 @@ def get_trip_data(request):
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
-def invite_member(request):
+@rate_limit('invite', account='user')
+@trip_access(owner_only=True, denied='Only trip owner can invite members')
+def invite_member(request, trip):
     """Invite a member to a trip"""
     try:
-        tripid = request.data.get('tripid')
         email = request.data.get('email')
         
-        if not tripid or not email:
+        if not email:
             return Response({
                 'success': False,
-                'errors': [{'msg': 'Trip ID and email are required'}]
+                'errors': [{'msg': 'Email is required'}]
             }, status=status.HTTP_400_BAD_REQUEST)
         
-        trip = get_object_or_404(Trip, id=tripid, is_active=True)
-        
-        # Check if user is the owner
-        if trip.owner != request.user:
-            return Response({
-                'success': False,
-                'errors': [{'msg': 'Only trip owner can invite members'}]
-            }, status=status.HTTP_403_FORBIDDEN)
-        
         # Check if user is already a member
         if TripMember.objects.filter(trip=trip, user__email=email, is_active=True).exists():
             return Response({
@@ -339,9 +336,16 @@ def accept_invite(request):
                 'errors': [{'msg': 'Invite has expired or is no longer valid'}]
             }, status=status.HTTP_400_BAD_REQUEST)
         
-        # Add user to trip
+        # Add user to trip, reactivating the membership of a previously removed member
         with transaction.atomic():
-            TripMember.objects.create(trip=invite.trip, user=request.user)
+            member = TripMember.objects.filter(trip=invite.trip, user=request.user).first()
+            if member is None:
+                TripMember.objects.create(trip=invite.trip, user=request.user)
+            else:
+                # A fresh joined_at lets delta sync report the member again
+                member.is_active = True
+                member.joined_at = timezone.now()
+                member.save()
             invite.status = 'accepted'
             invite.invited_user = request.user
             invite.save()
@@ -413,7 +417,7 @@ def get_invites(request):
         invites = TripInvite.objects.filter(
             invited_email=request.user.email,
             status='pending'
-        ).select_related('trip', 'invited_by')
+        ).select_related('trip__owner')
         
         # Shape invites for frontend: include trip info and stable ids
         data = [
@@ -447,28 +451,15 @@ def get_invites(request):
 
 @api_view(['PUT'])
 @permission_classes([IsAuthenticated])
-def edit_trip(request):
+@trip_access(owner_only=True, denied='Only trip owner can edit trip details')
+def edit_trip(request, trip):
     """Edit trip details"""
     try:
-        tripid = request.data.get('tripid')
-        if not tripid:
-            return Response({
-                'success': False,
-                'errors': [{'msg': 'Trip ID is required'}]
-            }, status=status.HTTP_400_BAD_REQUEST)
-        
-        trip = get_object_or_404(Trip, id=tripid, is_active=True)
-        
-        # Check if user is the owner
-        if trip.owner != request.user:
-            return Response({
-                'success': False,
-                'errors': [{'msg': 'Only trip owner can edit trip details'}]
-            }, status=status.HTTP_403_FORBIDDEN)
-        
         serializer = TripSerializer(trip, data=request.data, partial=True)
         if serializer.is_valid():
-            serializer.save()
+            with transaction.atomic():
+                serializer.save()
+                bump_trip_version(trip.id)
             
             return Response({
                 'success': True,
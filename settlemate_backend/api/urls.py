@@ -1,13 +1,14 @@
 from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
-from . import auth_views, trip_views, transaction_views, chat_views
+from . import auth_views, trip_views, transaction_views, chat_views, metrics_views
 
 urlpatterns = [
     # Authentication endpoints
     path('signup', auth_views.signup, name='signup'),
     path('login', auth_views.login, name='login'),
     path('logout', auth_views.logout, name='logout'),
+    path('refreshToken', auth_views.refresh_token, name='refresh_token'),
     path('forgotPassword', auth_views.forgot_password, name='forgot_password'),
     path('changePassword', auth_views.change_password, name='change_password'),
     path('getUserData', auth_views.get_user_data, name='get_user_data'),
@@ -18,6 +19,7 @@ urlpatterns = [
     path('getTripsData', trip_views.get_trips_data, name='get_trips_data'),
     path('getTripData', trip_views.get_trip_data, name='get_trip_data'),
     path('getTripMembers', trip_views.get_trip_members, name='get_trip_members'),
+    path('syncTrip', trip_views.sync_trip, name='sync_trip'),
     path('kickMember', trip_views.kick_member, name='kick_member'),
     path('adminMember', trip_views.admin_member, name='admin_member'),
     path('invite', trip_views.invite_member, name='invite_member'),
@@ -28,12 +30,15 @@ urlpatterns = [
     
     # Transaction management endpoints
     path('createtransaction', transaction_views.create_transaction, name='create_transaction'),
+    path('createTransactions', transaction_views.create_transactions, name='create_transactions'),
     path('getTransactions', transaction_views.get_transactions, name='get_transactions'),
     path('getTransactionData', transaction_views.get_transaction_data, name='get_transaction_data'),
     path('edittransaction', transaction_views.edit_transaction, name='edit_transaction'),
     path('deleteTransaction', transaction_views.delete_transaction, name='delete_transaction'),
     path('calculateTransfers', transaction_views.calculate_transfers, name='calculate_transfers'),
     path('getTripTransfers', transaction_views.calculate_transfers, name='get_trip_transfers'),
+    path('getTripSummary', transaction_views.get_trip_summary_view, name='get_trip_summary'),
+    path('settleAcrossTrips', transaction_views.settle_across_trips, name='settle_across_trips'),
     
     # Chat endpoints
     path('addChat', chat_views.add_chat_message, name='add_chat_message'),
@@ -41,6 +46,9 @@ urlpatterns = [
     path('getChatMessages', chat_views.get_chat_messages, name='get_chat_messages'),
     
     # Removed file upload endpoints
+
+    # Monitoring
+    path('metrics', metrics_views.metrics, name='metrics'),
 ]
 
 # Serve media files in development
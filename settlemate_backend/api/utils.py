@@ -1,164 +1,149 @@
-from decimal import Decimal
 from collections import defaultdict
-from typing import List, Dict, Tuple
-from .models import Trip, Transaction, TransactionMember, User
 from decimal import Decimal
+import uuid
+from typing import Any, Iterable, List, Dict, Optional, Set
+from django.conf import settings
+from django.db.models import (
+    BooleanField, Case, Count, Exists, FilteredRelation, OuterRef, Q, QuerySet, Subquery, Sum, Value, When
+)
+from django.db.models.functions import Coalesce
+from .caching import get_trip_membership, trip_cache, trip_cache_key
+from .models import Trip, Transaction, TransactionMember, TripBalance, TripMember, User
+from .ledger import get_trip_balances
+from .settlement import Plan, SettlementResult, from_paise, settle, to_paise
 
-def calculate_minimum_transfers(trip: Trip):
-    # Build net balance per user
-    balances = {}
-    members = trip.members.filter(tripmember__is_active=True)
-    for user in members:
-        balances[str(user.id)] = Decimal('0')
-
-    transactions = Transaction.objects.filter(trip=trip, is_enabled=True).prefetch_related('members__user')
-    for t in transactions:
-        paid_by_id = str(t.paid_by.id)
-        balances[paid_by_id] = balances.get(paid_by_id, Decimal('0')) + Decimal(t.amount)
-        included = list(TransactionMember.objects.filter(transaction=t, is_included=True))
-        if included:
-            share = Decimal(t.amount) / Decimal(len(included))
-            for tm in included:
-                uid = str(tm.user.id)
-                balances[uid] = balances.get(uid, Decimal('0')) - share
-
-    # Separate creditors and debtors
-    debtors = []  # (user_id, amount_positive)
-    creditors = []
-    for uid, bal in balances.items():
-        if bal < 0:
-            debtors.append([uid, -bal])
-        elif bal > 0:
-            creditors.append([uid, bal])
-
-    # Greedy settlement
-    result = []
-    i = j = 0
-    while i < len(debtors) and j < len(creditors):
-        d_uid, d_amt = debtors[i]
-        c_uid, c_amt = creditors[j]
-        pay = min(d_amt, c_amt)
-        result.append({
-            'from': d_uid,
-            'to': c_uid,
-            'amount': float(round(pay, 2)),
-        })
-        debtors[i][1] -= pay
-        creditors[j][1] -= pay
-        if debtors[i][1] == 0:
-            i += 1
-        if creditors[j][1] == 0:
-            j += 1
-
-    # Map IDs to user info
-    users = {str(u.id): u for u in members}
+def format_transfers(plan: Plan, users: Dict[Any, User]) -> List[Dict]:
+    """
+    Shape a settlement plan for API responses.
+    
+    Args:
+        plan: List of (from_user_id, to_user_id, amount_paise) tuples
+        users: Mapping of user id to User, covering every id in the plan
+        
+    Returns:
+        List of transfer dictionaries with 'from_user', 'to_user', and 'amount'
+    """
     transfers = []
-    for item in result:
-        from_u = users[item['from']]
-        to_u = users[item['to']]
+    for from_id, to_id, amount_paise in plan:
+        from_user = users.get(from_id)
+        to_user = users.get(to_id)
+        if from_user is None or to_user is None:
+            continue
         transfers.append({
-            'amt': float(item['amount']),
-            'from': {
-                'name': from_u.name,
-                'email': from_u.email,
+            'from_user': {
+                'id': str(from_user.id),
+                'name': from_user.name,
+                'email': from_user.email
             },
-            'to': {
-                'name': to_u.name,
-                'email': to_u.email,
-                'upi': to_u.upi or '',
-            }
+            'to_user': {
+                'id': str(to_user.id),
+                'name': to_user.name,
+                'email': to_user.email,
+                'upi': to_user.upi or ''
+            },
+            'amount': amount_paise / 100
         })
-
     return transfers
 
 
-def calculate_minimum_transfers(trip: Trip) -> List[Dict]:
+def calculate_settlement(trip: Trip, solver: Optional[str] = None, time_budget_ms: Optional[float] = None) -> Dict:
     """
-    Calculate minimum number of transfers needed to settle all debts in a trip.
-    Uses a greedy algorithm to minimize the number of transactions.
+    Settle a trip's balances with the requested solver. Results are cached per
+    (trip, ledger version, solver), so repeated reads of an unchanged trip do
+    not touch the database.
     
     Args:
         trip: Trip object
+        solver: Settlement solver name (see settlement.SOLVERS); defaults to settings
+        time_budget_ms: Time budget for the optimal solver; defaults to settings
         
     Returns:
-        List of transfer dictionaries with 'from_user', 'to_user', and 'amount'
+        Dictionary with 'transfers', plus 'solver' describing which solver ran and how long it took
     """
-    # Calculate net balance for each user
-    net_balances = defaultdict(Decimal)
-    
-    # Get all enabled transactions for this trip
-    transactions = Transaction.objects.filter(
-        trip=trip,
-        is_enabled=True
-    ).prefetch_related('members__user')
+    if time_budget_ms is None:
+        # Plans only change when the trip's ledger version does
+        solver = solver or settings.SETTLEMENT_SOLVER
+        return trip_cache.get_or_set(
+            trip_cache_key('settlement', trip, solver),
+            lambda: _calculate_settlement(trip, solver)
+        )
+    return _calculate_settlement(trip, solver, time_budget_ms)
+
+
+def calculate_settlements(trips: Iterable[Trip]) -> Dict[Any, Dict]:
+    """
+    calculate_settlement with the configured solver for many trips at once,
+    sharing its cache entries. Trips without a cached plan are settled
+    together, with one query for their ledgers and one for the users in their
+    plans, so the query count does not depend on the number of trips.
     
-    for transaction in transactions:
-        # Add amount to the person who paid
-        net_balances[transaction.paid_by.id] += transaction.amount
+    Args:
+        trips: Trip objects (only id and ledger_version are read)
         
-        # Subtract from each person who owes
-        for member in transaction.members.filter(is_included=True):
-            net_balances[member.user.id] -= member.amount_owed
-    
-    # Separate creditors (positive balance) and debtors (negative balance)
-    creditors = []
-    debtors = []
+    Returns:
+        Mapping of trip ID to calculate_settlement's result
+    """
+    solver = settings.SETTLEMENT_SOLVER
+    keys = {trip: trip_cache_key('settlement', trip, solver) for trip in trips}
+    cached = trip_cache.get_many(keys.values())
+    settlements = {}
+    stale = []
+    for trip, key in keys.items():
+        if key in cached:
+            settlements[trip.id] = cached[key]
+        else:
+            stale.append(trip)
+    if not stale:
+        return settlements
     
-    for user_id, balance in net_balances.items():
-        if balance > 0:
-            creditors.append((user_id, balance))
-        elif balance < 0:
-            debtors.append((user_id, -balance))  # Store as positive for easier calculation
+    balances = defaultdict(dict)
+    rows = TripBalance.objects.filter(trip__in=stale).exclude(net_paise=0).values_list('trip_id', 'user_id', 'net_paise')
+    for trip_id, user_id, net_paise in rows:
+        balances[trip_id][user_id] = net_paise
+    results = {trip.id: settle(balances[trip.id], solver=solver) for trip in stale}
     
-    # Sort by amount (largest first)
-    creditors.sort(key=lambda x: x[1], reverse=True)
-    debtors.sort(key=lambda x: x[1], reverse=True)
+    users = User.objects.in_bulk({
+        user_id for result in results.values() for from_id, to_id, _ in result.plan for user_id in (from_id, to_id)
+    })
+    for trip in stale:
+        settlements[trip.id] = _settlement_response(results[trip.id], users)
+        trip_cache.set(keys[trip], settlements[trip.id])
+    return settlements
+
+
+def _calculate_settlement(trip: Trip, solver: Optional[str], time_budget_ms: Optional[float] = None) -> Dict:
+    # Net balance (in paise) for each user, maintained incrementally by the ledger
+    result = settle(get_trip_balances(trip), solver=solver, time_budget_ms=time_budget_ms)
     
-    # Calculate minimum transfers
-    transfers = []
-    creditor_index = 0
-    debtor_index = 0
+    # Resolve everyone involved with a single lookup
+    users = User.objects.in_bulk({user_id for from_id, to_id, _ in result.plan for user_id in (from_id, to_id)})
+    return _settlement_response(result, users)
+
+
+def _settlement_response(result: SettlementResult, users: Dict[Any, User]) -> Dict:
+    return {
+        'transfers': format_transfers(result.plan, users),
+        'solver': {
+            'name': result.solver,
+            'requested': result.requested,
+            'elapsed_ms': result.elapsed_ms
+        }
+    }
+
+
+def calculate_minimum_transfers(trip: Trip) -> List[Dict]:
+    """
+    Calculate minimum number of transfers needed to settle all debts in a trip.
+    Balances are read from the TripBalance ledger in integer paise and settled
+    with the configured solver.
     
-    while creditor_index < len(creditors) and debtor_index < len(debtors):
-        creditor_id, creditor_amount = creditors[creditor_index]
-        debtor_id, debtor_amount = debtors[debtor_index]
-        
-        # Transfer amount is the minimum of what creditor can give and debtor needs
-        transfer_amount = min(creditor_amount, debtor_amount)
-        
-        if transfer_amount > 0:
-            # Get user objects for the transfer
-            try:
-                from_user = User.objects.get(id=debtor_id)
-                to_user = User.objects.get(id=creditor_id)
-                
-                transfers.append({
-                    'from_user': {
-                        'id': str(from_user.id),
-                        'name': from_user.name,
-                        'email': from_user.email
-                    },
-                    'to_user': {
-                        'id': str(to_user.id),
-                        'name': to_user.name,
-                        'email': to_user.email
-                    },
-                    'amount': float(transfer_amount)
-                })
-            except User.DoesNotExist:
-                pass
-        
-        # Update amounts
-        creditors[creditor_index] = (creditor_id, creditor_amount - transfer_amount)
-        debtors[debtor_index] = (debtor_id, debtor_amount - transfer_amount)
+    Args:
+        trip: Trip object
         
-        # Move to next creditor/debtor if current one is settled
-        if creditors[creditor_index][1] == 0:
-            creditor_index += 1
-        if debtors[debtor_index][1] == 0:
-            debtor_index += 1
-    
-    return transfers
+    Returns:
+        List of transfer dictionaries with 'from_user', 'to_user', and 'amount'
+    """
+    return calculate_settlement(trip)['transfers']
 
 
 def calculate_user_balance_in_trip(user: User, trip: Trip) -> Decimal:
@@ -173,73 +158,145 @@ def calculate_user_balance_in_trip(user: User, trip: Trip) -> Decimal:
     Returns:
         Decimal representing the net balance
     """
-    balance = Decimal('0')
-    
-    # Get all enabled transactions for this trip
-    transactions = Transaction.objects.filter(
+    net_paise = TripBalance.objects.filter(
         trip=trip,
-        is_enabled=True
-    ).prefetch_related('members')
+        user=user
+    ).values_list('net_paise', flat=True).first() or 0
     
-    for transaction in transactions:
-        # Add amount if user paid
-        if transaction.paid_by == user:
-            balance += transaction.amount
-        
-        # Subtract amount if user owes
+    return from_paise(net_paise)
+
+
+def annotate_member_counts(trips: QuerySet) -> QuerySet:
+    """Annotate each trip with `active_member_count` (read by TripSerializer) in the same query"""
+    active = TripMember.objects.filter(
+        trip=OuterRef('pk'),
+        is_active=True
+    ).order_by().values('trip').annotate(count=Count('pk')).values('count')
+    return trips.annotate(active_member_count=Coalesce(Subquery(active), 0))
+
+
+def parse_user_ids(values: Iterable) -> List[str]:
+    """
+    Canonical string form of every valid UUID in `values`, in order and without duplicates.
+    Anything that is not a UUID is dropped.
+    """
+    user_ids = []
+    for value in values:
         try:
-            member = transaction.members.get(user=user, is_included=True)
-            balance -= member.amount_owed
-        except TransactionMember.DoesNotExist:
-            pass
+            user_id = str(uuid.UUID(str(value)))
+        except (TypeError, ValueError, AttributeError):
+            continue
+        if user_id not in user_ids:
+            user_ids.append(user_id)
+    return user_ids
+
+
+def get_active_member_ids(trip: Trip, user_ids: Iterable) -> Set[str]:
+    """
+    Which of `user_ids` are active members of the trip, from the membership cache.
     
-    return balance
+    Args:
+        trip: Trip object
+        user_ids: Candidate user IDs (invalid ones are ignored)
+        
+    Returns:
+        Set of canonical user ID strings
+    """
+    user_ids = parse_user_ids(user_ids)
+    membership = get_trip_membership(trip.id) if user_ids else None
+    if membership is None:
+        return set()
+    return {user_id for user_id in user_ids if user_id in membership.member_ids}
+
+
+def get_cached_trip_summary(trip: Trip) -> Dict:
+    """get_trip_summary, cached per (trip, ledger version)"""
+    return trip_cache.get_or_set(trip_cache_key('summary', trip), lambda: get_trip_summary(trip))
+
+
+def trip_stakeholders(trip_id, stake_ids: Iterable) -> QuerySet:
+    """
+    Active members of a trip plus `stake_ids`, each with an `is_member` flag.
+
+    Both halves are IN lists on the user primary key, so the planner looks
+    users up by index instead of scanning the table, and is_member comes from
+    a LEFT JOIN on the (trip, user) unique index.
+
+    Args:
+        trip_id: Trip (or its ID)
+        stake_ids: IDs of users with paid or owed amounts in the trip
+    """
+    members = TripMember.objects.filter(trip=trip_id, is_active=True)
+    return User.objects.annotate(
+        membership=FilteredRelation('tripmember', condition=Q(tripmember__trip=trip_id, tripmember__is_active=True))
+    ).filter(
+        Q(id__in=members.values('user_id')) | Q(id__in=stake_ids)
+    ).annotate(
+        is_member=Case(When(membership__id__isnull=False, then=Value(True)), default=Value(False), output_field=BooleanField())
+    )
 
 
 def get_trip_summary(trip: Trip) -> Dict:
     """
     Get a summary of all balances and transactions for a trip.
     
+    Paid and owed totals come from two GROUP BY aggregates and every user is
+    resolved in one more query, so the query count does not depend on the
+    number of members or transactions.
+    
     Args:
-        trip: Trip object
+        trip: Trip object (ideally fetched with select_related('owner'))
         
     Returns:
         Dictionary with trip summary data
     """
-    members = trip.members.filter(is_active=True)
+    # Totals paid per payer
+    paid = {
+        row['paid_by_id']: row
+        for row in Transaction.objects.filter(
+            trip=trip,
+            is_enabled=True
+        ).values('paid_by_id').annotate(total=Sum('amount'), count=Count('id')).order_by()
+    }
+    
+    # Totals owed per participant
+    owed = {
+        row['user_id']: row
+        for row in TransactionMember.objects.filter(
+            transaction__trip=trip,
+            transaction__is_enabled=True,
+            is_included=True
+        ).values('user_id').annotate(total=Sum('amount_owed'), count=Count('id')).order_by()
+    }
+    
+    users = list(trip_stakeholders(trip, set(paid) | set(owed)))
+    
     member_balances = {}
-    total_spent = Decimal('0')
-    total_transactions = 0
+    net_balances = {}
+    total_spent = 0
     
-    for member in members:
-        balance = calculate_user_balance_in_trip(member.user, trip)
-        member_balances[str(member.user.id)] = {
+    for user in users:
+        paid_paise = to_paise(paid[user.id]['total']) if user.id in paid else 0
+        owed_paise = to_paise(owed[user.id]['total']) if user.id in owed else 0
+        net_balances[user.id] = paid_paise - owed_paise
+        total_spent += paid_paise
+        
+        member_balances[str(user.id)] = {
             'user': {
-                'id': str(member.user.id),
-                'name': member.user.name,
-                'email': member.user.email
+                'id': str(user.id),
+                'name': user.name,
+                'email': user.email
             },
-            'balance': float(balance)
+            'is_member': user.is_member,
+            'balance': net_balances[user.id] / 100,
+            'total_spent': paid_paise / 100,
+            'total_owed': owed_paise / 100,
+            'transactions_paid': paid[user.id]['count'] if user.id in paid else 0,
+            'transactions_shared': owed[user.id]['count'] if user.id in owed else 0
         }
-        
-        # Calculate total spent by this user
-        user_transactions = Transaction.objects.filter(
-            trip=trip,
-            paid_by=member.user,
-            is_enabled=True
-        )
-        user_total = sum(t.amount for t in user_transactions)
-        member_balances[str(member.user.id)]['total_spent'] = float(user_total)
-        total_spent += user_total
     
-    # Count total transactions
-    total_transactions = Transaction.objects.filter(
-        trip=trip,
-        is_enabled=True
-    ).count()
-    
-    # Calculate minimum transfers
-    transfers = calculate_minimum_transfers(trip)
+    # Calculate minimum transfers from the balances we already have
+    transfers = format_transfers(settle(net_balances).plan, {user.id: user for user in users})
     
     return {
         'trip': {
@@ -253,7 +310,78 @@ def get_trip_summary(trip: Trip) -> Dict:
             }
         },
         'members': member_balances,
-        'total_spent': float(total_spent),
-        'total_transactions': total_transactions,
+        'total_spent': total_spent / 100,
+        'total_transactions': sum(row['count'] for row in paid.values()),
         'minimum_transfers': transfers
     }
+
+
+def calculate_cross_trip_settlement(user: User) -> Dict:
+    """
+    Net a user's debts across every active trip they share with others.
+    
+    Each trip is settled on its own by calculate_settlements, i.e. from the
+    same cached plans its trip page shows. The user's transfers with each
+    counterparty are then netted into one, so friends who share several trips
+    pay each other at most once and both of them see the same amount.
+    Transfers between other members are left to their trips. With warm
+    caches this is one query, and at most three otherwise.
+    
+    Args:
+        user: User object
+        
+    Returns:
+        Dictionary with the netted 'transfers', the user's combined 'balance',
+        and a per-trip 'breakdown' of their balance and transfer count
+    """
+    others = TripMember.objects.filter(trip=OuterRef('pk'), is_active=True).exclude(user=user)
+    trips = list(Trip.objects.filter(
+        tripmember__user=user,
+        tripmember__is_active=True,
+        is_active=True
+    ).filter(Exists(others)).only('id', 'name', 'ledger_version').order_by('created_at'))
+    
+    settlements = calculate_settlements(trips)
+    user_id = str(user.id)
+    owed = defaultdict(int)  # paise each counterparty owes the user, across trips
+    parties = {}  # (from_id, to_id) -> the transfer's from_user and to_user payloads
+    breakdown = []
+    separate_transfers = 0
+    for trip in trips:
+        balance_paise = 0
+        trip_transfers = 0
+        for transfer in settlements[trip.id]['transfers']:
+            from_id, to_id = transfer['from_user']['id'], transfer['to_user']['id']
+            if user_id not in (from_id, to_id):
+                continue
+            amount_paise = round(transfer['amount'] * 100)
+            if to_id == user_id:
+                owed[from_id] += amount_paise
+                balance_paise += amount_paise
+            else:
+                owed[to_id] -= amount_paise
+                balance_paise -= amount_paise
+            parties[(from_id, to_id)] = (transfer['from_user'], transfer['to_user'])
+            trip_transfers += 1
+        separate_transfers += trip_transfers
+        breakdown.append({
+            'tripid': str(trip.id),
+            'name': trip.name,
+            'balance': balance_paise / 100,
+            'transfers_if_settled_alone': trip_transfers
+        })
+    
+    transfers = []
+    for other_id, amount_paise in sorted(owed.items(), key=lambda item: -abs(item[1])):
+        if amount_paise == 0:
+            continue
+        # A net debt in one direction means some trip had a transfer that way
+        from_user, to_user = parties[(other_id, user_id) if amount_paise > 0 else (user_id, other_id)]
+        transfers.append({'from_user': from_user, 'to_user': to_user, 'amount': abs(amount_paise) / 100})
+    
+    return {
+        'transfers': transfers,
+        'balance': sum(owed.values()) / 100,
+        'breakdown': breakdown,
+        'transfers_saved': separate_transfers - len(transfers)
+    }
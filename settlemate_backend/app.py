@@ -15,15 +15,18 @@ Requirements:
     - Redis (for Celery)
 """
 
+# Patch before anything else is imported, so Django's per-thread database
+# connections and locks are keyed by green thread
+import eventlet
+eventlet.monkey_patch()
+
 import os
 import sys
 import django
 from django.core.wsgi import get_wsgi_application
 from django.conf import settings
 import socketio
-import eventlet
 from eventlet import wsgi
-eventlet.monkey_patch()
 
 # Add the project directory to Python path
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
@@ -44,11 +47,14 @@ if __name__ == '__main__':
     # Mount Socket.IO on top of Django so both HTTP and Socket.IO share the same port
     socketio_app = socketio.WSGIApp(sio, django_app)
 
+    # Several workers can run side by side on different ports when SOCKETIO_MESSAGE_QUEUE is set
+    port = int(os.environ.get('PORT', 8000))
+
     print("Starting SettleMate Backend Server (eventlet)...")
-    print("Django Admin: http://localhost:8000/admin/")
-    print("API Endpoints: http://localhost:8000/api/")
-    print("Socket.IO: http://localhost:8000/socket.io/")
+    print(f"Django Admin: http://localhost:{port}/admin/")
+    print(f"API Endpoints: http://localhost:{port}/api/")
+    print(f"Socket.IO: http://localhost:{port}/socket.io/")
     print("Press Ctrl+C to stop the server")
 
-    listener = eventlet.listen(('0.0.0.0', 8000))
+    listener = eventlet.listen(('0.0.0.0', port))
     wsgi.server(listener, socketio_app)
@@ -12,7 +12,9 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 
 from pathlib import Path
 import os
+import sys
 from decouple import config
+from corsheaders.defaults import default_headers
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -95,7 +97,7 @@ if DEBUG and config('USE_SQLITE', default=True, cast=bool):
     DATABASES = {
         'default': {
             'ENGINE': 'django.db.backends.sqlite3',
-            'NAME': BASE_DIR / 'db.sqlite3',
+            'NAME': config('SQLITE_PATH', default=str(BASE_DIR / 'db.sqlite3')),
         }
     }
 
@@ -118,6 +120,17 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# PBKDF2 runs in a native thread pool when serving through eventlet (app.py),
+# so logins and signups do not stall the hub; the other hashers verify legacy hashes
+PASSWORD_HASHERS = [
+    'api.hashers.OffloadedPBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+PASSWORD_HASHING_THREADS = config('PASSWORD_HASHING_THREADS', default=4, cast=int)
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/5.2/topics/i18n/
@@ -153,12 +166,30 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.IsAuthenticated',
     ],
     'DEFAULT_RENDERER_CLASSES': [
-        'rest_framework.renderers.JSONRenderer',
+        'api.renderers.ORJSONRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'api.parsers.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
     ],
+    'EXCEPTION_HANDLER': 'api.throttling.exception_handler',
+    # Proxies in front of the app that append to X-Forwarded-For; with 0 the client IP used by
+    # rate limits is REMOTE_ADDR and a client-supplied X-Forwarded-For is ignored
+    'NUM_PROXIES': config('NUM_PROXIES', default=0, cast=int),
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 20,
 }
 
+# Keyset pagination for getTransactions (opt-in with ?cursor= or ?page_size=)
+TRANSACTIONS_PAGE_SIZE = config('TRANSACTIONS_PAGE_SIZE', default=50, cast=int)
+TRANSACTIONS_MAX_PAGE_SIZE = config('TRANSACTIONS_MAX_PAGE_SIZE', default=200, cast=int)
+
+# Delta sync (syncTrip): overlap re-sends rows committed late by concurrent writers;
+# tokens older than the tombstone retention force a full reload
+SYNC_OVERLAP_SECONDS = config('SYNC_OVERLAP_SECONDS', default=5, cast=int)
+SYNC_TOMBSTONE_RETENTION_DAYS = config('SYNC_TOMBSTONE_RETENTION_DAYS', default=30, cast=int)
+
 # CORS Configuration
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:3000",
@@ -168,6 +199,8 @@ CORS_ALLOWED_ORIGINS = [
 ]
 
 CORS_ALLOW_CREDENTIALS = True
+CORS_ALLOW_HEADERS = (*default_headers, 'if-none-match')
+CORS_EXPOSE_HEADERS = ['ETag']
 
 # Allow API endpoints to work without trailing slashes (frontend calls like /api/login)
 APPEND_SLASH = False
@@ -190,7 +223,28 @@ EMAIL_HOST_PASSWORD = config('EMAIL_HOST_PASSWORD', default='')
 # JWT Configuration
 JWT_SECRET_KEY = config('JWT_SECRET_KEY', default=SECRET_KEY)
 JWT_ALGORITHM = 'HS256'
-JWT_EXPIRATION_DELTA = 24 * 60 * 60  # 24 hours
+# Access tokens are verified without a database read; refresh tokens rotate the session row.
+# The bundled web client trades its refresh token for a new pair when a request gets a 401.
+JWT_ACCESS_EXPIRATION_DELTA = config('JWT_ACCESS_EXPIRATION_DELTA', default=15 * 60, cast=int)  # 15 minutes
+JWT_REFRESH_EXPIRATION_DELTA = config('JWT_REFRESH_EXPIRATION_DELTA', default=30 * 24 * 60 * 60, cast=int)  # 30 days
+
+# User snapshots are cached by user ID so authentication skips the database;
+# evictions reach other processes' local copies within PRINCIPAL_CACHE_LOCAL_TTL seconds
+PRINCIPAL_CACHE_TIMEOUT = config('PRINCIPAL_CACHE_TIMEOUT', default=60, cast=int)  # seconds in Redis
+PRINCIPAL_CACHE_LOCAL_SIZE = config('PRINCIPAL_CACHE_LOCAL_SIZE', default=4096, cast=int)  # in-process LRU entries
+PRINCIPAL_CACHE_LOCAL_TTL = config('PRINCIPAL_CACHE_LOCAL_TTL', default=5, cast=float)  # seconds in-process
+
+# Settlement solver: 'greedy', 'optimal' (exact minimum transfers), 'heap' (large groups) or 'auto'
+SETTLEMENT_SOLVER = config('SETTLEMENT_SOLVER', default='auto')
+SETTLEMENT_TIME_BUDGET_MS = config('SETTLEMENT_TIME_BUDGET_MS', default=200, cast=int)
+# The exact search is O(n * 2^n) on the request thread: ~20-45ms at 14 balances, ~100-200ms at 16
+# and seconds at 20, so 'auto' only picks it where it comfortably fits SETTLEMENT_TIME_BUDGET_MS.
+# An explicit 'optimal' request searches up to the hard cap and relies on the time budget there.
+SETTLEMENT_AUTO_OPTIMAL_MAX_BALANCES = config('SETTLEMENT_AUTO_OPTIMAL_MAX_BALANCES', default=14, cast=int)
+SETTLEMENT_OPTIMAL_MAX_BALANCES = config('SETTLEMENT_OPTIMAL_MAX_BALANCES', default=20, cast=int)
+
+# Maximum number of transactions accepted by one createTransactions request
+BULK_TRANSACTION_LIMIT = config('BULK_TRANSACTION_LIMIT', default=500, cast=int)
 
 # Frontend URL (used in emails/invites)
 FRONTEND_URL = config('FRONTEND_URL', default='http://localhost:3000')
@@ -209,6 +263,38 @@ CACHES = {
     }
 }
 
+# Version-keyed caching of settlement plans and trip summaries
+TRIP_CACHE_TIMEOUT = config('TRIP_CACHE_TIMEOUT', default=60 * 60, cast=int)  # seconds in Redis
+TRIP_CACHE_LOCAL_SIZE = config('TRIP_CACHE_LOCAL_SIZE', default=512, cast=int)  # in-process LRU entries
+
+# Cached active-member sets used for membership checks; kept in Redis only, so an
+# invalidation by any worker is seen by all of them at once. The timeout also bounds
+# how long a set can outlive an invalidation that failed to reach Redis.
+MEMBERSHIP_CACHE_TIMEOUT = config('MEMBERSHIP_CACHE_TIMEOUT', default=60, cast=int)  # seconds in Redis
+
+# Token-bucket rate limits ('<requests>/<second|minute|hour|day>') per client IP and per account,
+# kept in Redis and shared by all workers; each process falls back to local buckets if Redis fails
+RATE_LIMIT_ENABLED = config('RATE_LIMIT_ENABLED', default=True, cast=bool)
+RATE_LIMITS = {
+    'login': {
+        'ip': config('RATE_LIMIT_LOGIN_IP', default='30/minute'),
+        'account': config('RATE_LIMIT_LOGIN_ACCOUNT', default='5/minute'),
+    },
+    'signup': {
+        'ip': config('RATE_LIMIT_SIGNUP_IP', default='10/hour'),
+    },
+    'forgot_password': {
+        'ip': config('RATE_LIMIT_FORGOT_PASSWORD_IP', default='10/hour'),
+        'account': config('RATE_LIMIT_FORGOT_PASSWORD_ACCOUNT', default='3/hour'),
+    },
+    'invite': {
+        'account': config('RATE_LIMIT_INVITE_ACCOUNT', default='50/hour'),
+    },
+}
+
+# Bearer token for the /api/metrics scrape endpoint; the endpoint answers 404 while unset
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
+
 # Celery Configuration
 CELERY_BROKER_URL = REDIS_URL
 CELERY_RESULT_BACKEND = REDIS_URL
@@ -220,21 +306,27 @@ CELERY_TIMEZONE = TIME_ZONE
 # Socket.IO Configuration
 SOCKETIO_URL = config('SOCKETIO_URL', default='http://localhost:8000')
 
+# Pub/sub queue shared by Socket.IO workers so room broadcasts reach clients on every
+# process, e.g. redis://localhost:6379/1 (any other URL scheme goes through kombu).
+# Leave empty to run a single worker with in-process rooms.
+SOCKETIO_MESSAGE_QUEUE = config('SOCKETIO_MESSAGE_QUEUE', default='')
+SOCKETIO_CHANNEL = config('SOCKETIO_CHANNEL', default='settlemate-socketio')  # same on all workers
+
 # Google Drive Configuration (for file uploads)
 GOOGLE_DRIVE_CLIENT_ID = config('GOOGLE_DRIVE_CLIENT_ID', default='')
 GOOGLE_DRIVE_CLIENT_SECRET = config('GOOGLE_DRIVE_CLIENT_SECRET', default='')
 GOOGLE_DRIVE_REDIRECT_URI = config('GOOGLE_DRIVE_REDIRECT_URI', default='')
 
 # Logging Configuration
+# An empty LOG_FILE logs to the console only. Test runs never write the file,
+# and the tests start their app.py workers with LOG_FILE empty as well.
+LOG_FILE = '' if sys.argv[1:2] == ['test'] else config('LOG_FILE', default=os.path.join(BASE_DIR, 'logs', 'django.log'))
+LOG_HANDLERS = ['file', 'console'] if LOG_FILE else ['console']
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
     'handlers': {
-        'file': {
-            'level': 'INFO',
-            'class': 'logging.FileHandler',
-            'filename': os.path.join(BASE_DIR, 'logs', 'django.log'),
-        },
         'console': {
             'level': 'INFO',
             'class': 'logging.StreamHandler',
@@ -242,17 +334,23 @@ LOGGING = {
     },
     'loggers': {
         'django': {
-            'handlers': ['file', 'console'],
+            'handlers': LOG_HANDLERS,
             'level': 'INFO',
             'propagate': True,
         },
         'api': {
-            'handlers': ['file', 'console'],
+            'handlers': LOG_HANDLERS,
             'level': 'INFO',
             'propagate': True,
         },
     },
 }
+if LOG_FILE:
+    LOGGING['handlers']['file'] = {
+        'level': 'INFO',
+        'class': 'logging.FileHandler',
+        'filename': LOG_FILE,
+    }
 
 # Create logs directory if it doesn't exist
 os.makedirs(os.path.join(BASE_DIR, 'logs'), exist_ok=True)
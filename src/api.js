@@ -5,4 +5,35 @@ export const authHeaders = () => ({
   'Authorization': `Bearer ${localStorage.getItem('authToken') || ''}`,
 });
 
+// Access tokens are short-lived; trade the refresh token for a new pair
+const refreshSession = async () => {
+  const refreshToken = localStorage.getItem('refreshToken');
+  if (!refreshToken) return false;
+  try {
+    const response = await fetch(`${API}/refreshToken`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ refreshToken }),
+    });
+    if (!response.ok) return false;
+    const json = await response.json();
+    localStorage.setItem('authToken', json.authToken);
+    localStorage.setItem('refreshToken', json.refreshToken);
+    return true;
+  } catch (error) {
+    console.error('Error refreshing session :', error);
+    return false;
+  }
+};
 
+// Shared by concurrent requests: refresh tokens are single-use, a second refresh would end the session
+let refreshing = null;
+
+// fetch with the current access token, refreshing it once and retrying when it has expired
+export const authFetch = async (url, options = {}) => {
+  const response = await fetch(url, { ...options, headers: authHeaders() });
+  if (response.status !== 401) return response;
+  refreshing = refreshing || refreshSession().finally(() => { refreshing = null; });
+  if (!(await refreshing)) return response;
+  return fetch(url, { ...options, headers: authHeaders() });
+};
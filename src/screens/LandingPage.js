@@ -3,7 +3,7 @@ import { useNavigate } from 'react-router-dom';
 import { toast } from 'react-toastify';
 import 'react-toastify/dist/ReactToastify.css';
 import TripTable from './triptable.js';
-import { API, authHeaders } from '../api';
+import { API, authFetch } from '../api';
 
 import Box from '@mui/material/Box';
 import Button from '@mui/material/Button';
@@ -71,9 +71,8 @@ function LandingPage() {
 
 	const submitTripForm = async e => {
 		e.preventDefault();
-        const response = await fetch(`${API}/createtrip`, {
+        const response = await authFetch(`${API}/createtrip`, {
 			method: 'POST',
-            headers: authHeaders(),
 			body: JSON.stringify({
 				name: tripName,
 			}),
@@ -85,6 +84,7 @@ function LandingPage() {
 			});
 			if (json.logout === true) {
 				localStorage.removeItem('authToken');
+				localStorage.removeItem('refreshToken');
 				localStorage.setItem('forcedLogOut', true);
 				navigate('/profile');
 			}
@@ -99,9 +99,8 @@ function LandingPage() {
 			const authToken = localStorage.getItem('authToken');
 			if (!authToken) return;
 			try {
-				const response = await fetch(`${API}/getTripsData`, {
+				const response = await authFetch(`${API}/getTripsData`, {
 					method: 'GET',
-					headers: authHeaders(),
 				});
 				const json = await response.json();
 				if (json.success) setInvitesCount(json.invites || 0);
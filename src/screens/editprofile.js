@@ -2,7 +2,7 @@ import React, { useState, useEffect } from 'react';
 import { useNavigate } from 'react-router-dom';
 import { toast } from 'react-toastify';
 import 'react-toastify/dist/ReactToastify.css';
-import { API, authHeaders } from '../api';
+import { API, authFetch } from '../api';
 
 function EditProfile() {
 	let navigate = useNavigate();
@@ -19,9 +19,8 @@ function EditProfile() {
 		}
 		async function fetchData() {
 			try {
-                const response = await fetch(`${API}/getUserData`, {
+                const response = await authFetch(`${API}/getUserData`, {
                     method: 'GET',
-                    headers: authHeaders(),
                 });
 				const json = await response.json();
 				if (!json.success) {
@@ -49,9 +48,8 @@ function EditProfile() {
 
 	const handleSubmit = async e => {
 		e.preventDefault();
-        const response = await fetch(`${API}/editprofile`, {
+        const response = await authFetch(`${API}/editprofile`, {
             method: 'PUT',
-            headers: authHeaders(),
             body: JSON.stringify({
                 name: creds.name,
                 upi: creds.upi,
@@ -64,6 +62,7 @@ function EditProfile() {
 			});
 			if (json.logout === true) {
 				localStorage.removeItem('authToken');
+				localStorage.removeItem('refreshToken');
 				localStorage.setItem('forcedLogOut', true);
 				navigate('/profile');
 			}
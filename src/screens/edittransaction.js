@@ -139,6 +139,7 @@ const thumbs = null;
 					});
 					if (json.logout === true) {
 						localStorage.removeItem('authToken');
+						localStorage.removeItem('refreshToken');
 						localStorage.setItem('forcedLogOut', true);
 						navigate('/');
 					}
@@ -210,6 +211,7 @@ const thumbs = null;
 			});
 			if (json.logout === true) {
 				localStorage.removeItem('authToken');
+				localStorage.removeItem('refreshToken');
 				localStorage.setItem('forcedLogOut', true);
 				navigate('/');
 			}
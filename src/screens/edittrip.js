@@ -44,6 +44,7 @@ function Login() {
 						});
 						if (json.logout === true) {
 							localStorage.removeItem('authToken');
+							localStorage.removeItem('refreshToken');
 							localStorage.setItem('forcedLogOut', true);
 							navigate('/profile');
 						}
@@ -77,6 +78,7 @@ function Login() {
 			});
 			if (json.logout === true) {
 				localStorage.removeItem('authToken');
+				localStorage.removeItem('refreshToken');
 				localStorage.setItem('forcedLogOut', true);
 				navigate('/profile');
 			}
@@ -3,7 +3,7 @@ import { useNavigate } from 'react-router-dom';
 import Button from '@mui/material/Button';
 import Menu from '@mui/material/Menu';
 import MenuItem from '@mui/material/MenuItem';
-import { API, authHeaders } from '../api';
+import { API, authFetch } from '../api';
 
 function Header() {
 	const [loggedIn, setLoggedIn] = useState(false);
@@ -31,9 +31,8 @@ function Header() {
 		}
         async function fetchData() {
 			try {
-                const response = await fetch(`${API}/getUserData`, {
+                const response = await authFetch(`${API}/getUserData`, {
                     method: 'GET',
-                    headers: authHeaders(),
                 });
 				const json = await response.json();
 				if (json.success) {
@@ -43,6 +42,7 @@ function Header() {
 					console.log(json.errors);
 					if (json.logout === true) {
 						localStorage.removeItem('authToken');
+						localStorage.removeItem('refreshToken');
 						localStorage.setItem('forcedLogOut', true);
 						navigate('/profile');
 					}
@@ -54,10 +54,13 @@ function Header() {
 		authorize();
 	}, [navigate]);
 
-	const logout = () => {
+	const logout = async () => {
 		handleClose();
 		console.log('trying logout');
+		// Revoke the session server-side too, so its tokens stop working everywhere
+		await authFetch(`${API}/logout`, { method: 'POST' }).catch(error => console.error('Error logging out :', error));
 		localStorage.removeItem('authToken');
+		localStorage.removeItem('refreshToken');
 		setLoggedIn(false);
 		navigate('/login');
 	};
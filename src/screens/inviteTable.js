@@ -6,7 +6,7 @@ import Box from '@mui/material/Box';
 import Button from '@mui/material/Button';
 import Typography from '@mui/material/Typography';
 import { toast } from 'react-toastify';
-import { API, authHeaders } from '../api';
+import { API, authFetch } from '../api';
 
 const style = {
 	position: 'absolute',
@@ -58,9 +58,8 @@ const InviteTable = () => {
 			}
 
             try {
-                const response = await fetch(`${API}/getInvites`, {
+                const response = await authFetch(`${API}/getInvites`, {
                     method: 'GET',
-                    headers: authHeaders(),
                 });
 				const json = await response.json();
 				console.log(json);
@@ -71,6 +70,7 @@ const InviteTable = () => {
 					if (json.newAuthToken) localStorage.setItem('authToken', json.newAuthToken);
 				} else {
 					localStorage.removeItem('authToken');
+					localStorage.removeItem('refreshToken');
 					localStorage.setItem('forcedLogOut', true);
 					navigate('/profile');
 				}
@@ -148,9 +148,8 @@ const InviteTable = () => {
 	});
 
     const acceptInvite = async () => {
-        const response = await fetch(`${API}/acceptInvite`, {
+        const response = await authFetch(`${API}/acceptInvite`, {
             method: 'POST',
-            headers: authHeaders(),
             body: JSON.stringify({
                 invite_id: currTrip._id,
             }),
@@ -162,14 +161,14 @@ const InviteTable = () => {
 			setInviteModal(false);
 		} else {
 			localStorage.removeItem('authToken');
+			localStorage.removeItem('refreshToken');
 			localStorage.setItem('forcedLogOut', true);
 			navigate('/');
 		}
 	};
     const rejectInvite = async () => {
-        const response = await fetch(`${API}/declineInvite`, {
+        const response = await authFetch(`${API}/declineInvite`, {
             method: 'POST',
-            headers: authHeaders(),
             body: JSON.stringify({
                 invite_id: currTrip._id,
             }),
@@ -182,6 +181,7 @@ const InviteTable = () => {
 			toast.success('Invite Removed!');
 		} else {
 			localStorage.removeItem('authToken');
+			localStorage.removeItem('refreshToken');
 			localStorage.setItem('forcedLogOut', true);
 			navigate('/');
 		}
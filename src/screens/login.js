@@ -41,6 +41,7 @@ function Login() {
 			});
 		} else {
 			localStorage.setItem('authToken', json.authToken);
+			localStorage.setItem('refreshToken', json.refreshToken);
 			localStorage.setItem('welcome', true);
 			navigate('/');
 		}
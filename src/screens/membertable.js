@@ -6,7 +6,7 @@ import Box from '@mui/material/Box';
 import Button from '@mui/material/Button';
 import Typography from '@mui/material/Typography';
 import { toast } from 'react-toastify';
-import { API, authHeaders } from '../api';
+import { API, authFetch } from '../api';
 
 const style = {
 	position: 'absolute',
@@ -60,9 +60,8 @@ const MemberTable = ({ tripid, ownerId }) => {
 			}
 
             try {
-                const response = await fetch(`${API}/getTripMembers`, {
+                const response = await authFetch(`${API}/getTripMembers`, {
                     method: 'POST',
-                    headers: authHeaders(),
                     body: JSON.stringify({
                         tripid: tripid,
                     }),
@@ -81,6 +80,7 @@ const MemberTable = ({ tripid, ownerId }) => {
 					if (json.newAuthToken) localStorage.setItem('authToken', json.newAuthToken);
 				} else {
 					localStorage.removeItem('authToken');
+					localStorage.removeItem('refreshToken');
 					localStorage.setItem('forcedLogOut', true);
 					navigate('/profile');
 				}
@@ -157,9 +157,8 @@ const MemberTable = ({ tripid, ownerId }) => {
 		}),
 	});
     const confirmKick = async () => {
-        const response = await fetch(`${API}/kickMember`, {
+        const response = await authFetch(`${API}/kickMember`, {
             method: 'POST',
-            headers: authHeaders(),
             body: JSON.stringify({
                 tripid: tripid,
                 userid: user._id,
@@ -173,6 +172,7 @@ const MemberTable = ({ tripid, ownerId }) => {
 			});
 			if (json.logout === true) {
 				localStorage.removeItem('authToken');
+				localStorage.removeItem('refreshToken');
 				localStorage.setItem('forcedLogOut', true);
 				navigate('/profile');
 			}
@@ -184,9 +184,8 @@ const MemberTable = ({ tripid, ownerId }) => {
 		}
 	};
     const confirmCAdmin = async () => {
-        const response = await fetch(`${API}/adminMember`, {
+        const response = await authFetch(`${API}/adminMember`, {
             method: 'POST',
-            headers: authHeaders(),
             body: JSON.stringify({
                 tripid: tripid,
                 userid: user._id,
@@ -200,6 +199,7 @@ const MemberTable = ({ tripid, ownerId }) => {
 			});
 			if (json.logout === true) {
 				localStorage.removeItem('authToken');
+				localStorage.removeItem('refreshToken');
 				localStorage.setItem('forcedLogOut', true);
 				navigate('/profile');
 			}
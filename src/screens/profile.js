@@ -1,7 +1,7 @@
 import React, { useState, useEffect } from 'react';
 import { useNavigate } from 'react-router-dom';
 import { toast } from 'react-toastify';
-import { API, authHeaders } from '../api';
+import { API, authFetch } from '../api';
 import 'react-toastify/dist/ReactToastify.css';
 import InviteTable from './inviteTable.js';
 import Typography from '@mui/material/Typography';
@@ -19,9 +19,8 @@ function Profile() {
 		}
 		async function fetchData() {
 			try {
-                const response = await fetch(`${API}/getUserData`, {
+                const response = await authFetch(`${API}/getUserData`, {
                     method: 'GET',
-                    headers: authHeaders(),
                 });
 				const json = await response.json();
 				// console.log(json);
@@ -31,6 +30,7 @@ function Profile() {
 					});
 					if (json.logout === true) {
 						localStorage.removeItem('authToken');
+						localStorage.removeItem('refreshToken');
 						localStorage.setItem('forcedLogOut', true);
 						navigate('/');
 					}
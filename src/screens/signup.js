@@ -57,6 +57,7 @@ function SignUp() {
 			});
 		} else {
 			localStorage.setItem('authToken', json.authToken);
+			localStorage.setItem('refreshToken', json.refreshToken);
 			localStorage.setItem('welcome', true);
 			navigate('/');
 		}
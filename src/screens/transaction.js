@@ -1,7 +1,7 @@
 import React, { useState, useEffect } from 'react';
 import { useLocation, useNavigate } from 'react-router-dom';
 import { toast } from 'react-toastify';
-import { API, authHeaders } from '../api';
+import { API, authFetch } from '../api';
 
 import Button from '@mui/material/Button';
 import Typography from '@mui/material/Typography';
@@ -31,9 +31,8 @@ function Transaction() {
 		}
 		async function fetchData() {
 			try {
-                const response = await fetch(`${API}/getTransactionData`, {
+                const response = await authFetch(`${API}/getTransactionData`, {
 					method: 'POST',
-                    headers: authHeaders(),
 					body: JSON.stringify({
 						tripid: location.state.tripid,
 						transactionid: location.state.transactionid,
@@ -47,6 +46,7 @@ function Transaction() {
 					});
 					if (json.logout === true) {
 						localStorage.removeItem('authToken');
+						localStorage.removeItem('refreshToken');
 						localStorage.setItem('forcedLogOut', true);
 						navigate('/');
 					}
@@ -1,7 +1,7 @@
 import { useEffect, useMemo, useState } from 'react';
 import { MaterialReactTable, useMaterialReactTable } from 'material-react-table';
 import { useNavigate } from 'react-router-dom';
-import { API, authHeaders } from '../api';
+import { API, authFetch } from '../api';
 
 const TransactionTable = ({ tripid }) => {
 	const [data, setData] = useState([]);
@@ -27,9 +27,8 @@ const TransactionTable = ({ tripid }) => {
 			}
 
 			try {
-				const response = await fetch(`${API}/getTransactions?tripid=${encodeURIComponent(tripid)}`, {
+				const response = await authFetch(`${API}/getTransactions?tripid=${encodeURIComponent(tripid)}`, {
 					method: 'GET',
-					headers: authHeaders(),
 				});
 				const json = await response.json();
 				if (json.success) {
@@ -39,6 +38,7 @@ const TransactionTable = ({ tripid }) => {
 					if (json.newAuthToken) localStorage.setItem('authToken', json.newAuthToken);
 				} else {
 					localStorage.removeItem('authToken');
+					localStorage.removeItem('refreshToken');
 					localStorage.setItem('forcedLogOut', true);
 					navigate('/profile');
 				}
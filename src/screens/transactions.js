@@ -10,7 +10,7 @@ import Checkbox from '@mui/material/Checkbox';
 import FormGroup from '@mui/material/FormGroup';
 import FormControlLabel from '@mui/material/FormControlLabel';
 import Typography from '@mui/material/Typography';
-import { API, authHeaders } from '../api';
+import { API, authFetch } from '../api';
 import Box from '@mui/material/Box';
 import Modal from '@mui/material/Modal';
 
@@ -49,9 +49,8 @@ function Login() {
     useEffect(() => {
         async function loadMembers() {
             try {
-                const response = await fetch(`${API}/getTripMembers`, {
+                const response = await authFetch(`${API}/getTripMembers`, {
                     method: 'POST',
-                    headers: authHeaders(),
                     body: JSON.stringify({ tripid: location.state.tripid }),
                 });
                 const json = await response.json();
@@ -87,9 +86,8 @@ function Login() {
         toast.error('Select at least one member');
         return;
     }
-        const response = await fetch(`${API}/createtransaction`, {
+        const response = await authFetch(`${API}/createtransaction`, {
 			method: 'POST',
-            headers: authHeaders(),
 			body: JSON.stringify({
 				name: transactionName,
 				tripid: location.state.tripid,
@@ -104,6 +102,7 @@ function Login() {
 			});
 			if (json.logout === true) {
 				localStorage.removeItem('authToken');
+				localStorage.removeItem('refreshToken');
 				localStorage.setItem('forcedLogOut', true);
 				navigate('/profile');
 			}
@@ -1,6 +1,6 @@
 import { useEffect, useMemo, useState } from 'react';
 import { MaterialReactTable, useMaterialReactTable } from 'material-react-table';
-import { API, authHeaders } from '../api';
+import { API, authFetch } from '../api';
 import { useNavigate } from 'react-router-dom';
 import Modal from '@mui/material/Modal';
 import Box from '@mui/material/Box';
@@ -56,9 +56,8 @@ const TransactionTable = ({ tripid }) => {
 			}
 
             try {
-                const response = await fetch(`${API}/getTripTransfers`, {
+                const response = await authFetch(`${API}/getTripTransfers`, {
                     method: 'POST',
-                    headers: authHeaders(),
                     body: JSON.stringify({
                         tripid: tripid,
                     }),
@@ -79,6 +78,7 @@ const TransactionTable = ({ tripid }) => {
 					if (json.newAuthToken) localStorage.setItem('authToken', json.newAuthToken);
 				} else {
 					localStorage.removeItem('authToken');
+					localStorage.removeItem('refreshToken');
 					localStorage.setItem('forcedLogOut', true);
 					navigate('/profile');
 				}
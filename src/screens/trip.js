@@ -3,7 +3,7 @@ import { useNavigate, useLocation } from 'react-router-dom';
 import { toast } from 'react-toastify';
 import 'react-toastify/dist/ReactToastify.css';
 import MemberTable from './membertable';
-import { API, authHeaders } from '../api';
+import { API, authFetch } from '../api';
 // Socket.IO removed (disabled)
 // Removed image upload feature
 
@@ -96,9 +96,8 @@ function Trip() {
 		}
 		async function fetchData() {
 			try {
-                const response = await fetch(`${API}/getTripData`, {
+                const response = await authFetch(`${API}/getTripData`, {
 					method: 'POST',
-                    headers: authHeaders(),
 					body: JSON.stringify({
 						tripid: tripid,
 					}),
@@ -117,6 +116,7 @@ function Trip() {
 					});
 					if (json.logout === true) {
 						localStorage.removeItem('authToken');
+						localStorage.removeItem('refreshToken');
 						localStorage.setItem('forcedLogOut', true);
 						navigate('/profile');
 					}
@@ -145,9 +145,8 @@ function Trip() {
 			date: new Date(),
 		};
         // Socket disabled; rely on HTTP addChat and local append
-        const response = await fetch(`${API}/addChat`, {
+        const response = await authFetch(`${API}/addChat`, {
 			method: 'POST',
-            headers: authHeaders(),
 			body: JSON.stringify({
 				tripid: tripid,
 				msg: data,
@@ -160,6 +159,7 @@ function Trip() {
 			});
 			if (json.logout === true) {
 				localStorage.removeItem('authToken');
+				localStorage.removeItem('refreshToken');
 				localStorage.setItem('forcedLogOut', true);
 				navigate('/profile');
 			}
@@ -182,9 +182,8 @@ function Trip() {
 		else msgTextSubmit('Admin please clear the chat!');
 	};
 	const confirmClearChat = async () => {
-        const response = await fetch(`${API}/clearChat`, {
+        const response = await authFetch(`${API}/clearChat`, {
 			method: 'POST',
-            headers: authHeaders(),
 			body: JSON.stringify({
 				tripid: tripid,
 			}),
@@ -197,6 +196,7 @@ function Trip() {
 			});
 			if (json.logout === true) {
 				localStorage.removeItem('authToken');
+				localStorage.removeItem('refreshToken');
 				localStorage.setItem('forcedLogOut', true);
 				navigate('/profile');
 			}
@@ -208,9 +208,8 @@ function Trip() {
     // Removed uploadImages function
 
 	const sendInvite = async () => {
-        const response = await fetch(`${API}/invite`, {
+        const response = await authFetch(`${API}/invite`, {
 			method: 'POST',
-            headers: authHeaders(),
 			body: JSON.stringify({
 				tripid: tripid,
 				email: inviteEmail,
@@ -223,6 +222,7 @@ function Trip() {
 			});
 			if (json.logout === true) {
 				localStorage.removeItem('authToken');
+				localStorage.removeItem('refreshToken');
 				localStorage.setItem('forcedLogOut', true);
 				navigate('/profile');
 			}
@@ -2,7 +2,7 @@ import { useEffect, useMemo, useState } from 'react';
 import { MaterialReactTable, useMaterialReactTable } from 'material-react-table';
 import { useNavigate } from 'react-router-dom';
 import { toast } from 'react-toastify';
-import { API, authHeaders } from '../api';
+import { API, authFetch } from '../api';
 
 const TripTable = () => {
 	const [data, setData] = useState([]);
@@ -28,9 +28,8 @@ const TripTable = () => {
 			}
 
             try {
-                const response = await fetch(`${API}/getTripsData`, {
+                const response = await authFetch(`${API}/getTripsData`, {
                     method: 'GET',
-                    headers: authHeaders(),
                 });
 				const json = await response.json();
 				if (json.success) {
@@ -42,6 +41,7 @@ const TripTable = () => {
 					if (json.newAuthToken) localStorage.setItem('authToken', json.newAuthToken);
 				} else {
 					localStorage.removeItem('authToken');
+					localStorage.removeItem('refreshToken');
 					localStorage.setItem('forcedLogOut', true);
 					navigate('/profile');
 				}